@@ -0,0 +1 @@
+"""Microbenchmarks for pystreaming. See python -m benchmarks --help."""
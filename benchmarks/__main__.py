@@ -0,0 +1,66 @@
+"""Run the benchmark suite, writing every result to one JSON document.
+
+    python -m benchmarks --json results.json
+    python -m benchmarks --json new.json --compare results.json
+
+With --compare, exits with status 1 if any metric is worse than in the baseline by more
+than the tolerance.
+"""
+
+import argparse
+import importlib
+import json
+import sys
+
+from . import common
+
+SUITE = (
+    "bench_codec",
+    "bench_decode",
+    "bench_delta",
+    "bench_dist",
+    "bench_layers",
+    "bench_wire",
+    "bench_hops",
+    "bench_backends",
+    "bench_lifecycle",
+    "bench_ring",
+    "bench_playout",
+    "bench_batch",
+    "bench_import",
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, of {', '.join(SUITE)}")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON, - for stdout")
+    parser.add_argument("--compare", metavar="PATH", help="baseline results to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.15, help="allowed relative slowdown (0.15)"
+    )
+    args = parser.parse_args()
+    for name in set(args.names) - set(SUITE):
+        parser.error(f"unknown benchmark {name}")
+    log = sys.stderr if args.json == "-" else sys.stdout
+
+    results = {}
+    for name in args.names or SUITE:
+        print(f"== {name}", file=log, flush=True)
+        results[name] = importlib.import_module(f".{name}", __package__).run()
+        print(common.table(results[name]), file=log, flush=True)
+    doc = common.document(results)
+    if args.json:
+        common.write(doc, args.json)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = common.compare(json.load(f), doc, args.tolerance)
+        for name, case, metric, worse in regressions:
+            print(f"REGRESSION {name}: {case}: {metric} {worse:+.0%}", file=log)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Latency and throughput of the encoder and decoder devices under every backend: worker
+processes over ipc, worker threads over inproc, and inline in the calling thread. Frames
+are the TEST_S and TEST_L test cards, raw for the encoder and JPEG compressed for the
+decoder, so the hop to a worker process weighs the most next to the small frame.
+
+Process and thread encoders are fed past the rate controller, as in bench_hops. Inline
+encoders are fed through send, which never pushes back, so the rate controller does not
+step in either.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_backends
+"""
+
+import contextlib
+import uuid
+from collections.abc import Iterator
+
+import numpy as np
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.video import BACKENDS, codecs
+
+from . import common
+from .bench_codec import frame
+from .bench_hops import Hop, latency, puller, pusher, running, sockets, throughput, warm
+
+NPROC = 2
+IMAGES = {"TEST_S": ps.TEST_S, "TEST_L": ps.TEST_L}
+
+
+@contextlib.contextmanager
+def encoder(raw: np.ndarray, backend: str) -> Iterator[Hop]:
+    enc = ps.EncoderDevice(NPROC, uuid.uuid1().hex, backend=backend)
+    with sockets(zmq.PULL) as (sink,):
+        sink.bind(enc.outfd)
+        with running(enc):
+            if backend == "inline":
+
+                def send(fno: int) -> bool:
+                    enc.idx = fno  # send numbers frames itself
+                    enc.send(raw)
+                    return True
+
+            else:
+                send = pusher(enc.sender, arr=raw)
+            yield Hop(send, puller(sink, buf=True), raw.nbytes)
+
+
+@contextlib.contextmanager
+def decoder(jpeg: bytes, backend: str) -> Iterator[Hop]:
+    dec = ps.DecoderDevice(NPROC, uuid.uuid1().hex, backend=backend)
+
+    def recv(timeout: int) -> intf.RecvData | None:
+        try:
+            return dec.recv(timeout=timeout)
+        except TimeoutError:
+            return None
+
+    with sockets(zmq.PUSH) as (src,):
+        src.bind(dec.infd)
+        with running(dec):
+            yield Hop(pusher(src, buf=jpeg), recv, len(jpeg))
+
+
+def run():
+    jpeg = codecs.lookup("jpeg")
+    rows = []
+    for name, card in IMAGES.items():
+        raw = frame(card)
+        buf = jpeg.encode(raw)
+        size = f"{raw.shape[1]}x{raw.shape[0]}"
+        for device, make, payload in (("encoder", encoder, raw), ("decoder", decoder, buf)):
+            for backend in BACKENDS:
+                with make(payload, backend) as hop:
+                    warm(hop)
+                    times, lost = latency(hop)
+                    warm(hop)
+                    fps = throughput(hop)
+                rows.append(
+                    {
+                        "case": f"{name} {size} {device} / {backend}",
+                        "p50_ms": float(np.median(times)) * 1e3,
+                        "p99_ms": float(np.percentile(times, 99)) * 1e3,
+                        "lost": lost,
+                        "throughput_fps": fps,
+                    }
+                )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_backends", run, __doc__)
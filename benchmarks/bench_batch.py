@@ -0,0 +1,83 @@
+"""Batching decoded frames for inference: gathering RecvData by hand and np.stack-ing
+their arrays, against a Batcher copying each frame into a preallocated buffer. Frames
+come from a source in this process that hands out the same decoded frames over and over,
+so only the batching itself is timed. "alloc_kb" is the memory allocated per batch.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_batch
+"""
+
+import functools
+import time
+import tracemalloc
+
+import numpy as np
+
+import pystreaming as ps
+from pystreaming.stream.interface import RecvData
+
+from . import common
+
+BATCH = 8
+BATCHES = 50
+SIZES = {"640x480": (480, 640, 3), "1280x720": (720, 1280, 3), "1920x1080": (1080, 1920, 3)}
+
+
+class Source:
+    """Decoded frames, as DecoderDevice.recv returns them, without any waiting."""
+
+    def __init__(self, shape: tuple[int, ...]) -> None:
+        rng = np.random.default_rng(0)
+        self.frames = [rng.integers(0, 255, shape, dtype=np.uint8) for _ in range(BATCH)]
+        self.fno = 0
+
+    def recv(self, timeout: int | None = None) -> RecvData:
+        arr = self.frames[self.fno % BATCH]
+        self.fno += 1
+        return RecvData(meta=None, ftime=time.time(), fno=self.fno, arr=arr[...])
+
+
+def stack(source: Source) -> np.ndarray:
+    """How batches are gathered without a Batcher."""
+    frames = [source.recv() for _ in range(BATCH)]
+    fno = np.array([data.fno for data in frames])
+    ftime = np.array([data.ftime for data in frames])
+    del fno, ftime
+    return np.stack([data.arr for data in frames])
+
+
+def measure(gather) -> tuple[float, float]:
+    """Seconds per frame, and bytes allocated per batch once warmed up."""
+    gather()
+    start = time.perf_counter()
+    for _ in range(BATCHES):
+        gather()
+    elapsed = (time.perf_counter() - start) / (BATCHES * BATCH)
+    tracemalloc.start()
+    gather()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run():
+    rows = []
+    for name, shape in SIZES.items():
+        source = Source(shape)
+        batcher = ps.Batcher(source, size=BATCH)
+        cases = {"np.stack": functools.partial(stack, source), "Batcher": batcher.recv}
+        for mode, gather in cases.items():
+            per_frame, nbytes = measure(gather)
+            rows.append(
+                {
+                    "case": f"{name} / {mode}",
+                    "per_frame_us": per_frame * 1e6,
+                    "alloc_kb": round(nbytes / 1024, 1),
+                }
+            )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_batch", run, __doc__)
@@ -0,0 +1,129 @@
+"""Encode and decode throughput and compression ratio of every registered codec, on the
+bundled test images and on depth (uint16) and thermal (float32) frames derived from them.
+JPEG runs at the settings the encoder and decoder devices default to, and is also fed the
+test images as I420 and NV12 frames, as a camera would deliver them. Codecs whose
+package is not installed, or that cannot encode a frame type, are left out.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_codec
+"""
+
+import time
+
+import numpy as np
+
+from pystreaming import (
+    IMAG_L,
+    IMAG_M,
+    IMAG_S,
+    TEST_L,
+    TEST_M,
+    TEST_S,
+    DecodeProfile,
+    loadimage,
+)
+from pystreaming.video import codecs
+
+from . import common
+
+IMAGES = {
+    "TEST_S": TEST_S,
+    "TEST_M": TEST_M,
+    "TEST_L": TEST_L,
+    "IMAG_S": IMAG_S,
+    "IMAG_M": IMAG_M,
+    "IMAG_L": IMAG_L,
+}
+SECONDS = 0.5  # per measurement
+
+
+def frame(card: int) -> np.ndarray:
+    """A test image as the BGR uint8 array a camera would deliver."""
+    return np.ascontiguousarray(np.asarray(loadimage(card).convert("RGB"))[:, :, ::-1])
+
+
+def frames():
+    """Every test image, plus depth and thermal frames derived from IMAG_M."""
+    out = {}
+    for name, card in IMAGES.items():
+        arr = frame(card)
+        out[f"{name} {arr.shape[1]}x{arr.shape[0]}"] = arr
+    luma = frame(IMAG_M).mean(axis=2)
+    out["DEPTH uint16"] = (luma * 40).astype(np.uint16)  # millimetres, up to about 10 m
+    out["THERMAL float32"] = (20 + luma / 16).astype(np.float32)  # degrees
+    return out
+
+
+def yuv(arr: np.ndarray) -> dict[str, np.ndarray]:
+    """A BGR frame as the I420 and NV12 frames a camera would deliver."""
+    jpeg = codecs.lookup("jpeg")
+    i420 = jpeg.decode(jpeg.encode(arr, quality=100), DecodeProfile(mode="yuv"))
+    h = arr.shape[0]
+    nv12 = i420.copy()
+    chroma = nv12[h:].reshape(-1, 2)
+    chroma[:, 0], chroma[:, 1] = i420[h : h * 5 // 4].ravel(), i420[h * 5 // 4 :].ravel()
+    return {"i420": i420, "nv12": nv12}
+
+
+def rate(fn, *args, **kwargs) -> float:
+    """Mean seconds per call, over at least SECONDS after a warm up."""
+    for _ in range(3):
+        fn(*args, **kwargs)
+    n, start = 0, time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < SECONDS:
+        fn(*args, **kwargs)
+        n += 1
+    return elapsed / n
+
+
+def run():
+    available = []
+    for codec in codecs.CODECS.values():
+        try:
+            codec.require()
+        except ImportError:
+            continue
+        available.append(codec)
+    rows = []
+    for name, arr in frames().items():
+        for codec in available:
+            try:
+                buf = codec.encode(arr)
+            except ValueError:
+                continue
+            encode = rate(codec.encode, arr)
+            decode = rate(codec.decode, buf)
+            rows.append(
+                {
+                    "case": f"{name} {codec.name}",
+                    "kb": round(len(buf) / 1024, 1),
+                    "ratio": round(arr.nbytes / len(buf), 2),
+                    "encode_ms": encode * 1e3,
+                    "decode_ms": decode * 1e3,
+                    "encode_mbps": arr.nbytes * 8 / encode / 1e6,
+                    "decode_fps": 1 / decode,
+                }
+            )
+    jpeg = codecs.lookup("jpeg")
+    for name, card in IMAGES.items():
+        arr = frame(card)
+        if arr.shape[0] % 2 or arr.shape[1] % 2:
+            continue
+        for layout, planes in yuv(arr).items():
+            buf = jpeg.encode_yuv(planes, layout=layout)
+            encode = rate(jpeg.encode_yuv, planes, layout=layout)
+            rows.append(
+                {
+                    "case": f"{name} {arr.shape[1]}x{arr.shape[0]} jpeg from {layout}",
+                    "kb": round(len(buf) / 1024, 1),
+                    "ratio": round(arr.nbytes / len(buf), 2),
+                    "encode_ms": encode * 1e3,
+                    "encode_mbps": arr.nbytes * 8 / encode / 1e6,
+                }
+            )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_codec", run, __doc__)
@@ -0,0 +1,44 @@
+"""JPEG decode time of every DecodeProfile a decoder process can run, on the bundled
+720p and 1080p images encoded at the encoder device defaults. "bgr x1.0" is the full
+decode every consumer paid for before decode profiles.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_decode
+"""
+
+from pystreaming import IMAG_L, IMAG_M, TEST_L, TEST_M, DecodeProfile
+from pystreaming.video import DECODE_MODES, DECODE_SCALES, codecs
+
+from . import common
+from .bench_codec import frame, rate
+
+IMAGES = {"TEST_M": TEST_M, "TEST_L": TEST_L, "IMAG_M": IMAG_M, "IMAG_L": IMAG_L}
+
+
+def run():
+    jpeg = codecs.lookup("jpeg")
+    rows = []
+    for name, card in IMAGES.items():
+        arr = frame(card)
+        buf = jpeg.encode(arr)
+        full = rate(jpeg.decode, buf)
+        for mode in DECODE_MODES:
+            for scale in DECODE_SCALES:
+                profile = DecodeProfile(scale, mode)
+                decode = rate(jpeg.decode, buf, profile)
+                out = jpeg.decode(buf, profile)
+                rows.append(
+                    {
+                        "case": f"{name} {arr.shape[1]}x{arr.shape[0]} {mode} x{scale}",
+                        "shape": "x".join(map(str, out.shape)),
+                        "decode_ms": decode * 1e3,
+                        "decode_fps": 1 / decode,
+                        "speedup": round(full / decode, 2),
+                    }
+                )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_decode", run, __doc__)
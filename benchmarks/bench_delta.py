@@ -0,0 +1,102 @@
+"""Tile delta encoding against whole-frame JPEG, on IMAG_M with sensor noise and a moving
+box covering a share of the frame. Times are per frame, averaged over a full keyframe
+interval: "split" is the work TileDelta adds in the sending process, "encode" the work
+of an encoder process, and "decode" that of a decoder process plus TileCanvas patching.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_delta
+"""
+
+import time
+
+import numpy as np
+
+from pystreaming import IMAG_M, TileDelta
+from pystreaming.stream.interface import RecvData
+from pystreaming.video import KEYFRAME_INTERVAL, codecs
+from pystreaming.video.delta import TileCanvas, prefix
+
+from . import common
+from .bench_codec import frame
+
+MOTION = {"static": 0.0, "5% motion": 0.05, "25% motion": 0.25}
+NOISE = 2  # +- levels of sensor noise
+ROUNDS = 3  # keyframe intervals per measurement
+
+
+def scenes(motion: float) -> list[np.ndarray]:
+    """One keyframe interval of noisy frames with a box moving across them."""
+    background = frame(IMAG_M).astype(np.int16)
+    h, w = background.shape[:2]
+    side = int((motion * h * w) ** 0.5)
+    rng = np.random.default_rng(0)
+    out = []
+    for i in range(KEYFRAME_INTERVAL):
+        arr = background + rng.integers(-NOISE, NOISE + 1, background.shape, dtype=np.int16)
+        if side:
+            x = i * (w - side) // KEYFRAME_INTERVAL
+            arr[(h - side) // 2 : (h + side) // 2, x : x + side] = 255
+        out.append(np.clip(arr, 0, 255).astype(np.uint8))
+    return out
+
+
+def whole(frames: list[np.ndarray]) -> dict[str, float]:
+    jpeg = codecs.lookup("jpeg")
+    encode = decode = nbytes = 0.0
+    for _ in range(ROUNDS):
+        for arr in frames:
+            start = time.perf_counter()
+            buf = jpeg.encode(arr)
+            encode += time.perf_counter() - start
+            start = time.perf_counter()
+            jpeg.decode(buf)
+            decode += time.perf_counter() - start
+            nbytes += len(buf)
+    n = ROUNDS * len(frames)
+    return {"split": 0.0, "encode": encode / n, "decode": decode / n, "nbytes": nbytes / n}
+
+
+def delta(frames: list[np.ndarray]) -> dict[str, float]:
+    jpeg, tiles = codecs.lookup("jpeg"), codecs.lookup("tiles")
+    sender, canvas = TileDelta(), TileCanvas()
+    split = encode = decode = nbytes = 0.0
+    fno = 0
+    for _ in range(ROUNDS):
+        for arr in frames:
+            start = time.perf_counter()
+            part, head = sender.split(arr, fno, jpeg.id)
+            split += time.perf_counter() - start
+            start = time.perf_counter()
+            buf = head + jpeg.encode(part)
+            encode += time.perf_counter() - start
+            start = time.perf_counter()
+            data = RecvData(meta=None, ftime=0.0, fno=fno, arr=tiles.decode(buf), buf=prefix(buf))
+            canvas.patch(data)
+            decode += time.perf_counter() - start
+            nbytes += len(buf)
+            fno += 1
+    n = ROUNDS * len(frames)
+    return {"split": split / n, "encode": encode / n, "decode": decode / n, "nbytes": nbytes / n}
+
+
+def run():
+    rows = []
+    for name, motion in MOTION.items():
+        frames = scenes(motion)
+        for mode, measure in (("whole", whole), ("delta", delta)):
+            cost = measure(frames)
+            rows.append(
+                {
+                    "case": f"{name} / {mode}",
+                    "kb": round(cost["nbytes"] / 1024, 1),
+                    "split_ms": cost["split"] * 1e3,
+                    "encode_ms": cost["encode"] * 1e3,
+                    "decode_ms": cost["decode"] * 1e3,
+                }
+            )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_delta", run, __doc__)
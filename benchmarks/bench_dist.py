@@ -0,0 +1,180 @@
+"""DistributorDevice throughput and latency with 1 to 32 workers, each a socket in this
+process that takes frames as fast as they come. "req" workers ask the way RequesterDevice
+threads used to, one frame per request and REQ_TIMESTEP between requests. "credits"
+workers are DEALER sockets that keep CREDIT frames requested ahead. "requester" rows run
+a RequesterDevice with that many threads instead, draining into a socket in this process.
+Policy rows share frames among HETERO workers that take FAST or SLOW seconds per frame,
+the slow one asking SLOW_CREDIT frames ahead, at RATE frames per second, and report the
+share of frames done by the slow worker and how long frames wait on workers. The source
+pushes TEST_M JPEGs as fast as the distributor takes them, see bench_hops for latency at
+idle.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_dist
+"""
+
+import time
+import uuid
+
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.video import DIST_POLICIES, FRAMEMISS, codecs
+from pystreaming.video.dist import CREDITS
+
+from . import common
+from .bench_codec import frame
+from .bench_hops import running, sockets
+
+WORKERS = (1, 2, 4, 8, 16, 32)
+CREDIT = 2
+SECONDS = 1.0
+HETERO = 4  # workers, the last of them slow
+FAST, SLOW = 0.002, 0.02  # seconds of work per frame
+SLOW_CREDIT = 4 * CREDIT  # a slow host with more decoders asks further ahead
+RATE = 200  # frames per second sent to HETERO workers, well within what they can do
+REQ_TIMESTEP = 0.03  # seconds the old RequesterDevice threads slept between requests
+
+
+def measure(mode: str, nworkers: int, jpeg: bytes) -> float:
+    """Frames per second delivered to all workers together."""
+    seed = uuid.uuid1().hex
+    dist = ps.DistributorDevice(["bench"], "ipc:///tmp/benchdist" + seed, seed)
+    kind = zmq.REQ if mode == "req" else zmq.DEALER
+    with sockets(zmq.PUSH, *[kind] * nworkers) as (source, *workers), running(dist):
+        source.connect(dist.infd)
+        poller = zmq.Poller()
+        for worker in workers:
+            worker.connect(dist.endpoint)
+            poller.register(worker, zmq.POLLIN)
+            if mode == "credits":
+                worker.send_multipart([b"", b"bench", CREDITS.pack(CREDIT)])
+        due = dict.fromkeys(workers, 0.0)  # req: when to ask next, None while waiting
+        time.sleep(0.2)
+        received = fno = 0
+        start = time.perf_counter()
+        while (now := time.perf_counter()) - start < SECONDS:
+            try:
+                intf.send(
+                    socket=source,
+                    fno=fno,
+                    ftime=0.0,
+                    meta=None,
+                    buf=jpeg,
+                    flags=zmq.NOBLOCK,
+                )
+                fno += 1
+            except zmq.Again:
+                pass
+            if mode == "req":
+                for worker, when in due.items():
+                    if when is not None and now >= when:
+                        worker.send(b"bench")
+                        due[worker] = None
+            for worker, _ in poller.poll(0):
+                parts = worker.recv_multipart(copy=False)
+                if mode == "credits":
+                    parts = parts[1:]  # the empty delimiter
+                    worker.send_multipart([b"", b"bench", CREDITS.pack(1)])
+                else:
+                    due[worker] = time.perf_counter() + REQ_TIMESTEP
+                if intf.unpack(parts, buf=False).fno != FRAMEMISS:
+                    received += 1
+        return received / SECONDS
+
+
+def measure_requester(nthread: int, jpeg: bytes) -> float:
+    """Frames per second a RequesterDevice hands on to its decoders."""
+    seed = uuid.uuid1().hex
+    dist = ps.DistributorDevice(["bench"], "ipc:///tmp/benchdist" + seed, seed)
+    requester = ps.RequesterDevice(dist.endpoint, "bench", nthread, seed, prefetch=CREDIT)
+    with sockets(zmq.PUSH, zmq.PULL) as (source, sink), running(dist, requester):
+        source.connect(dist.infd)
+        sink.connect(requester.outfd)
+        time.sleep(0.2)
+        received = fno = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < SECONDS:
+            try:
+                intf.send(
+                    socket=source,
+                    fno=fno,
+                    ftime=0.0,
+                    meta=None,
+                    buf=jpeg,
+                    flags=zmq.NOBLOCK,
+                )
+                fno += 1
+            except zmq.Again:
+                pass
+            while sink.poll(0):
+                sink.recv_multipart(copy=False)
+                received += 1
+        return received / SECONDS
+
+
+def measure_policy(policy: str, jpeg: bytes) -> dict[str, float]:
+    """Frames done per second, out of RATE, share of them done by the slow worker and mean time from
+    a worker getting a frame to being done with it."""
+    seed = uuid.uuid1().hex
+    policies = {"bench": policy}
+    dist = ps.DistributorDevice(["bench"], "ipc:///tmp/benchdist" + seed, seed, policies=policies)
+    with sockets(zmq.PUSH, *[zmq.DEALER] * HETERO) as (source, *workers), running(dist):
+        source.connect(dist.infd)
+        poller = zmq.Poller()
+        for worker in workers:
+            worker.connect(dist.endpoint)
+            poller.register(worker, zmq.POLLIN)
+            credit = SLOW_CREDIT if worker is workers[-1] else CREDIT
+            worker.send_multipart([b"", b"bench", CREDITS.pack(credit)])
+        cost = dict.fromkeys(workers, FAST)
+        cost[workers[-1]] = SLOW
+        pending: dict[zmq.Socket, list[float]] = {worker: [] for worker in workers}  # done at
+        done = dict.fromkeys(workers, 0)
+        wait = 0.0
+        time.sleep(0.2)
+        fno = 0
+        start = time.perf_counter()
+        while (now := time.perf_counter()) - start < SECONDS:
+            if fno < (now - start) * RATE:
+                intf.send(socket=source, fno=fno, ftime=0.0, meta=None, buf=jpeg)
+                fno += 1
+            for worker, _ in poller.poll(0):
+                worker.recv_multipart(copy=False)
+                queue = pending[worker]
+                queue.append(max(queue[-1] if queue else now, now) + cost[worker])
+                wait += queue[-1] - now
+            for worker, queue in pending.items():
+                while queue and queue[0] <= now:  # done, ask for the next frame
+                    queue.pop(0)
+                    done[worker] += 1
+                    worker.send_multipart([b"", b"bench", CREDITS.pack(1)])
+        total = sum(done.values())
+        return {
+            "throughput_fps": total / SECONDS,
+            "slow_pct": 100 * done[workers[-1]] / total if total else 0.0,
+            "wait_ms": wait / total * 1e3 if total else 0.0,
+        }
+
+
+def run():
+    jpeg = codecs.lookup("jpeg").encode(frame(ps.TEST_M))
+    rows = []
+    for mode in ("req", "credits"):
+        for nworkers in WORKERS:
+            rows.append(
+                {"case": f"{mode} x{nworkers}", "throughput_fps": measure(mode, nworkers, jpeg)}
+            )
+    for nthread in (1, 3):
+        rows.append(
+            {"case": f"requester x{nthread}", "throughput_fps": measure_requester(nthread, jpeg)}
+        )
+    for policy in DIST_POLICIES:
+        rows.append({"case": f"{policy} x{HETERO}", **measure_policy(policy, jpeg)})
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_dist", run, __doc__)
@@ -0,0 +1,262 @@
+"""Latency and throughput of a single hop through each device, and of the raw transports
+they are built on.
+
+Devices run in their own processes, so their hops are measured over ipc. inproc only
+works within a process and is measured for the bare transport only, next to ipc and tcp.
+Frames are the TEST_M test card, raw for the encoder and JPEG compressed otherwise.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_hops
+"""
+
+import contextlib
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+import numpy as np
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.video import FRAMEMISS, STOPSTREAM, codecs
+
+from . import common
+from .bench_codec import frame
+
+LATENCY_FRAMES = 200
+IDLE = 0.002  # seconds between latency probes, so frames do not queue
+THROUGHPUT_SECONDS = 1.0
+
+
+@dataclass
+class Hop:
+    send: Callable[[int], bool]  # False if the hop pushed back
+    recv: Callable[[int], intf.RecvData | None]  # None on timeout
+    nbytes: int
+
+
+def pusher(socket: zmq.Socket, **payload) -> Callable[[int], bool]:
+    def send(fno: int) -> bool:
+        try:
+            intf.send(
+                socket=socket, fno=fno, ftime=time.time(), meta=None, flags=zmq.NOBLOCK, **payload
+            )
+        except zmq.Again:
+            return False
+        return True
+
+    return send
+
+
+def puller(socket: zmq.Socket, **kwargs) -> Callable[[int], intf.RecvData | None]:
+    def recv(timeout: int) -> intf.RecvData | None:
+        if not socket.poll(timeout):
+            return None
+        return intf.recv(socket=socket, flags=zmq.NOBLOCK, copy=False, **kwargs)
+
+    return recv
+
+
+def requester(socket: zmq.Socket, track: str) -> Callable[[int], intf.RecvData | None]:
+    def recv(timeout: int) -> intf.RecvData | None:
+        deadline = time.time() + timeout / 1000
+        while True:  # ask until there is a frame, at least once
+            socket.send(track.encode())
+            if not socket.poll(1000):
+                raise TimeoutError("Distributor did not reply")
+            data = intf.recv(socket=socket, buf=True)
+            if data.fno != FRAMEMISS:
+                return data
+            if time.time() >= deadline:
+                return None
+
+    return recv
+
+
+@contextlib.contextmanager
+def sockets(*types: int) -> Iterator[list[zmq.Socket]]:
+    context = zmq.Context.instance()
+    socks = [context.socket(t) for t in types]
+    try:
+        yield socks
+    finally:
+        for s in socks:
+            s.close(linger=0)
+
+
+@contextlib.contextmanager
+def running(*devices) -> Iterator[None]:
+    for device in devices:
+        device.start()
+    try:
+        yield
+    finally:
+        for device in reversed(devices):
+            device.stop()
+
+
+def transport(kind: str, jpeg: bytes) -> contextlib.AbstractContextManager[Hop]:
+    @contextlib.contextmanager
+    def hop():
+        with sockets(zmq.PUSH, zmq.PULL) as (src, sink):
+            endpoint = {
+                "inproc": "inproc://benchhops" + uuid.uuid1().hex,
+                "ipc": "ipc:///tmp/benchhops" + uuid.uuid1().hex,
+                "tcp": "tcp://127.0.0.1:*",
+            }[kind]
+            src.bind(endpoint)
+            sink.connect(src.getsockopt_string(zmq.LAST_ENDPOINT))
+            yield Hop(pusher(src, buf=jpeg), puller(sink, buf=True), len(jpeg))
+
+    return hop()
+
+
+@contextlib.contextmanager
+def encoder(raw: np.ndarray) -> Iterator[Hop]:
+    enc = ps.EncoderDevice(2, uuid.uuid1().hex)
+    with sockets(zmq.PULL) as (sink,):
+        sink.bind(enc.outfd)
+        with running(enc):
+            # bypass the rate controller, this measures the hop alone
+            yield Hop(pusher(enc.sender, arr=raw), puller(sink, buf=True), raw.nbytes)
+
+
+@contextlib.contextmanager
+def decoder(jpeg: bytes) -> Iterator[Hop]:
+    dec = ps.DecoderDevice(2, uuid.uuid1().hex)
+    with sockets(zmq.PUSH) as (src,):
+        src.bind(dec.infd)
+        with running(dec):
+            yield Hop(pusher(src, buf=jpeg), puller(dec.receiver, arr=True), len(jpeg))
+
+
+@contextlib.contextmanager
+def publisher(jpeg: bytes) -> Iterator[Hop]:
+    seed = uuid.uuid1().hex
+    pub = ps.PublisherDevice("ipc:///tmp/benchpub" + seed, seed)
+    with sockets(zmq.PUSH, zmq.SUB) as (src, sink):
+        src.connect(pub.infd)
+        sink.subscribe(b"")
+        sink.connect(pub.outfd)
+        with running(pub):
+            yield Hop(pusher(src, buf=jpeg), puller(sink, buf=True), len(jpeg))
+
+
+@contextlib.contextmanager
+def subscriber(jpeg: bytes) -> Iterator[Hop]:
+    seed = uuid.uuid1().hex
+    endpoint = "ipc:///tmp/benchsub" + seed
+    sub = ps.SubscriberDevice(endpoint, seed)
+    with sockets(zmq.PUB, zmq.PULL) as (src, sink):
+        src.bind(endpoint)
+        sink.connect(sub.outfd)
+        with running(sub):
+            yield Hop(pusher(src, buf=jpeg), puller(sink, buf=True), len(jpeg))
+
+
+@contextlib.contextmanager
+def collector(jpeg: bytes) -> Iterator[Hop]:
+    seed = uuid.uuid1().hex
+    col = ps.CollectDevice("ipc:///tmp/benchcollect" + seed, seed)
+    with sockets(zmq.PUSH, zmq.PULL) as (src, sink):
+        src.connect(col.infd)
+        sink.connect(col.outfd)
+        with running(col):
+            yield Hop(pusher(src, buf=jpeg), puller(sink, buf=True), len(jpeg))
+
+
+@contextlib.contextmanager
+def distributor(jpeg: bytes) -> Iterator[Hop]:
+    seed = uuid.uuid1().hex
+    dist = ps.DistributorDevice(["bench"], "ipc:///tmp/benchdist" + seed, seed)
+    with sockets(zmq.PUSH, zmq.REQ) as (src, sink):
+        src.connect(dist.infd)
+        sink.connect(dist.endpoint)
+        with running(dist):
+            yield Hop(pusher(src, buf=jpeg), requester(sink, "bench"), len(jpeg))
+
+
+def warm(hop: Hop) -> None:
+    """Send until frames come through, which covers any subscription handshake."""
+    deadline = time.time() + 5
+    while hop.recv(10) is None:
+        if time.time() > deadline:
+            raise TimeoutError("Hop did not deliver any frame")
+        hop.send(STOPSTREAM)
+    while hop.recv(100) is not None:
+        pass
+
+
+def latency(hop: Hop) -> tuple[np.ndarray, int]:
+    """Seconds for one frame to cross an idle hop, and the number of frames lost."""
+    times, lost = [], 0
+    for fno in range(LATENCY_FRAMES):
+        start = time.perf_counter()
+        hop.send(fno)
+        while True:
+            data = hop.recv(1000)
+            if data is None or data.fno == fno:
+                break
+        if data is None:
+            lost += 1
+        else:
+            times.append(time.perf_counter() - start)
+        time.sleep(IDLE)
+    return np.array(times), lost
+
+
+def throughput(hop: Hop) -> float:
+    """Frames per second delivered while the hop is kept saturated."""
+    received = 0
+    start = time.perf_counter()
+    fno = 0
+    while time.perf_counter() - start < THROUGHPUT_SECONDS:
+        if hop.send(fno):
+            fno += 1
+        while hop.recv(0) is not None:
+            received += 1
+    elapsed = time.perf_counter() - start
+    while hop.recv(100) is not None:  # frames queued upstream do not count
+        pass
+    return received / elapsed
+
+
+def run():
+    raw = frame(ps.TEST_M)
+    jpeg = codecs.lookup("jpeg").encode(raw)
+    hops = {
+        "transport inproc": lambda: transport("inproc", jpeg),
+        "transport ipc": lambda: transport("ipc", jpeg),
+        "transport tcp": lambda: transport("tcp", jpeg),
+        "EncoderDevice": lambda: encoder(raw),
+        "DecoderDevice": lambda: decoder(jpeg),
+        "PublisherDevice": lambda: publisher(jpeg),
+        "SubscriberDevice": lambda: subscriber(jpeg),
+        "CollectDevice": lambda: collector(jpeg),
+        "DistributorDevice": lambda: distributor(jpeg),
+    }
+    rows = []
+    for name, make in hops.items():
+        with make() as hop:
+            warm(hop)
+            times, lost = latency(hop)
+            warm(hop)
+            fps = throughput(hop)
+        rows.append(
+            {
+                "case": name,
+                "p50_ms": float(np.median(times)) * 1e3,
+                "p99_ms": float(np.percentile(times, 99)) * 1e3,
+                "lost": lost,
+                "throughput_fps": fps,
+                "input_mbps": fps * hop.nbytes * 8 / 1e6,
+            }
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_hops", run, __doc__)
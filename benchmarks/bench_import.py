@@ -0,0 +1,46 @@
+"""Time for a fresh interpreter to import pystreaming, and some of its public names, as
+every short-lived tool pays it. "python" is the interpreter starting alone, which every
+other case includes. Names are imported on first access, so the package alone loads
+neither numpy nor zmq, and only the names used pull in their modules.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_import
+"""
+
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from . import common
+
+RUNS = 10
+CASES = {
+    "python": "pass",
+    "import pystreaming": "import pystreaming",
+    "AudioReceiver": "from pystreaming import AudioReceiver",
+    "Streamer": "from pystreaming import Streamer",
+    "import *": "from pystreaming import *",
+}
+
+
+def elapsed(code: str) -> float:
+    """Seconds for a fresh interpreter to run code and exit."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def run():
+    rows = []
+    for case, code in CASES.items():
+        elapsed(code)  # warm the file system cache
+        times = [elapsed(code) for _ in range(RUNS)]
+        rows.append({"case": case, "p50_ms": float(np.median(times)) * 1e3})
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_import", run, __doc__)
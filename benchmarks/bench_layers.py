@@ -0,0 +1,52 @@
+"""Simulcast cost in an encoder process: downscaling a frame to every layer and encoding
+each, against encoding the full frame only, on the bundled 720p and 1080p images. "kb"
+is the size of every layer, the bytes a receiver of that layer gets per frame.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_layers
+"""
+
+from pystreaming import IMAG_L, IMAG_M, Layer
+from pystreaming.video import QUALITY, codecs
+from pystreaming.video.layers import pyramid
+
+from . import common
+from .bench_codec import frame, rate
+
+IMAGES = {"IMAG_M": IMAG_M, "IMAG_L": IMAG_L}
+SETS = {
+    "full": [Layer(1.0)],
+    "full + 1/2 + 1/4": [Layer(1.0), Layer(0.5, 60), Layer(0.25, 40)],
+    "1/2 + 1/4 + 1/8": [Layer(0.5), Layer(0.25, 60), Layer(0.125, 40)],
+}
+
+
+def encode(jpeg: codecs.Codec, arr, layers: list[Layer]) -> list[bytes]:
+    """What enc_ps does with every frame."""
+    return [
+        jpeg.encode(scaled, quality=QUALITY if layer.quality is None else layer.quality)
+        for layer, scaled in zip(layers, pyramid(arr, layers), strict=True)
+    ]
+
+
+def run():
+    jpeg = codecs.lookup("jpeg")
+    rows = []
+    for name, card in IMAGES.items():
+        arr = frame(card)
+        for label, layers in SETS.items():
+            bufs = encode(jpeg, arr, layers)
+            rows.append(
+                {
+                    "case": f"{name} {arr.shape[1]}x{arr.shape[0]} {label}",
+                    "kb": " / ".join(f"{len(buf) / 1024:.1f}" for buf in bufs),
+                    "resize_ms": rate(pyramid, arr, layers) * 1e3,
+                    "encode_ms": rate(encode, jpeg, arr, layers) * 1e3,
+                }
+            )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_layers", run, __doc__)
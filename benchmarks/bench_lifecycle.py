@@ -0,0 +1,66 @@
+"""Time to start and to stop a Streamer, a Receiver and a Worker, cold and warm. Cold
+patterns spawn their processes on every start and join them on every stop. Warm patterns
+spawn them on the first start only, which is left out, and keep them across stops, see
+Device(warm=True). Nothing is streamed, so only the lifecycle itself is timed.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lifecycle
+"""
+
+import time
+import uuid
+
+import numpy as np
+
+import pystreaming as ps
+
+from . import common
+
+CYCLES = 10
+NPROCS = (2, 8)
+
+
+def endpoint() -> str:
+    return "ipc:///tmp/benchlifecycle" + uuid.uuid1().hex
+
+
+PATTERNS = {
+    "Streamer": lambda nproc, warm: ps.Streamer(endpoint(), nproc=nproc, warm=warm),
+    "Receiver": lambda nproc, warm: ps.Receiver(endpoint(), nproc=nproc, warm=warm),
+    "Worker": lambda nproc, warm: ps.Worker(endpoint(), endpoint(), decproc=nproc, warm=warm),
+}
+
+
+def cycle(pattern) -> tuple[float, float]:
+    """Seconds to start, and then to stop, the pattern."""
+    start = time.perf_counter()
+    pattern.start()
+    started = time.perf_counter()
+    pattern.stop()
+    return started - start, time.perf_counter() - started
+
+
+def run():
+    rows = []
+    for name, make in PATTERNS.items():
+        for nproc in NPROCS:
+            for mode in ("cold", "warm"):
+                pattern = make(nproc, mode == "warm")
+                try:
+                    cycle(pattern)  # spawns the warm processes
+                    starts, stops = zip(*(cycle(pattern) for _ in range(CYCLES)), strict=True)
+                finally:
+                    pattern.close()
+                rows.append(
+                    {
+                        "case": f"{name} nproc={nproc} / {mode}",
+                        "start_ms": float(np.median(starts)) * 1e3,
+                        "stop_ms": float(np.median(stops)) * 1e3,
+                    }
+                )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_lifecycle", run, __doc__)
@@ -0,0 +1,139 @@
+"""Playout buffer cost and timing with many concurrent streams: the OrderedDict buffer used
+before PlayoutBuffer, buffer() over the same generator handlers, and PlayoutBuffer waiting
+on the stream sockets directly.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_playout
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import zmq
+
+from pystreaming.stream import interface as intf
+from pystreaming.stream.handlers import buffer
+from pystreaming.stream.playout import PlayoutBuffer, SocketSource
+
+from . import common
+
+STREAMS = (8, 16)
+FPS = 30
+DELAY = 0.1
+SECONDS = 3
+MISS_SLEEP = 0.001
+
+
+def legacy_buffer(bufferlen, handlers):
+    """The per-stream OrderedDict buffer used before PlayoutBuffer."""
+    primed = {k: handlers[k]() for k in handlers}
+    buffers = {k: OrderedDict() for k in primed}
+    tdelta = None
+    while True:
+        for k, handler in primed.items():
+            data = next(handler)
+            buf = buffers[k]
+            if data is None:
+                time.sleep(MISS_SLEEP)
+            else:
+                ftime = data.ftime
+                if tdelta is None:
+                    tdelta = ftime - time.time()
+                if tdelta is not None and ftime < time.time() + tdelta - bufferlen:
+                    continue
+                buf[ftime] = data
+            if buf.keys():
+                mint = min(buf.keys())
+                if tdelta is not None and mint < time.time() + tdelta - bufferlen:
+                    yield (k, buf.pop(mint))
+
+
+def generator(socket):
+    def handler():
+        while True:
+            yield intf.recv(socket=socket, buf=True) if socket.poll(0) else None
+
+    return handler
+
+
+def produce(sockets, stop):
+    """Send one frame per stream every 1 / FPS seconds, staggered across the period."""
+    fno = 0
+    start = time.time()
+    while not stop.is_set():
+        for i, socket in enumerate(sockets):
+            due = start + fno / FPS + i / FPS / len(sockets)
+            time.sleep(max(0.0, due - time.time()))
+            intf.send(socket=socket, fno=fno, ftime=time.time(), meta=None, buf=b"x" * 1000)
+        fno += 1
+
+
+def measure(nstreams, make):
+    context = zmq.Context.instance()
+    senders, receivers = [], []
+    for _ in range(nstreams):
+        a, b = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+        endpoint = "inproc://bench_playout" + uuid.uuid1().hex
+        a.bind(endpoint)
+        b.connect(endpoint)
+        senders.append(a)
+        receivers.append(b)
+    stop = threading.Event()
+    producer = threading.Thread(target=produce, args=(senders, stop))
+    producer.start()
+    lateness = []
+    try:
+        cpu = time.thread_time()
+        end = time.time() + SECONDS
+        for _, data in make(receivers):
+            now = time.time()
+            lateness.append(now - (data.ftime + DELAY))
+            if now > end:
+                break
+        cpu = time.thread_time() - cpu
+    finally:
+        stop.set()
+        producer.join()
+        for socket in senders + receivers:
+            socket.close(linger=0)
+    lateness = np.array(lateness[len(lateness) // 10 :])  # skip warm up
+    return (
+        len(lateness),
+        cpu / SECONDS,
+        float(np.median(lateness)),
+        float(np.percentile(lateness, 99)),
+    )
+
+
+def run():
+    engines = {
+        "legacy": lambda rs: legacy_buffer(
+            DELAY, {f"s{i}": generator(r) for i, r in enumerate(rs)}
+        ),
+        "buffer()": lambda rs: buffer(DELAY, {f"s{i}": generator(r) for i, r in enumerate(rs)}),
+        "sockets": lambda rs: PlayoutBuffer(
+            DELAY, {f"s{i}": SocketSource(r, buf=True) for i, r in enumerate(rs)}
+        ),
+    }
+    rows = []
+    for nstreams in STREAMS:
+        for name, make in engines.items():
+            frames, cpu, p50, p99 = measure(nstreams, make)
+            rows.append(
+                {
+                    "case": f"{nstreams} streams / {name}",
+                    "frames": frames,
+                    "cpu_pct": cpu * 100,
+                    "lateness_p50_ms": p50 * 1e3,
+                    "lateness_p99_ms": p99 * 1e3,
+                }
+            )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_playout", run, __doc__)
@@ -0,0 +1,107 @@
+"""Cost of handing a raw frame to an encoder process, over ipc and through the shared
+memory FrameRing. A zero-copy ipc send returns before zmq has copied the frame, so the
+whole handoff is timed: write, send and receive. "decoded" cases time the way back, a
+decoder process decoding a 1080p JPEG frame and handing it to the consumer, over ipc or
+decoded straight into a slot of the DecoderDevice(shm=True) pool.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ring
+"""
+
+import time
+import uuid
+
+import numpy as np
+import zmq
+
+from pystreaming import TEST_L
+from pystreaming.stream import interface as intf
+from pystreaming.stream.ring import FramePool, FrameRing
+from pystreaming.video import codecs
+
+from . import common
+from .bench_codec import frame as testframe
+
+N = 200
+SIZES = {"1920x1080": (1080, 1920, 3), "3840x2160": (2160, 3840, 3)}
+
+
+def handoff(frame, ring=None):
+    """Mean seconds per frame handed from a PUSH socket to a PULL socket."""
+    context = zmq.Context.instance()
+    endpoint = "ipc:///tmp/benchring" + uuid.uuid1().hex
+    push, pull = context.socket(zmq.PUSH), context.socket(zmq.PULL)
+    push.bind(endpoint)
+    pull.connect(endpoint)
+    try:
+        start = time.perf_counter()
+        for fno in range(N):
+            slot = None
+            if ring is not None:
+                slot = ring.acquire()
+                ring.view(slot, frame.dtype, frame.shape)[...] = frame
+            intf.send(socket=push, fno=fno, ftime=time.time(), meta=None, arr=frame, slot=slot)
+            data = intf.recv(socket=pull, arr=True, copy=False, ring=ring)
+            if data.slot is not None:
+                ring.release(data.slot)
+        return (time.perf_counter() - start) / N
+    finally:
+        push.close(linger=0)
+        pull.close(linger=0)
+
+
+def returned(buf, shape, name=None):
+    """Mean seconds per JPEG frame decoded and handed to the consumer, as in dec_ps."""
+    jpeg = codecs.lookup("jpeg")
+    context = zmq.Context.instance()
+    endpoint = "ipc:///tmp/benchring" + uuid.uuid1().hex
+    push, pull = context.socket(zmq.PUSH), context.socket(zmq.PULL)
+    push.bind(endpoint)
+    pull.connect(endpoint)
+    ring = pool = None
+    if name is not None:
+        ring = FrameRing.create(name + "0", 4, int(np.prod(shape)))
+        pool = FramePool(name, 4)
+    try:
+        start = time.perf_counter()
+        for fno in range(N):
+            slot = None if ring is None else ring.acquire()
+            out = None if slot is None else ring.view(slot, np.uint8, shape)
+            arr = jpeg.decode(buf, out=out)
+            intf.send(socket=push, fno=fno, ftime=time.time(), meta=None, arr=arr, slot=slot)
+            data = intf.recv(socket=pull, arr=True, copy=False, ring=pool)
+            del data, arr, out  # hands the slot back
+        return (time.perf_counter() - start) / N
+    finally:
+        push.close(linger=0)
+        pull.close(linger=0)
+        if ring is not None:
+            pool.close()
+            ring.unlink()
+
+
+def run():
+    rows = []
+    for name, shape in SIZES.items():
+        frame = np.random.randint(0, 255, shape, dtype=np.uint8)
+        ring = FrameRing.create("psbench" + uuid.uuid1().hex[:20], 4, frame.nbytes)
+        try:
+            for transport, r in (("ipc", None), ("shm", ring)):
+                rows.append(
+                    {"case": f"{name} / {transport}", "handoff_ms": handoff(frame, r) * 1e3}
+                )
+        finally:
+            ring.unlink()
+    arr = testframe(TEST_L)
+    buf = codecs.lookup("jpeg").encode(arr)
+    name = f"{arr.shape[1]}x{arr.shape[0]} decoded"
+    for transport, pool in (("ipc", None), ("pool", "psbench" + uuid.uuid1().hex[:20])):
+        rows.append(
+            {"case": f"{name} / {transport}", "handoff_ms": returned(buf, arr.shape, pool) * 1e3}
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_ring", run, __doc__)
@@ -0,0 +1,100 @@
+"""Per-message overhead of the wire format, before and after the binary header,
+and with zero-copy receive.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_wire
+"""
+
+import time
+
+import numpy as np
+import zmq
+
+from pystreaming.stream import interface as intf
+
+from . import common
+
+N = 2000
+SIZES = {"640x480": (480, 640, 3), "1920x1080": (1080, 1920, 3)}
+JPEG_RATIO = 10  # rough size of a compressed frame relative to the raw frame
+
+
+def legacy_send(socket, fno, ftime, meta, arr=None, buf=None):
+    """The six part, pickled wire format used before version 1."""
+    if arr is not None:
+        socket.send_json({"dtype": str(arr.dtype), "shape": arr.shape}, flags=zmq.SNDMORE)
+        socket.send(arr, copy=False, flags=zmq.SNDMORE)
+    if buf is not None:
+        socket.send(buf, copy=False, flags=zmq.SNDMORE)
+    socket.send_pyobj(meta, flags=zmq.SNDMORE)
+    socket.send_pyobj(ftime, flags=zmq.SNDMORE)
+    socket.send_pyobj(fno)
+
+
+def legacy_recv(socket, arr=False, buf=False):
+    arr_data = buf_data = None
+    if arr:
+        md = socket.recv_json()
+        msg = socket.recv(copy=False)
+        arr_data = np.frombuffer(memoryview(msg.bytes), dtype=md["dtype"]).reshape(md["shape"])
+    if buf:
+        buf_data = socket.recv(copy=False).bytes
+    meta = socket.recv_pyobj()
+    ftime = socket.recv_pyobj()
+    fno = socket.recv_pyobj()
+    return intf.RecvData(meta=meta, ftime=ftime, fno=fno, arr=arr_data, buf=buf_data)
+
+
+def current_send(socket, fno, ftime, meta, arr=None, buf=None):
+    intf.send(socket=socket, fno=fno, ftime=ftime, meta=meta, arr=arr, buf=buf)
+
+
+def current_recv(socket, arr=False, buf=False):
+    return intf.recv(socket=socket, arr=arr, buf=buf)
+
+
+def zerocopy_recv(socket, arr=False, buf=False):
+    return intf.recv(socket=socket, arr=arr, buf=buf, copy=False)
+
+
+def roundtrip(a, b, send, recv, n, **payload):
+    """Mean seconds per send + recv over n messages."""
+    expect = dict.fromkeys(payload, True)
+    start = time.perf_counter()
+    for fno in range(n):
+        send(a, fno, time.time(), None, **payload)
+        recv(b, **expect)
+    return (time.perf_counter() - start) / n
+
+
+def run():
+    context = zmq.Context.instance()
+    a, b = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+    a.bind("inproc://bench_wire")
+    b.connect("inproc://bench_wire")
+    formats = {
+        "legacy": (legacy_send, legacy_recv),
+        "v1": (current_send, current_recv),
+        "v1 view": (current_send, zerocopy_recv),
+    }
+    payloads = {"empty buf": {"buf": b""}}  # pure per-message overhead
+    for name, shape in SIZES.items():
+        arr = np.random.randint(0, 255, shape, dtype=np.uint8)
+        payloads[f"{name} arr"] = {"arr": arr}
+        payloads[f"{name} buf"] = {"buf": arr.tobytes()[: arr.nbytes // JPEG_RATIO]}
+    rows = []
+    try:
+        for label, payload in payloads.items():
+            for fmt, (send, recv) in formats.items():
+                roundtrip(a, b, send, recv, N // 10, **payload)  # warm up
+                mean = roundtrip(a, b, send, recv, N, **payload)
+                rows.append({"case": f"{label} / {fmt}", "roundtrip_us": mean * 1e6})
+    finally:
+        a.close(linger=0)
+        b.close(linger=0)
+    return rows
+
+
+if __name__ == "__main__":
+    common.main("bench_wire", run, __doc__)
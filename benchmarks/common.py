@@ -0,0 +1,136 @@
+"""Helpers shared by the benchmark modules.
+
+Every module exposes run(), returning a list of rows. A row is a dict with a "case" name,
+unique within its benchmark, and metrics whose names end in their unit. Time-like units
+(_us, _ms, _pct) are better lower, throughput units (_fps, _mbps) are better higher, and
+anything else (frame counts, sizes) is informational.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+LOWER_IS_BETTER = ("_us", "_ms", "_pct")
+HIGHER_IS_BETTER = ("_fps", "_mbps")
+
+
+def environment() -> dict[str, str]:
+    """Versions and machine the results were measured with."""
+    import numpy as np
+    import zmq
+
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "pyzmq": zmq.__version__,
+        "libzmq": zmq.zmq_version(),
+    }
+    try:
+        from importlib.metadata import version
+
+        env["turbojpeg"] = version("PyTurboJPEG")
+    except Exception:
+        pass
+    return env
+
+
+def document(results: dict[str, list[dict[str, Any]]]) -> dict[str, Any]:
+    """Wrap benchmark results, keyed by benchmark name, for writing as JSON."""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "env": environment(),
+        "benchmarks": results,
+    }
+
+
+def write(doc: dict[str, Any], path: str) -> None:
+    """Write a results document to path, or to stdout if path is "-"."""
+    text = json.dumps(doc, indent=2)
+    if path == "-":
+        print(text)
+    else:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+
+
+def table(rows: list[dict[str, Any]]) -> str:
+    """Format rows as a plain text table."""
+    if not rows:
+        return "(no results)"
+    columns = list(dict.fromkeys(c for row in rows for c in row))  # in order of appearance
+    cells = [[_cell(row.get(c)) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    return "\n".join(_line(r, widths) for r in [columns, *cells])
+
+
+def _line(cells: list[str], widths: list[int]) -> str:
+    """Case names left aligned, metrics right aligned."""
+    first, *rest = zip(cells, widths, strict=True)
+    return "  ".join([first[0].ljust(first[1]), *(c.rjust(w) for c, w in rest)])
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.3g}" if abs(value) < 100 else f"{value:.0f}"
+    return "" if value is None else str(value)
+
+
+def compare(
+    old: dict[str, Any], new: dict[str, Any], tolerance: float
+) -> list[tuple[str, str, str, float]]:
+    """Find metrics that got worse by more than tolerance between two results documents.
+
+    Args:
+        old (dict): Baseline results document.
+        new (dict): Current results document.
+        tolerance (float): Allowed relative change, such as 0.1 for 10%.
+
+    Returns:
+        list: (benchmark, case, metric, how much worse, relatively) of every regression.
+    """
+    regressions = []
+    for name, rows in new["benchmarks"].items():
+        baseline = {row["case"]: row for row in old["benchmarks"].get(name, [])}
+        for row in rows:
+            before = baseline.get(row["case"])
+            if before is None:
+                continue
+            for metric, value in row.items():
+                was = before.get(metric)
+                if (
+                    not isinstance(value, int | float)
+                    or not isinstance(was, int | float)
+                    or not was
+                ):
+                    continue
+                change = (value - was) / abs(was)
+                if metric.endswith(HIGHER_IS_BETTER):
+                    change = -change
+                elif not metric.endswith(LOWER_IS_BETTER):
+                    continue
+                if change > tolerance:
+                    regressions.append((name, row["case"], metric, change))
+    return regressions
+
+
+def main(name: str, run: Callable[[], list[dict[str, Any]]], doc: str | None = None) -> None:
+    """Command line entry point of a single benchmark module.
+
+    Args:
+        name (str): Benchmark name, the key of its results in the JSON document.
+        run (callable): Runs the benchmark and returns its rows.
+        doc (str, optional): Description shown by --help. Defaults to None.
+    """
+    parser = argparse.ArgumentParser(prog=f"python -m benchmarks.{name}", description=doc)
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON, - for stdout")
+    args = parser.parse_args()
+    rows = run()
+    print(table(rows), file=sys.stderr if args.json == "-" else sys.stdout)
+    if args.json:
+        write(document({name: rows}), args.json)
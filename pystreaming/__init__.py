@@ -1,44 +1,136 @@
-from pystreaming.audio.patterns import AudioReceiver, AudioStreamer
-from pystreaming.stream.handlers import buffer, dispfps, display
-from pystreaming.stream.patterns import Receiver, Streamer, Worker
-from pystreaming.video.collect import CollectDevice
-from pystreaming.video.dec import DecoderDevice
-from pystreaming.video.dist import DistributorDevice
-from pystreaming.video.enc import EncoderDevice
-from pystreaming.video.pub import PublisherDevice
-from pystreaming.video.req import RequesterDevice
-from pystreaming.video.sub import SubscriberDevice
-from pystreaming.video.testimages import (
-    IMAG_L,
-    IMAG_M,
-    IMAG_S,
-    TEST_L,
-    TEST_M,
-    TEST_S,
-    loadimage,
-)
+"""Public names are imported on first access, so that importing pystreaming, or one of its
+modules, only loads what is used: a process that only receives audio never imports the
+video devices, zmq.asyncio or turbojpeg.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from pystreaming.audio.patterns import AudioReceiver, AudioStreamer
+    from pystreaming.stream.aio import (
+        AsyncAudioReceiver,
+        AsyncReceiver,
+        AsyncStreamer,
+        AsyncWorker,
+    )
+    from pystreaming.stream.batch import Batcher, FrameBatch
+    from pystreaming.stream.handlers import buffer, dispfps, display
+    from pystreaming.stream.patterns import Receiver, Streamer, Worker
+    from pystreaming.stream.playout import PlayoutBuffer, SocketSource
+    from pystreaming.stream.reorder import ReorderBuffer
+    from pystreaming.video.codecs import Codec, DecodeProfile
+    from pystreaming.video.collect import CollectDevice
+    from pystreaming.video.dec import DecoderDevice
+    from pystreaming.video.delta import TileDelta
+    from pystreaming.video.dist import DistributorDevice
+    from pystreaming.video.enc import EncoderDevice
+    from pystreaming.video.layers import Layer
+    from pystreaming.video.pub import PublisherDevice
+    from pystreaming.video.rate import RateController
+    from pystreaming.video.req import RequesterDevice
+    from pystreaming.video.sub import SubscriberDevice
+    from pystreaming.video.testimages import (
+        IMAG_L,
+        IMAG_M,
+        IMAG_S,
+        TEST_L,
+        TEST_M,
+        TEST_S,
+        encodecard,
+        loadimage,
+    )
+
+# Module of every public name
+_MODULES = {
+    "AsyncAudioReceiver": "pystreaming.stream.aio",
+    "AsyncReceiver": "pystreaming.stream.aio",
+    "AsyncStreamer": "pystreaming.stream.aio",
+    "AsyncWorker": "pystreaming.stream.aio",
+    "AudioReceiver": "pystreaming.audio.patterns",
+    "AudioStreamer": "pystreaming.audio.patterns",
+    "Batcher": "pystreaming.stream.batch",
+    "buffer": "pystreaming.stream.handlers",
+    "Codec": "pystreaming.video.codecs",
+    "CollectDevice": "pystreaming.video.collect",
+    "DecodeProfile": "pystreaming.video.codecs",
+    "DecoderDevice": "pystreaming.video.dec",
+    "dispfps": "pystreaming.stream.handlers",
+    "display": "pystreaming.stream.handlers",
+    "DistributorDevice": "pystreaming.video.dist",
+    "encodecard": "pystreaming.video.testimages",
+    "EncoderDevice": "pystreaming.video.enc",
+    "FrameBatch": "pystreaming.stream.batch",
+    "IMAG_L": "pystreaming.video.testimages",
+    "IMAG_M": "pystreaming.video.testimages",
+    "IMAG_S": "pystreaming.video.testimages",
+    "Layer": "pystreaming.video.layers",
+    "loadimage": "pystreaming.video.testimages",
+    "PlayoutBuffer": "pystreaming.stream.playout",
+    "PublisherDevice": "pystreaming.video.pub",
+    "RateController": "pystreaming.video.rate",
+    "Receiver": "pystreaming.stream.patterns",
+    "ReorderBuffer": "pystreaming.stream.reorder",
+    "RequesterDevice": "pystreaming.video.req",
+    "SocketSource": "pystreaming.stream.playout",
+    "Streamer": "pystreaming.stream.patterns",
+    "SubscriberDevice": "pystreaming.video.sub",
+    "TEST_L": "pystreaming.video.testimages",
+    "TEST_M": "pystreaming.video.testimages",
+    "TEST_S": "pystreaming.video.testimages",
+    "TileDelta": "pystreaming.video.delta",
+    "Worker": "pystreaming.stream.patterns",
+}
 
 __all__ = [
+    "AsyncAudioReceiver",
+    "AsyncReceiver",
+    "AsyncStreamer",
+    "AsyncWorker",
     "AudioReceiver",
     "AudioStreamer",
+    "Batcher",
     "buffer",
+    "Codec",
     "CollectDevice",
+    "DecodeProfile",
     "DecoderDevice",
     "dispfps",
     "display",
     "DistributorDevice",
+    "encodecard",
     "EncoderDevice",
+    "FrameBatch",
     "IMAG_L",
     "IMAG_M",
     "IMAG_S",
+    "Layer",
     "loadimage",
+    "PlayoutBuffer",
     "PublisherDevice",
+    "RateController",
     "Receiver",
+    "ReorderBuffer",
     "RequesterDevice",
+    "SocketSource",
     "Streamer",
     "SubscriberDevice",
     "TEST_L",
     "TEST_M",
     "TEST_S",
+    "TileDelta",
     "Worker",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    """Import a public name from its module, on first access."""
+    if name not in _MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_MODULES[name]), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
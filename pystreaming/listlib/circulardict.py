@@ -61,6 +61,17 @@ class CircularOrderedDict(Generic[K, V]):
         """
         return self.dict.keys()
 
+    def __contains__(self, key: object) -> bool:
+        """Whether a key is in the dictionary.
+
+        Args:
+            key (pyobj): Key to look up.
+
+        Returns:
+            bool: True if the key exists.
+        """
+        return key in self.dict
+
     def __len__(self) -> int:
         """Number of key-value pairs in the dictionary.
 
@@ -5,6 +5,20 @@ TESTCARD_FPS = 30
 TESTCARD_ANGLE_STEP = 3
 DEGREES_IN_CIRCLE = 360
 
+# Reorder constants
+REORDER_MAXSIZE = 64  # frames
+
+# Trace constants
+TRACE_WINDOW = 1000  # frames kept per stage for percentiles
+
+# Batch constants
+BATCH_SIZE = 8  # frames
+BATCH_LATENCY = 0.02  # seconds a batch waits to fill after its first frame
+BATCH_BUFFERS = 2  # batches kept before their buffer is reused
+
+# Playout constants
+PLAYOUT_BURST = 32  # frames received from one source per wakeup
+
 # Handler constants
 BUFFER_HANDLER_MISS_SLEEP = 0.001  # seconds
 DISPLAY_WAITKEY_TIMEOUT = 1  # milliseconds
@@ -0,0 +1,329 @@
+"""Counterparts of the patterns for asyncio, so that one event loop can serve many streams.
+
+The devices run in the background as before. Only the sockets the application talks to
+are awaited, through zmq.asyncio shadows of the sockets the patterns already own, so
+every frame goes through the same code as with the blocking patterns.
+"""
+
+import asyncio
+import contextlib
+import time
+from typing import Any
+
+import numpy as np
+import zmq
+import zmq.asyncio
+
+from ..audio.patterns import AudioReceiver
+from ..video.codecs import Codec
+from ..video.dec import DecoderDevice
+from .interface import RecvData
+from .patterns import Receiver, Streamer, Worker
+
+
+def shadow(socket: zmq.Socket | None) -> zmq.asyncio.Socket | None:
+    """An asyncio socket on the same zmq socket. Closing either one closes both."""
+    return None if socket is None else zmq.asyncio.Socket.from_socket(socket)
+
+
+def cancelling() -> bool:
+    """True if the current task itself is being cancelled, not just something it awaits."""
+    task = asyncio.current_task()
+    return bool(task is not None and getattr(task, "cancelling", lambda: 0)())
+
+
+async def writable(socket: zmq.asyncio.Socket | None, timeout: int | None) -> None:
+    """Wait for a socket to take a message without blocking, at most timeout milliseconds.
+
+    Raises:
+        RuntimeError: Raised if the socket is closed, or closed while waiting.
+    """
+    if socket is None:
+        raise RuntimeError("Stopped, start before sending")
+    try:
+        # the pyzmq stub gives Socket.poll the signature of Poller.poll, without flags
+        await socket.poll(timeout, flags=zmq.POLLOUT)  # ty: ignore[unknown-argument]
+    except asyncio.CancelledError:
+        if socket.closed and not cancelling():
+            raise RuntimeError("Stopped while waiting to send") from None
+        raise
+
+
+class Frames:
+    """Decoded frames of a DecoderDevice, awaited on the event loop, see AsyncReceiver."""
+
+    decoder: DecoderDevice
+    socket: zmq.asyncio.Socket | None = None
+
+    async def recv(self, timeout: int | None = None) -> RecvData:
+        """Receive a decoded frame, see DecoderDevice.recv.
+
+        Cancelling the call never loses a frame: frames are only taken off the socket
+        once they are ready to be returned.
+
+        Args:
+            timeout (int, optional): Timeout period in milliseconds.
+                Defaults to None, which waits forever.
+
+        Raises:
+            TimeoutError: Raised when no messages are received in the timeout period.
+            RuntimeError: Raised if stopped, or stopped while waiting.
+
+        Returns:
+            RecvData: {arr, buf, meta, ftime, fno}.
+        """
+        end = None if timeout is None else time.time() + timeout / 1000
+        while True:
+            if self.socket is None:
+                raise RuntimeError("Decoder device has been stopped")
+            with contextlib.suppress(TimeoutError):
+                return self.decoder.recv(timeout=0)
+            left = DecoderDevice._left(end)
+            if left == 0:
+                raise TimeoutError(
+                    f"No messages were received within the timeout period {timeout}ms"
+                )
+            wait = self.decoder.poll_timeout()  # a reorder deadline
+            if left is not None:
+                wait = left if wait is None else min(wait, left)
+            try:
+                await self.socket.poll(wait)
+            except asyncio.CancelledError:
+                if self.socket is None and not cancelling():
+                    raise RuntimeError("Decoder device has been stopped") from None
+                raise
+
+    def __aiter__(self) -> "Frames":
+        return self
+
+    async def __anext__(self) -> RecvData:
+        """The next decoded frame. Iteration ends once stopped."""
+        try:
+            return await self.recv()
+        except RuntimeError:
+            raise StopAsyncIteration from None
+
+
+class AsyncStreamer:
+    def __init__(self, endpoint: str, **kwargs: Any) -> None:
+        """Streamer whose send can be awaited, so an event loop waits on the encoders
+        rather than dropping the frames they cannot take yet.
+
+        Start and stop block for as long as those of Streamer do.
+
+        Args:
+            endpoint (str): Descriptor of video stream endpoint.
+            **kwargs: Passed to Streamer.
+        """
+        self.streamer = Streamer(endpoint, **kwargs)
+        self.sender: zmq.asyncio.Socket | None = None
+        self.injector: zmq.asyncio.Socket | None = None
+
+    def start(self) -> None:
+        """Start internal pystreaming devices."""
+        self.streamer.start()
+        self.sender = shadow(self.streamer.encoder.sender)
+        self.injector = shadow(self.streamer.injector)
+
+    def stop(self) -> None:
+        """Cleanup and stop internal pystreaming objects. Pending sends raise RuntimeError."""
+        sender, injector = self.sender, self.injector
+        self.sender = self.injector = None
+        for socket in (sender, injector):
+            if socket is not None:
+                socket.close(linger=0)
+        self.streamer.stop()
+
+    async def __aenter__(self) -> "AsyncStreamer":
+        self.start()
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback) -> None:
+        self.stop()
+
+    async def send(self, frame: np.ndarray, timeout: int | None = None) -> None:
+        """Send a video frame into the stream once an encoder can take it, see Streamer.send.
+
+        Args:
+            frame (np.ndarray): Video frame, in the pixel_format of the Streamer.
+            timeout (int, optional): Longest time to wait for an encoder in milliseconds,
+                after which the frame is sent anyway, and dropped like Streamer.send
+                would. Defaults to None, which waits forever.
+
+        Raises:
+            RuntimeError: Raised if the streamer is stopped, or stopped while waiting.
+        """
+        await writable(self.sender, timeout)
+        self.streamer.send(frame)
+
+    async def send_encoded(
+        self,
+        buf: bytes | memoryview,
+        codec: str | Codec = "jpeg",
+        meta: Any = None,
+        layer: int = 0,
+        timeout: int | None = None,
+    ) -> None:
+        """Send an already encoded frame once the stream can take it, see
+        Streamer.send_encoded.
+
+        Args:
+            buf (bytes): Encoded frame, such as a JPEG file.
+            codec (str | Codec, optional): Codec buf is encoded with. Defaults to "jpeg".
+            meta (pyobj, optional): Frame metadata. Defaults to None.
+            layer (int, optional): Simulcast layer to send it on. Defaults to 0.
+            timeout (int, optional): Longest time to wait in milliseconds, after which the
+                frame is dropped if it still cannot be sent. Defaults to None.
+
+        Raises:
+            RuntimeError: Raised if the streamer is stopped, or stopped while waiting.
+            ValueError: Raised if the codec is not registered.
+        """
+        await writable(self.injector, timeout)
+        self.streamer.send_encoded(buf, codec=codec, meta=meta, layer=layer)
+
+
+class AsyncReceiver(Frames):
+    def __init__(self, endpoint: str, **kwargs: Any) -> None:
+        """Receiver to await frames from, with recv or async for.
+
+        Start and stop block for as long as those of Receiver do. Stopping it ends
+        iterations and fails pending calls to recv with RuntimeError.
+
+        Args:
+            endpoint (str): Descriptor of collection endpoint.
+            **kwargs: Passed to Receiver.
+        """
+        self.receiver = Receiver(endpoint, **kwargs)
+        self.decoder = self.receiver.decoder
+
+    def start(self) -> None:
+        """Start internal pystreaming objects."""
+        self.receiver.start()
+        self.socket = shadow(self.decoder.poll_socket)
+
+    def stop(self) -> None:
+        """Cleanup and stop internal pystreaming objects."""
+        socket, self.socket = self.socket, None
+        if socket is not None:
+            socket.close(linger=0)
+        self.receiver.stop()
+
+    async def __aenter__(self) -> "AsyncReceiver":
+        self.start()
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback) -> None:
+        self.stop()
+
+    def latency(self) -> dict[str, dict[str, float]]:
+        """Latency percentiles of every stage of the received frames, see Receiver.latency."""
+        return self.receiver.latency()
+
+
+class AsyncWorker(Frames):
+    def __init__(self, source: str, drain: str, **kwargs: Any) -> None:
+        """Worker in the Map-Reduce streaming pattern, to await frames from with recv or
+        async for, and to await sending results on.
+
+        Start and stop block for as long as those of Worker do.
+
+        Args:
+            source (str): Descriptor of Streamer.
+            drain (str): Descriptor of Receiver.
+            **kwargs: Passed to Worker.
+        """
+        self.worker = Worker(source, drain, **kwargs)
+        self.decoder = self.worker.decoder
+        self.drain: zmq.asyncio.Socket | None = None
+
+    def start(self) -> None:
+        """Start internal pystreaming devices."""
+        self.worker.start()
+        self.socket = shadow(self.decoder.poll_socket)
+        self.drain = shadow(self.worker.drain)
+
+    def stop(self) -> None:
+        """Cleanup and stop internal pystreaming objects."""
+        socket, drain = self.socket, self.drain
+        self.socket = self.drain = None
+        for s in (socket, drain):
+            if s is not None:
+                s.close(linger=0)
+        self.worker.stop()
+
+    async def __aenter__(self) -> "AsyncWorker":
+        self.start()
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback) -> None:
+        self.stop()
+
+    async def send(self, data: RecvData, timeout: int | None = None) -> None:
+        """Send processed data to the drain endpoint once it can take it, see Worker.send.
+
+        Args:
+            data (RecvData): Data structure with fields {buf, meta, ftime, fno}.
+            timeout (int, optional): Longest time to wait in milliseconds, after which the
+                data is dropped if it still cannot be sent. Defaults to None.
+
+        Raises:
+            RuntimeError: Raised if the worker is stopped, or stopped while waiting.
+        """
+        await writable(self.drain, timeout)
+        self.worker.send(data)
+
+    def latency(self) -> dict[str, dict[str, float]]:
+        """Latency percentiles of every stage of the received frames, see Worker.latency."""
+        return self.worker.latency()
+
+
+class AsyncAudioReceiver:
+    def __init__(self, endpoint: str) -> None:
+        """Audio receiver to await audio from, with recv or async for.
+
+        Args:
+            endpoint (str): Descriptor of stream publishing endpoint.
+        """
+        self.receiver = AudioReceiver(endpoint)
+        self.socket = shadow(self.receiver.socket)
+
+    def close(self) -> None:
+        """Close the audio receiver. Iterations end and pending recv raise RuntimeError."""
+        socket, self.socket = self.socket, None
+        if socket is not None:
+            socket.close(linger=0)
+        self.receiver.close()
+
+    async def recv(self, timeout: int | None = None) -> RecvData:
+        """Receive a package of data from the audio channel, see AudioReceiver.recv.
+
+        Args:
+            timeout (int, optional): Timeout period in milliseconds.
+                Defaults to None, which waits forever.
+
+        Raises:
+            TimeoutError: Raised when no messages are received in the timeout period.
+            RuntimeError: Raised if closed, or closed while waiting.
+        """
+        if self.socket is None:
+            raise RuntimeError("Audio receiver has been closed")
+        try:
+            ready = await self.socket.poll(timeout)
+        except asyncio.CancelledError:
+            if self.socket is None and not cancelling():
+                raise RuntimeError("Audio receiver has been closed") from None
+            raise
+        if not ready:
+            raise TimeoutError(f"No messages were received within the timeout period {timeout}ms")
+        return self.receiver.recv(timeout=0)
+
+    def __aiter__(self) -> "AsyncAudioReceiver":
+        return self
+
+    async def __anext__(self) -> RecvData:
+        """The next package of audio. Iteration ends once closed."""
+        try:
+            return await self.recv()
+        except RuntimeError:
+            raise StopAsyncIteration from None
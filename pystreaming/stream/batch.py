@@ -0,0 +1,159 @@
+import math
+import time
+from collections.abc import Generator
+from typing import Any, NamedTuple, Protocol
+
+import numpy as np
+
+from ..video import STOPSTREAM
+from . import BATCH_BUFFERS, BATCH_LATENCY, BATCH_SIZE
+from .interface import RecvData
+
+
+class Frames(Protocol):
+    """Anything that decoded frames can be received from: Receiver, Worker, DecoderDevice."""
+
+    def recv(self, timeout: int | None) -> RecvData: ...
+
+
+class FrameBatch(NamedTuple):
+    """Frames received together, stacked along a first axis of n frames."""
+
+    arr: np.ndarray  # (n, height, width, ...) view of a buffer of the Batcher
+    fno: np.ndarray  # (n,) int64
+    ftime: np.ndarray  # (n,) float64
+    meta: list[Any]
+    frames: list[RecvData]  # whose arr are rows of arr, to hand results on with Worker.send
+
+
+class Batcher:
+    def __init__(
+        self,
+        source: Frames,
+        size: int = BATCH_SIZE,
+        latency: float = BATCH_LATENCY,
+        buffers: int = BATCH_BUFFERS,
+    ) -> None:
+        """Gather decoded frames into batches for models that infer on many at once.
+
+        A batch is complete once it holds size frames, or latency seconds after its first
+        frame arrived, whichever comes first. Frames are copied straight out of the
+        received messages into one of buffers preallocated (size, height, width, ...)
+        arrays, so nothing is allocated per frame or per batch. A frame of another shape
+        or dtype than the batch completes it and starts the next one. Frames with a
+        negative fno carry no picture and are left out, and STOPSTREAM ends handler.
+
+        Args:
+            source (Frames): Receiver, Worker or DecoderDevice to receive frames from.
+            size (int, optional): Most frames per batch. Defaults to BATCH_SIZE.
+            latency (float, optional): Longest time in seconds to wait for a batch to fill
+                once its first frame arrived. Defaults to BATCH_LATENCY.
+            buffers (int, optional): Number of buffers taken in turns. A batch is
+                overwritten by the batch this many batches later, so keep it no longer, or
+                copy it. Defaults to BATCH_BUFFERS.
+
+        Raises:
+            ValueError: Raised if size or buffers is not positive, or latency is negative.
+        """
+        if size <= 0:
+            raise ValueError(f"Batch size must be positive, got {size}")
+        if buffers <= 0:
+            raise ValueError(f"Buffers must be positive, got {buffers}")
+        if latency < 0:
+            raise ValueError(f"Latency must not be negative, got {latency}")
+        self.source, self.size, self.latency = source, size, latency
+        self.buffers: list[np.ndarray | None] = [None] * buffers
+        self.fnos = np.empty((buffers, size), dtype=np.int64)
+        self.ftimes = np.empty((buffers, size), dtype=np.float64)
+        self.turn = 0
+        self.pending: RecvData | None = None  # did not fit the last batch
+        self.stopped = False
+        self.batches = self.frames = 0
+
+    def recv(self, timeout: int | None = 60_000) -> FrameBatch:
+        """Receive a batch of frames.
+
+        Args:
+            timeout (int, optional): Timeout period in milliseconds for the first frame.
+                Set to None to wait forever. Defaults to 60_000.
+
+        Raises:
+            TimeoutError: Raised when no frames are received in the timeout period.
+
+        Returns:
+            FrameBatch: Between 1 and size frames.
+        """
+        data = self._take(None if timeout is None else time.time() + timeout / 1000)
+        if data is None:
+            raise TimeoutError(f"No frames were received within the timeout period {timeout}ms")
+        assert data.arr is not None
+        turn = self.turn
+        self.turn = (turn + 1) % len(self.buffers)
+        buffer = self.buffers[turn]
+        if buffer is None or buffer.shape[1:] != data.arr.shape or buffer.dtype != data.arr.dtype:
+            buffer = self.buffers[turn] = np.empty((self.size, *data.arr.shape), data.arr.dtype)
+        fno, ftime = self.fnos[turn], self.ftimes[turn]
+        frames: list[RecvData] = []
+        end = time.time() + self.latency
+        while True:
+            n = len(frames)
+            buffer[n] = data.arr
+            data.arr = buffer[n]  # lets go of the message
+            fno[n], ftime[n] = data.fno, data.ftime
+            frames.append(data)
+            if n + 1 == self.size or (data := self._take(end)) is None:
+                break
+            assert data.arr is not None
+            if data.arr.shape != buffer.shape[1:] or data.arr.dtype != buffer.dtype:
+                self.pending = data
+                break
+        n = len(frames)
+        self.batches += 1
+        self.frames += n
+        meta = [frame.meta for frame in frames]
+        return FrameBatch(buffer[:n], fno[:n], ftime[:n], meta, frames)
+
+    def _take(self, end: float | None) -> RecvData | None:
+        """The next frame with a picture, or None if none arrives before end or STOPSTREAM."""
+        if self.pending is not None:
+            data, self.pending = self.pending, None
+            return data
+        while not self.stopped:
+            left = None if end is None else max(0, math.ceil((end - time.time()) * 1000))
+            try:
+                data = self.source.recv(timeout=left)
+            except TimeoutError:
+                return None
+            if data.fno == STOPSTREAM:
+                self.stopped = True
+            elif data.fno >= 0 and data.arr is not None:
+                return data
+        return None
+
+    def handler(self, timeout: int) -> Generator[FrameBatch | None, None, None]:
+        """Yield batches of frames until STOPSTREAM.
+
+        Args:
+            timeout (int): Timeout period in milliseconds for the first frame of a batch.
+
+        Yields:
+            FrameBatch: A batch, or None if timeout is reached.
+        """
+        while True:
+            try:
+                yield self.recv(timeout=timeout)
+            except TimeoutError:
+                if self.stopped:
+                    return
+                yield None
+
+    @property
+    def fill(self) -> float:
+        """Mean frames per batch over size. Well below 1 means latency sets the pace."""
+        return self.frames / (self.batches * self.size) if self.batches else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"Batcher(size={self.size}, latency={self.latency}, "
+            f"buffers={len(self.buffers)}, fill={self.fill:.0%})"
+        )
@@ -1,11 +1,10 @@
 import time
-from collections import OrderedDict, deque
+from collections import deque
 from collections.abc import Callable, Generator
 
 import numpy as np
 
 from . import (
-    BUFFER_HANDLER_MISS_SLEEP,
     DISPFPS_DEFAULT_N,
     DISPLAY_WAITKEY_TIMEOUT,
     ESC_KEY_CODE,
@@ -15,55 +14,26 @@ from . import (
     FPS_TEXT_POSITION,
 )
 from .interface import RecvData
+from .playout import PlayoutBuffer, Source
 
 
 def buffer(
     bufferlen: float,
-    handlers: dict[str, Callable[[], Generator[RecvData | None, None, None]]],
+    handlers: dict[str, Source | Callable[[], Generator[RecvData | None, None, None]]],
 ) -> Generator[tuple[str, RecvData], None, None]:
-    """Buffer and reorder incoming packets of data.
+    """Buffer and reorder incoming packets of data. See PlayoutBuffer.
 
     Args:
         bufferlen ([type]): Length of buffer, in seconds.
         handlers (dict): Dictionary of str: generator.
-            The key is a stream name, the value is an unprimed generator.
+            The key is a stream name, the value is an unprimed generator. A Receiver or
+            other playout Source may be given instead, and is waited on without polling.
 
     Yields:
         tuple(str, data): str is stream name, data is data packet from corresponding handler.
     """
     assert isinstance(handlers, dict)
-    # Prime the generators by calling them
-    primed_handlers: dict[str, Generator[RecvData | None, None, None]] = {
-        k: handlers[k]() for k in handlers
-    }
-    buffers: dict[str, OrderedDict[float, RecvData]] = {k: OrderedDict() for k in primed_handlers}
-    tdelta: float | None = None
-    while True:
-        for k, handler in primed_handlers.items():
-            data = next(handler)
-            buffer = buffers[k]
-
-            if data is None:
-                # handler miss
-                time.sleep(BUFFER_HANDLER_MISS_SLEEP)
-            else:
-                # handler hit
-                ftime = data.ftime
-                if tdelta is None:
-                    tdelta = ftime - time.time()
-
-                # skip if packet is stale
-                if tdelta is not None and ftime < time.time() + tdelta - bufferlen:
-                    continue
-
-                # packet is fresh. write data to buffer
-                buffer[ftime] = data
-
-            if buffer.keys():  # if buffer is not empty
-                mint = min(buffer.keys())
-                # yield data if time is right
-                if tdelta is not None and mint < time.time() + tdelta - bufferlen:
-                    yield (k, buffer.pop(mint))
+    yield from PlayoutBuffer(bufferlen, handlers)
 
 
 def display(frame: np.ndarray, BGR: bool = True) -> None:
@@ -1,16 +1,66 @@
+"""Wire format (version 2)
+
+Every message is a single multipart ZMQ message:
+
+    [header, arr?, buf?, meta?, trace?]
+
+The header is a fixed 64 byte little-endian struct holding the magic, version, simulcast
+layer, the codec buf is encoded with, flags, meta codec, frame number, frame timestamp,
+array dtype and shape, the number of trace stamps and the length of every other payload
+part. Flags say which payload parts follow, in the order above. Nothing on the hot path
+is pickled: arr and buf are sent as raw bytes and meta is omitted entirely when it is
+None.
+
+If FLAG_SLOT is set, arr is not sent at all. It sits in a slot of a shared memory
+FrameRing, and the header only carries the slot index along with its dtype and shape.
+
+The layer directly follows the version, so that SUB sockets can subscribe to a single
+layer of a stream by prefix, see topic. Streams without layers are all layer 0.
+
+If FLAG_TRACE is set, the last part is a list of (stage, offset) stamps, the offset being
+microseconds since ftime. See pystreaming.stream.trace.
+"""
+
+import json
+import pickle
+import struct
 import time
+from collections.abc import Sequence
 from dataclasses import dataclass
-from typing import Any, TypedDict, cast
+from typing import Any, NamedTuple
 
 import numpy as np
 import zmq
 
+from .ring import FramePool, FrameRing
 
-class ArrayMetadata(TypedDict):
-    """Metadata for numpy array transmission."""
+WIRE_MAGIC = b"PS"
+WIRE_VERSION = 2
 
-    dtype: str
-    shape: tuple[int, ...]
+FLAG_ARR = 0x01
+FLAG_BUF = 0x02
+FLAG_META = 0x04
+FLAG_SLOT = 0x08  # arr is in a shared memory slot instead of a message part
+FLAG_TRACE = 0x10
+
+META_RAW = 1  # bytes-like, sent as is
+META_JSON = 2
+META_PICKLE = 3
+
+MAX_NDIM = 4
+MAX_STAMPS = 255
+
+# magic, version, layer, buf codec, flags, meta codec, ndim, trace stamps,
+# fno, ftime, dtype, shape[MAX_NDIM], arr length, buf length, meta length, slot
+HEADER = struct.Struct("<2sBBBBBBBqd4s4IIIIi3x")
+# the header up to and including the layer, for SUB socket subscriptions
+TOPIC = struct.Struct("<2sBB")
+# stage, microseconds since ftime
+STAMP = struct.Struct("<Bi")
+
+# Plain ints: combining zmq's enum flags costs more than the rest of a small send
+SNDMORE = int(zmq.SNDMORE)
+COPY_THRESHOLD = zmq.COPY_THRESHOLD  # parts smaller than this are cheaper to copy
 
 
 @dataclass
@@ -21,7 +71,11 @@ class RecvData:
     ftime: float
     fno: int
     arr: np.ndarray | None = None
-    buf: bytes | None = None
+    buf: bytes | memoryview | None = None
+    slot: int | None = None  # FrameRing slot holding arr, to release once done with it
+    trace: list[tuple[int, int]] | None = None  # (stage, microseconds since ftime) stamps
+    codec: int | None = None  # id of the codec buf is encoded with, see video.codecs
+    layer: int = 0  # simulcast layer, 0 being the largest
 
     def __post_init__(self) -> None:
         """Validate data structure."""
@@ -44,6 +98,355 @@ class RecvData:
         """
         return {k: v for k, v in self.__dict__.items() if v is not None}
 
+    @property
+    def owned(self) -> bool:
+        """Whether arr and buf own their memory, rather than viewing a received message.
+
+        Returns:
+            bool: False if arr or buf is a zero-copy view.
+        """
+        base = self.arr
+        while isinstance(base, np.ndarray):
+            base = base.base
+        return not isinstance(self.buf, memoryview) and not isinstance(base, memoryview)
+
+    def copy(self) -> "RecvData":
+        """Copy into a new RecvData that owns its arr and buf.
+
+        Returns:
+            RecvData: Independent copy.
+        """
+        return RecvData(
+            meta=self.meta,
+            ftime=self.ftime,
+            fno=self.fno,
+            arr=None if self.arr is None else self.arr.copy(),
+            buf=None if self.buf is None else bytes(self.buf),
+            trace=None if self.trace is None else list(self.trace),
+            codec=self.codec,
+            layer=self.layer,
+        )
+
+    def detach(self) -> "RecvData":
+        """Copy arr and buf in place if they are views of a received message, releasing it.
+
+        Returns:
+            RecvData: self, now owning its arr and buf.
+        """
+        if not self.owned:
+            if self.arr is not None:
+                self.arr = self.arr.copy()
+            if self.buf is not None:
+                self.buf = bytes(self.buf)
+        return self
+
+
+def topic(layer: int) -> bytes:
+    """Prefix of every message of a simulcast layer, to subscribe a SUB socket to.
+
+    Args:
+        layer (int): Simulcast layer.
+
+    Returns:
+        bytes: Message prefix.
+    """
+    return TOPIC.pack(WIRE_MAGIC, WIRE_VERSION, layer)
+
+
+def encode_meta(meta: Any, codec: int | None = None) -> tuple[int, bytes]:
+    """Serialize a meta object.
+
+    Args:
+        meta (pyobj): Object to serialize.
+        codec (int, optional): One of META_RAW, META_JSON or META_PICKLE. Defaults to None,
+            which sends bytes-like objects raw and pickles everything else.
+
+    Raises:
+        ValueError: Raised if the codec is not recognized.
+
+    Returns:
+        tuple(int, bytes): Codec used and serialized meta.
+    """
+    if codec is None:
+        codec = META_RAW if isinstance(meta, (bytes, bytearray, memoryview)) else META_PICKLE
+    if codec == META_RAW:
+        return codec, bytes(meta)
+    if codec == META_JSON:
+        return codec, json.dumps(meta).encode()
+    if codec == META_PICKLE:
+        return codec, pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL)
+    raise ValueError(f"Unrecognized meta codec: {codec}")
+
+
+def decode_meta(codec: int, payload: bytes) -> Any:
+    """Deserialize a meta object serialized with encode_meta.
+
+    Args:
+        codec (int): One of META_RAW, META_JSON or META_PICKLE.
+        payload (bytes): Serialized meta.
+
+    Raises:
+        ValueError: Raised if the codec is not recognized.
+
+    Returns:
+        pyobj: Deserialized meta.
+    """
+    if codec == META_RAW:
+        return bytes(payload)
+    if codec == META_JSON:
+        return json.loads(bytes(payload))
+    if codec == META_PICKLE:
+        return pickle.loads(payload)
+    raise ValueError(f"Unrecognized meta codec: {codec}")
+
+
+def _bytes(part: Any) -> bytes:
+    """Copy a received message part into bytes."""
+    return part.bytes if isinstance(part, zmq.Frame) else bytes(part)
+
+
+def _view(part: Any) -> bytes | memoryview:
+    """View a received message part without copying. The view keeps the part alive."""
+    return part.buffer if isinstance(part, zmq.Frame) else part
+
+
+def pack(
+    *,
+    fno: int,
+    ftime: float,
+    meta: Any,
+    arr: np.ndarray | None = None,
+    buf: bytes | memoryview | None = None,
+    meta_codec: int | None = None,
+    slot: int | None = None,
+    trace: list[tuple[int, int]] | None = None,
+    codec: int | None = None,
+    layer: int = 0,
+) -> list[Any]:
+    """Build the message parts of a single frame.
+
+    Args:
+        fno (int): Frame number.
+        ftime (float): Frame timestamp.
+        meta (pyobj): Frame metadata. None is not sent at all.
+        arr (np.ndarray, optional): Numpy array to send. Defaults to None.
+        buf (bytes, optional): Byte buffer to send. Defaults to None.
+        meta_codec (int, optional): Meta codec, see encode_meta. Defaults to None.
+        slot (int, optional): FrameRing slot that arr was written to. Only the slot
+            index, dtype and shape are sent. Defaults to None.
+        trace (list, optional): (stage, offset) stamps to send along. Defaults to None.
+        codec (int, optional): Id of the codec buf is encoded with. Defaults to None.
+        layer (int, optional): Simulcast layer. Defaults to 0.
+
+    Raises:
+        ValueError: Raised if arr or trace cannot be described by the header.
+
+    Returns:
+        list: Message parts, suitable for socket.send_multipart.
+    """
+    parts: list[Any] = [b""]
+    flags = mcodec = ndim = arrlen = buflen = metalen = 0
+    if slot is not None:
+        if arr is None:
+            raise ValueError("A slot must be sent along with the array it holds")
+        flags |= FLAG_SLOT
+    dtype = b""
+    shape = [0] * MAX_NDIM
+    if arr is not None:
+        arr = np.ascontiguousarray(arr)
+        dtype = arr.dtype.str.encode()
+        if arr.ndim > MAX_NDIM or len(dtype) > 4:
+            raise ValueError(f"Cannot send array with dtype {arr.dtype} and shape {arr.shape}")
+        ndim = arr.ndim
+        shape[:ndim] = arr.shape
+        if slot is None:
+            flags |= FLAG_ARR
+            arrlen = arr.nbytes
+            parts.append(arr)
+    if buf is not None:
+        flags |= FLAG_BUF
+        buflen = len(buf)
+        parts.append(buf)
+    if meta is not None:
+        mcodec, payload = encode_meta(meta, meta_codec)
+        flags |= FLAG_META
+        metalen = len(payload)
+        parts.append(payload)
+    if trace is not None:
+        if len(trace) > MAX_STAMPS:
+            raise ValueError(f"Cannot send more than {MAX_STAMPS} trace stamps")
+        flags |= FLAG_TRACE
+        parts.append(b"".join([STAMP.pack(*stamp) for stamp in trace]))
+    parts[0] = HEADER.pack(
+        WIRE_MAGIC,
+        WIRE_VERSION,
+        layer,
+        codec or 0,
+        flags,
+        mcodec,
+        ndim,
+        0 if trace is None else len(trace),
+        fno,
+        ftime,
+        dtype,
+        *shape,
+        arrlen,
+        buflen,
+        metalen,
+        -1 if slot is None else slot,
+    )
+    return parts
+
+
+class Header(NamedTuple):
+    """Fixed size frame header."""
+
+    flags: int
+    meta_codec: int
+    fno: int
+    ftime: float
+    dtype: bytes
+    shape: tuple[int, ...]
+    slot: int | None
+    codec: int | None
+    layer: int
+    lengths: tuple[tuple[int, int], ...]  # (flag, length) of every payload part, in order
+
+
+def unpack_header(part: Any) -> Header:
+    """Parse the header part of a message.
+
+    Args:
+        part (bytes): First part of a message.
+
+    Raises:
+        ValueError: Raised if the message is not in a recognized wire format.
+
+    Returns:
+        Header: Parsed header.
+    """
+    if len(part) != HEADER.size:
+        raise ValueError("Unrecognized wire format: bad header size")
+    (
+        magic,
+        version,
+        layer,
+        codec,
+        flags,
+        mcodec,
+        ndim,
+        nstamps,
+        fno,
+        ftime,
+        dtype,
+        *shape,
+        arrlen,
+        buflen,
+        metalen,
+        slot,
+    ) = HEADER.unpack(_bytes(part))
+    if magic != WIRE_MAGIC or version != WIRE_VERSION:
+        raise ValueError(f"Unrecognized wire format: magic {magic!r}, version {version}")
+    lengths = []
+    if flags & FLAG_ARR:
+        lengths.append((FLAG_ARR, arrlen))
+    if flags & FLAG_BUF:
+        lengths.append((FLAG_BUF, buflen))
+    if flags & FLAG_META:
+        lengths.append((FLAG_META, metalen))
+    if flags & FLAG_TRACE:
+        lengths.append((FLAG_TRACE, nstamps * STAMP.size))
+    slot = slot if flags & FLAG_SLOT else None
+    return Header(
+        flags,
+        mcodec,
+        fno,
+        ftime,
+        dtype,
+        tuple(shape[:ndim]),
+        slot,
+        codec or None,
+        layer,
+        tuple(lengths),
+    )
+
+
+def _build(
+    header: Header,
+    payloads: Sequence[Any],
+    arr: bool,
+    buf: bool,
+    copy: bool,
+    ring: FrameRing | FramePool | None = None,
+) -> RecvData:
+    """Assemble RecvData from a parsed header and its payload parts."""
+    data = _bytes if copy else _view
+    if len(payloads) != len(header.lengths):
+        raise ValueError(
+            f"Unrecognized wire format: expected {len(header.lengths) + 1} parts, "
+            f"got {len(payloads) + 1}"
+        )
+    arr_data: np.ndarray | None = None
+    buf_data: bytes | memoryview | None = None
+    meta: Any = None
+    trace: list[tuple[int, int]] | None = None
+    for (flag, length), payload in zip(header.lengths, payloads, strict=True):
+        if len(payload) != length:
+            raise ValueError(
+                f"Unrecognized wire format: expected {length} bytes, got {len(payload)}"
+            )
+        if flag == FLAG_ARR and arr:
+            dtype = header.dtype.rstrip(b"\0").decode()
+            arr_data = np.frombuffer(data(payload), dtype=dtype).reshape(header.shape)
+        elif flag == FLAG_BUF and buf:
+            buf_data = data(payload)
+        elif flag == FLAG_META:
+            meta = decode_meta(header.meta_codec, _bytes(payload))
+        elif flag == FLAG_TRACE:
+            trace = list(STAMP.iter_unpack(_bytes(payload)))
+    if header.slot is not None and arr and ring is not None:
+        dtype = header.dtype.rstrip(b"\0").decode()
+        arr_data = ring.view(header.slot, dtype, header.shape)
+    return RecvData(
+        meta=meta,
+        ftime=header.ftime,
+        fno=header.fno,
+        arr=arr_data,
+        buf=buf_data,
+        slot=header.slot,
+        trace=trace,
+        codec=header.codec,
+        layer=header.layer,
+    )
+
+
+def unpack(
+    frames: Sequence[Any],
+    arr: bool = True,
+    buf: bool = True,
+    copy: bool = True,
+    ring: FrameRing | FramePool | None = None,
+) -> RecvData:
+    """Parse the message parts of a single frame.
+
+    Args:
+        frames (list): Message parts, as returned by socket.recv_multipart.
+        arr (bool, optional): Parse the array, if present. Defaults to True.
+        buf (bool, optional): Parse the byte buffer, if present. Defaults to True.
+        copy (bool, optional): Set to False to view zmq.Frame parts instead of copying them,
+            see recv. Defaults to True.
+        ring (FrameRing | FramePool, optional): Ring to view arr in if it was sent as a
+            slot, see recv.
+            Defaults to None.
+
+    Raises:
+        ValueError: Raised if the message is not in a recognized wire format.
+
+    Returns:
+        RecvData: Parsed message.
+    """
+    return _build(unpack_header(frames[0]), frames[1:], arr, buf, copy, ring)
+
 
 def send(
     *,
@@ -52,8 +455,13 @@ def send(
     ftime: float,
     meta: Any,
     arr: np.ndarray | None = None,
-    buf: bytes | None = None,
+    buf: bytes | memoryview | None = None,
     flags: int = 0,
+    meta_codec: int | None = None,
+    slot: int | None = None,
+    trace: list[tuple[int, int]] | None = None,
+    codec: int | None = None,
+    layer: int = 0,
 ) -> None:
     """Internal video data send command.
 
@@ -61,21 +469,39 @@ def send(
         socket (zmq.Context.socket): Socket through which to send data.
         fno (int): Frame number.
         ftime (float): Frame timestamp.
-        meta (pyobj): Any reasonably small picklable object.
+        meta (pyobj): Any reasonably small object. None is not sent at all.
         arr ([type], optional): Numpy array to send. Defaults to None.
         buf (bytes, optional): Byte buffer to send. Defaults to None.
         flags (int, optional): Zmq flags to execute with (zmq.NOBLOCK or zmq.SNDMORE).
             Defaults to 0.
+        meta_codec (int, optional): One of META_RAW, META_JSON or META_PICKLE.
+            Defaults to None, which sends bytes-like meta raw and pickles everything else.
+        slot (int, optional): FrameRing slot that arr was written to. arr is then not sent,
+            the receiver views it in the ring instead. Defaults to None.
+        trace (list, optional): (stage, offset) stamps of the frame so far, see
+            pystreaming.stream.trace. Defaults to None, which sends no trace.
+        codec (int, optional): Id of the codec buf is encoded with, see
+            pystreaming.video.codecs. Defaults to None.
+        layer (int, optional): Simulcast layer, see topic. Defaults to 0.
     """
-    if arr is not None:
-        md: ArrayMetadata = {"dtype": str(arr.dtype), "shape": arr.shape}
-        socket.send_json(md, flags=zmq.SNDMORE | flags)
-        socket.send(arr, copy=False, flags=zmq.SNDMORE | flags)
-    if buf is not None:
-        socket.send(buf, copy=False, flags=zmq.SNDMORE | flags)
-    socket.send_pyobj(meta, flags=zmq.SNDMORE | flags)
-    socket.send_pyobj(ftime, flags=zmq.SNDMORE | flags)
-    socket.send_pyobj(fno, flags=flags)
+    header, *payloads = pack(
+        fno=fno,
+        ftime=ftime,
+        meta=meta,
+        arr=arr,
+        buf=buf,
+        meta_codec=meta_codec,
+        slot=slot,
+        trace=trace,
+        codec=codec,
+        layer=layer,
+    )
+    flags = int(flags)
+    socket.send(header, flags=(SNDMORE if payloads else 0) | flags)
+    for i, payload in enumerate(payloads, start=1):
+        more = SNDMORE if i < len(payloads) else 0
+        nbytes = payload.nbytes if isinstance(payload, np.ndarray) else len(payload)
+        socket.send(payload, copy=nbytes < COPY_THRESHOLD, flags=more | flags)
 
 
 def recv(
@@ -84,6 +510,8 @@ def recv(
     arr: bool = False,
     buf: bool = False,
     flags: int = 0,
+    copy: bool = True,
+    ring: FrameRing | FramePool | None = None,
 ) -> RecvData:
     """Internal video data receive command.
 
@@ -92,26 +520,23 @@ def recv(
         arr (bool, optional): Change to True if you expect an arr. Defaults to False.
         buf (bool, optional): Change to True if you expect a byte buffer. Defaults to False.
         flags (int, optional): Zmq flags to execute with (zmq.NOBLOCK). Defaults to 0.
+        copy (bool, optional): Set to False to receive zero-copy: large arr and buf payloads
+            are then views over the received zmq.Frame, which stays alive as long as they do.
+            Use RecvData.copy or RecvData.detach to take ownership. Defaults to True.
+        ring (FrameRing | FramePool, optional): Ring that the sender writes frames to. If
+            the arr was sent as a slot, it is returned as a view of that slot, and
+            RecvData.slot must be released once done with it. Slots of a FramePool are
+            released by themselves once arr is gone. Defaults to None.
 
     Returns:
-        RecvData: Expected items, with possible fields: {arr, buf, meta, ftime, fno}.
+        RecvData: Expected items, with possible fields: {arr, buf, meta, ftime, fno, trace,
+            codec, layer}.
     """
-    arr_data: np.ndarray | None = None
-    buf_data: bytes | None = None
-
-    if arr:
-        md = cast(ArrayMetadata, socket.recv_json(flags=flags))
-        msg = socket.recv(copy=False, flags=flags)
-        # zmq.Frame has .bytes property that returns bytes
-        arrbuf = memoryview(msg.bytes)
-        arr_data = np.frombuffer(arrbuf, dtype=md["dtype"]).reshape(md["shape"])
-    if buf:
-        msg = socket.recv(copy=False, flags=flags)
-        # zmq.Frame has .bytes property that returns bytes
-        buf_data = msg.bytes
-
-    meta = socket.recv_pyobj(flags=flags)
-    ftime = cast(float, socket.recv_pyobj(flags=flags))
-    fno = cast(int, socket.recv_pyobj(flags=flags))
-
-    return RecvData(meta=meta, ftime=ftime, fno=fno, arr=arr_data, buf=buf_data)
+    flags = int(flags)
+    header = unpack_header(socket.recv(flags=flags))
+    # Trust the header for the part count: a malformed message surfaces as a bad header
+    # or length on this or the next recv, without paying for a RCVMORE check per part.
+    payloads = [
+        socket.recv(copy=copy or n < COPY_THRESHOLD, flags=flags) for _, n in header.lengths
+    ]
+    return _build(header, payloads, arr, buf, copy, ring)
@@ -1,18 +1,27 @@
 import contextlib
+import time
 import uuid
+from itertools import count
 from typing import Any
 
 import numpy as np
 import zmq
 
 from ..stream import interface as intf
+from ..stream.trace import STAGE_IDS, stamp
+from ..video import BACKEND, CODEC, ENC_HWM, PIXEL_FORMAT, REQ_PREFETCH
+from ..video.codecs import Codec, lookup
 from ..video.collect import CollectDevice
 from ..video.dec import DecoderDevice
+from ..video.delta import TileDelta
 from ..video.dist import DistributorDevice
 from ..video.enc import EncoderDevice
+from ..video.layers import Layer
 from ..video.pub import PublisherDevice
+from ..video.rate import RateController
 from ..video.req import RequesterDevice
 from ..video.sub import SubscriberDevice
+from ..video.testimages import encodecard
 from . import (
     DEGREES_IN_CIRCLE,
     TESTCARD_ANGLE_STEP,
@@ -28,6 +37,18 @@ class Streamer:
         tracks: list[str] | None = None,
         nproc: int = 2,
         mapreduce: bool = False,
+        shm: bool = False,
+        rate: RateController | None = None,
+        reorder: float | None = None,
+        trace: bool = False,
+        codec: str | Codec = CODEC,
+        delta: TileDelta | None = None,
+        layers: list[Layer] | None = None,
+        routes: dict[str, int] | None = None,
+        policies: dict[str, str] | None = None,
+        pixel_format: str = PIXEL_FORMAT,
+        backend: str = BACKEND,
+        warm: bool = False,
     ) -> None:
         """Video streamer with P2P and Map-Reduce functionality.
 
@@ -36,40 +57,163 @@ class Streamer:
             tracks (list[str], optional): Video stream tracks. Defaults to None which is ["none"].
             nproc (int, optional): Number of processes devoted to encoding. Defaults to 2.
             mapreduce (bool, optional): Enable Map-Reduce streaming pattern. Defaults to False.
+            shm (bool, optional): Hand raw frames to the encoders through shared memory
+                instead of ipc. Defaults to False.
+            rate (RateController, optional): Adapts encoding to load, with an optional
+                bitrate or latency budget. Defaults to None, which uses default settings.
+            reorder (float, optional): Publish frames in fno order, holding each back for at
+                most this many seconds. Has no effect with mapreduce. Defaults to None.
+            trace (bool, optional): Stamp frames at every device they pass, for
+                Receiver.latency and Worker.latency. Defaults to False.
+            codec (str | Codec, optional): Codec to encode frames with, such as "jpeg",
+                "png" or "zlib", see pystreaming.video.codecs. Receivers pick the codec
+                of every frame by themselves. Defaults to CODEC.
+            delta (TileDelta, optional): Send only the tiles that changed since the last
+                keyframe, for mostly static scenes. Defaults to None.
+            layers (list[Layer], optional): Simulcast layers to encode every frame at,
+                largest first, such as [Layer(1.0), Layer(0.5, 60), Layer(0.25, 40)].
+                Receivers subscribe to one layer each, see Receiver. Defaults to None, a
+                single layer of full frames.
+            routes (dict[str, int], optional): Simulcast layer that workers of each track
+                get, for mapreduce. Tracks that are left out get layer 0. Defaults to None.
+            policies (dict[str, str], optional): How the frames of each track are shared
+                among its workers, for mapreduce: "roundrobin", "broadcast",
+                "leastloaded" or "shard", see DistributorDevice. Tracks that are left out
+                get DIST_POLICY. Defaults to None.
+            pixel_format (str, optional): Layout of the frames sent: "bgr", or "i420" or
+                "nv12" as many cameras deliver them, which skips converting to BGR and back
+                before JPEG encoding. Receivers can decode to YUV as well, see
+                DecodeProfile. Defaults to PIXEL_FORMAT.
+            backend (str, optional): Encode in nproc processes, nproc threads, or
+                "inline" in send, see EncoderDevice. Defaults to BACKEND.
+            warm (bool, optional): Keep the processes of every device alive when
+                stopped, so that starting again spawns none, until close(). Defaults to
+                False.
+
+        Raises:
+            ValueError: Raised if delta is combined with mapreduce or layers. Workers each
+                see only some of the frames, so most would miss the keyframes. Also raised
+                if layers are not valid, routes or policies name unknown tracks, a policy
+                is unknown, or a YUV pixel_format is combined with another codec than
+                JPEG, with layers or with delta.
         """
         seed = uuid.uuid1().hex
         if tracks is None:
             tracks = ["none"]
-
-        self.encoder = EncoderDevice(nproc, seed)
+        if mapreduce and delta is not None:
+            raise ValueError("Tile delta encoding does not work with mapreduce")
+
+        self.encoder = EncoderDevice(
+            nproc,
+            seed,
+            shm=shm,
+            rate=rate,
+            trace=trace,
+            codec=codec,
+            delta=delta,
+            layers=layers,
+            pixel_format=pixel_format,
+            backend=backend,
+            warm=warm,
+        )
         if mapreduce:
-            self.distributor = DistributorDevice(tracks, endpoint, seed)
+            self.distributor = DistributorDevice(
+                tracks, endpoint, seed, routes=routes, policies=policies, warm=warm
+            )
         else:
-            self.distributor = PublisherDevice(endpoint, seed)
+            self.distributor = PublisherDevice(endpoint, seed, reorder=reorder, warm=warm)
+        self.injector: zmq.Socket | None = None  # send_encoded, past the encoders
         self.started: bool = False
 
     def start(self) -> None:
         """Start internal pystreaming devices."""
         self.encoder.start()
         self.distributor.start()
+        if self.injector is None:
+            self.injector = zmq.Context.instance().socket(zmq.PUSH)
+            # every layer of a frame is its own message, as out of the encoders
+            layers = 1 if self.encoder.layers is None else len(self.encoder.layers)
+            self.injector.setsockopt(zmq.SNDHWM, ENC_HWM * layers)
+            self.injector.connect(self.distributor.infd)
         self.started = True
 
     def stop(self) -> None:
         """Cleanup and stop internal pystreaming objects."""
+        if self.injector is not None:
+            with contextlib.suppress(Exception):
+                self.injector.close(linger=0)
+            self.injector = None
         self.encoder.stop()
         self.distributor.stop()
         self.started = False
 
+    def close(self) -> None:
+        """Stop, and close the processes kept warm, see Streamer(warm=True)."""
+        self.stop()
+        self.encoder.close()
+        self.distributor.close()
+
     def send(self, frame: np.ndarray) -> None:
         """Send a video frame into the stream.
 
         Args:
-            frame (np.ndarray): Video frame
+            frame (np.ndarray): Video frame, in the pixel_format of the Streamer.
         """
         if not self.started:
             raise RuntimeError("Start the Streamer before sending frames")
         self.encoder.send(frame)
 
+    def send_encoded(
+        self,
+        buf: bytes | memoryview,
+        codec: str | Codec = "jpeg",
+        meta: Any = None,
+        layer: int = 0,
+    ) -> None:
+        """Send an already encoded frame into the stream, bypassing the encoders.
+
+        For replaying recorded frames or generating load without encoding anything. The
+        frame is numbered along with the frames passed to send, and is dropped, rather
+        than queued, when the publisher cannot keep up.
+
+        Args:
+            buf (bytes): Encoded frame, such as a JPEG file.
+            codec (str | Codec, optional): Codec buf is encoded with, so that receivers
+                can decode it. Defaults to "jpeg".
+            meta (pyobj, optional): Frame metadata. Defaults to None.
+            layer (int, optional): Simulcast layer to send it on. Defaults to 0.
+
+        Raises:
+            RuntimeError: Raised if the Streamer is not started.
+            ValueError: Raised if the codec is not registered.
+        """
+        self._inject({layer: buf}, lookup(codec), meta)
+
+    def _inject(self, bufs: dict[int, bytes | memoryview], codec: Codec, meta: Any) -> None:
+        """Send the encoded layers of one frame past the encoders, see send_encoded."""
+        if not self.started or self.injector is None:
+            raise RuntimeError("Start the Streamer before sending frames")
+        encoder = self.encoder
+        now = time.time()
+        trace = [(STAGE_IDS["send"], 0)] if encoder.trace else None
+        sent = False
+        for layer, buf in bufs.items():
+            with contextlib.suppress(zmq.Again):
+                intf.send(
+                    socket=self.injector,
+                    fno=encoder.idx,
+                    ftime=now,
+                    meta=meta,
+                    buf=buf,
+                    flags=zmq.NOBLOCK,
+                    trace=trace,
+                    codec=codec.id,
+                    layer=layer,
+                )
+                sent = True
+        if sent:
+            encoder.idx += 1
+
     def __enter__(self) -> "Streamer":
         self.start()
         return self
@@ -86,6 +230,11 @@ class Streamer:
         """Display a testcard or a test image. Automatically starts the device
         if not already started. This method is blocking.
 
+        Every frame is JPEG encoded once per process and simulcast layer, see
+        encodecard, and sent like send_encoded does, so the encoders stay idle. Layers
+        without a quality of their own are encoded at QUALITY, as the rate controller
+        does not see these frames.
+
         Args:
             card (int): One of
                 pystreaming.TEST_S
@@ -96,31 +245,31 @@ class Streamer:
                 pystreaming.IMAG_L
             animated (bool, optional): Set True to make image rotate. Defaults to False.
         """
-        import time
-        from itertools import count
-
-        import cv2  # type: ignore[import-untyped]
-        import numpy as np
-
-        from pystreaming import loadimage
-
         self.start()
-        testimage = loadimage(card)
-        if animated:
-            storage = []
-            for ang in range(0, DEGREES_IN_CIRCLE, TESTCARD_ANGLE_STEP):
-                storage.append(cv2.cvtColor(np.asarray(testimage.rotate(ang)), cv2.COLOR_RGB2BGR))
-        else:
-            storage: np.ndarray = np.asarray(testimage)
+        angles = range(0, DEGREES_IN_CIRCLE, TESTCARD_ANGLE_STEP) if animated else range(1)
+        layers = self.encoder.layers or [Layer()]
+        cards = [encodecard(card, tuple(angles), layer.quality, layer.scale) for layer in layers]
+        jpeg = lookup("jpeg")
         for i in count():
             print(i)
-            frame = storage[i % DEGREES_IN_CIRCLE] if animated else storage
-            self.send(frame if isinstance(frame, np.ndarray) else np.asarray(frame))
+            self._inject({n: jpegs[i % len(jpegs)] for n, jpegs in enumerate(cards)}, jpeg, None)
             time.sleep(1 / TESTCARD_FPS)
 
 
 class Worker:
-    def __init__(self, source, drain, track="none", reqthread=3, decproc=2):
+    def __init__(
+        self,
+        source,
+        drain,
+        track="none",
+        reqthread=3,
+        decproc=2,
+        profile=None,
+        prefetch=None,
+        shm=False,
+        backend=BACKEND,
+        warm=False,
+    ):
         """Worker in the Map-Reduce streaming pattern.
 
         Args:
@@ -129,17 +278,40 @@ class Worker:
             track (str, optional): Video stream track name. Defaults to "none".
             reqthread (int, optional): Number of request threads. Defaults to 3.
             decproc (int, optional): Number of decoder processes. Defaults to 2.
+            profile (DecodeProfile, optional): Decode JPEG frames scaled down, as gray or
+                as YUV planes. Defaults to None, full BGR frames.
+            prefetch (int, optional): Frames each request thread keeps in flight.
+                Defaults to None, REQ_PREFETCH per decoder process over all threads.
+            shm (bool, optional): Hand decoded frames over in shared memory, see
+                DecoderDevice. Defaults to False.
+            backend (str, optional): Decode in decproc processes, decproc threads, or
+                "inline" in recv, see DecoderDevice. Defaults to BACKEND.
+            warm (bool, optional): Keep the processes of every device alive when
+                stopped, so that starting again spawns none, until close(). Defaults to
+                False.
         """
         seed = uuid.uuid1().hex
-        self.requester = RequesterDevice(source, track, reqthread, seed)
-        self.decoder = DecoderDevice(decproc, seed, fwdbuf=True)
-
-        self.drain: zmq.Socket | None = zmq.Context.instance().socket(zmq.PUSH)
+        if prefetch is None:
+            prefetch = max(1, -(-REQ_PREFETCH * decproc // reqthread))
+        self.requester = RequesterDevice(source, track, reqthread, seed, prefetch, warm=warm)
+        self.decoder = DecoderDevice(
+            decproc, seed, fwdbuf=True, profile=profile, shm=shm, backend=backend, warm=warm
+        )
+
+        self.sink = drain
+        self.drain: zmq.Socket | None = None
+        self._connect()
+
+    def _connect(self) -> None:
+        """Connect the socket that send passes processed frames on to the drain."""
+        self.drain = zmq.Context.instance().socket(zmq.PUSH)
         self.drain.setsockopt(zmq.SNDHWM, WORKER_HWM)
-        self.drain.connect(drain)
+        self.drain.connect(self.sink)
 
     def start(self):
         """Start internal pystreaming devices."""
+        if self.drain is None:
+            self._connect()
         self.requester.start()
         self.decoder.start()
         self.started = True
@@ -154,6 +326,12 @@ class Worker:
         self.decoder.stop()
         self.started = False
 
+    def close(self) -> None:
+        """Stop, and close the processes kept warm, see Worker(warm=True)."""
+        self.stop()
+        self.requester.close()
+        self.decoder.close()
+
     def __enter__(self):
         self.start()
         return self
@@ -170,15 +348,25 @@ class Worker:
         """
         return self.decoder.handler
 
+    def latency(self) -> dict[str, dict[str, float]]:
+        """Latency percentiles of the frames this worker received, see Receiver.latency."""
+        return self.decoder.traces.percentiles()
+
+    def recv(self, timeout: int | None = 60_000) -> intf.RecvData:
+        """Receive a decoded frame, see Receiver.recv."""
+        return self.decoder.recv(timeout=timeout)
+
     def send(self, data: intf.RecvData) -> None:
         """Send processed data to the drain endpoint.
 
         Args:
             data (RecvData): Data structure with fields {buf, meta, ftime, fno}.
                 The 'arr' field should not be present (will be ignored if present).
+                If it is traced, it is stamped "worker" before it is sent on.
         """
         if self.drain is None:
             return  # Device has been stopped
+        stamp(data, "worker")
         with contextlib.suppress(zmq.Again):
             intf.send(
                 socket=self.drain,
@@ -187,26 +375,56 @@ class Worker:
                 meta=data.meta,
                 buf=data.buf,
                 flags=zmq.NOBLOCK,
+                trace=data.trace,
+                codec=data.codec,
+                layer=data.layer,
             )
 
 
 class Receiver:
-    def __init__(self, endpoint, nproc=2, mapreduce=False):
+    def __init__(
+        self,
+        endpoint,
+        nproc=2,
+        mapreduce=False,
+        reorder=None,
+        profile=None,
+        layer=0,
+        shm=False,
+        backend=BACKEND,
+        warm=False,
+    ):
         """Receiver frames from a video stream.
 
         Args:
             endpoint (str): Descriptor of collection endpoint.
             nproc (int, optional): Number of processes devoted to decoding. Defaults to 2.
             mapreduce (bool, optional): Enable Map-Reduce streaming pattern. Defaults to False.
+            reorder (float, optional): Yield frames in fno order, holding each back for at
+                most this many seconds. Defaults to None.
+            profile (DecodeProfile, optional): Decode JPEG frames scaled down, as gray or
+                as YUV planes. Defaults to None, full BGR frames.
+            layer (int, optional): Simulcast layer to receive, see Streamer. Only the bytes
+                of this layer are sent to the receiver. Has no effect with mapreduce, where
+                the Streamer routes layers by track. Defaults to 0.
+            shm (bool, optional): Hand decoded frames over in shared memory, see
+                DecoderDevice. Defaults to False.
+            backend (str, optional): Decode in nproc processes, nproc threads, or
+                "inline" in recv, see DecoderDevice. Defaults to BACKEND.
+            warm (bool, optional): Keep the processes of every device alive when
+                stopped, so that starting again spawns none, until close(). Defaults to
+                False.
         """
         seed = uuid.uuid1().hex
         self.mapreduce = mapreduce
         self.startedonce = False
         if mapreduce:
-            self.receive = CollectDevice(endpoint, seed)
+            self.receive = CollectDevice(endpoint, seed, warm=warm)
         else:
-            self.receive = SubscriberDevice(endpoint, seed)
-        self.decoder = DecoderDevice(nproc, seed)
+            self.receive = SubscriberDevice(endpoint, seed, layer=layer, warm=warm)
+        self.decoder = DecoderDevice(
+            nproc, seed, reorder=reorder, profile=profile, shm=shm, backend=backend, warm=warm
+        )
         self.started = False
 
     def start(self):
@@ -221,6 +439,12 @@ class Receiver:
         self.decoder.stop()
         self.started = False
 
+    def close(self):
+        """Stop, and close the processes kept warm, see Receiver(warm=True)."""
+        self.stop()
+        self.receive.close()
+        self.decoder.close()
+
     def __enter__(self):
         self.start()
         return self
@@ -236,3 +460,40 @@ class Receiver:
             generator: Generator that yields dicts with keys {arr, meta, ftime, fno}.
         """
         return self.decoder.handler
+
+    @property
+    def poll_socket(self) -> zmq.Socket | None:
+        """Socket that becomes readable when a decoded frame arrives, see PlayoutBuffer."""
+        return self.decoder.poll_socket
+
+    def poll_timeout(self) -> int | None:
+        """Milliseconds until a frame is ready regardless of the socket, see PlayoutBuffer."""
+        return self.decoder.poll_timeout()
+
+    def latency(self) -> dict[str, dict[str, float]]:
+        """Latency percentiles of every stage of the received frames, see Streamer(trace=True).
+
+        Each stage reports the time since the stage before it: "encoder.in" is the time a
+        frame waited for an encoder, "encoder.out" the time it took to encode, "recv" the
+        time it waited for the application to ask for it after being decoded, and so on.
+        "total" is the time from capture to "recv". Only traced frames are counted.
+
+        Returns:
+            dict: Stage name to {"p50", "p95", "p99"} in seconds, and "count" of frames.
+        """
+        return self.decoder.traces.percentiles()
+
+    def recv(self, timeout: int | None = 60_000) -> intf.RecvData:
+        """Receive a decoded frame, see DecoderDevice.recv.
+
+        Args:
+            timeout (int, optional): Timeout period in milliseconds.
+                Set to None to wait forever. Defaults to 60_000.
+
+        Raises:
+            TimeoutError: Raised when no messages are received in the timeout period.
+
+        Returns:
+            RecvData: {arr, buf, meta, ftime, fno}.
+        """
+        return self.decoder.recv(timeout=timeout)
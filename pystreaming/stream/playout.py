@@ -0,0 +1,180 @@
+import heapq
+import itertools
+import math
+import time
+from collections.abc import Callable, Generator, Iterator
+from typing import Any, Protocol, runtime_checkable
+
+import zmq
+
+from . import BUFFER_HANDLER_MISS_SLEEP, PLAYOUT_BURST
+from . import interface as intf
+from .interface import RecvData
+
+
+@runtime_checkable
+class Source(Protocol):
+    """A stream that the playout buffer can wait on without busy looping.
+
+    poll_socket becomes readable when a message arrives, and is None while the source
+    is stopped. recv(timeout=0) returns a frame or raises TimeoutError. A source that
+    also produces frames without socket activity (a reorder buffer releasing at a
+    deadline) can define poll_timeout(), returning how many milliseconds it may be left
+    alone, or None for indefinitely.
+    """
+
+    poll_socket: zmq.Socket | None
+
+    def recv(self, timeout: int | None) -> RecvData: ...
+
+
+class SocketSource:
+    def __init__(self, socket: zmq.Socket, **kwargs: Any) -> None:
+        """Adapt a plain zmq socket carrying pystreaming frames into a playout Source.
+
+        Args:
+            socket (zmq.Socket): Socket to receive from.
+            **kwargs: Passed to interface.recv, such as arr=True or buf=True.
+        """
+        self.poll_socket = socket
+        self.kwargs = kwargs
+
+    def recv(self, timeout: int | None) -> RecvData:
+        """Receive a frame.
+
+        Args:
+            timeout (int | None): Timeout period in milliseconds, None to wait forever.
+
+        Raises:
+            TimeoutError: Raised when no messages are received in the timeout period.
+
+        Returns:
+            RecvData: Received frame.
+        """
+        if not self.poll_socket.poll(timeout):
+            raise TimeoutError(f"No messages were received within the timeout period {timeout}ms")
+        return intf.recv(socket=self.poll_socket, flags=zmq.NOBLOCK, **self.kwargs)
+
+
+class PlayoutBuffer:
+    def __init__(
+        self,
+        delay: float,
+        sources: dict[str, Source | Callable[[], Generator[RecvData | None, None, None]]],
+    ) -> None:
+        """Jitter buffer that plays frames from several streams out in timestamp order.
+
+        The first frame fixes the offset between sender and local clocks. From then on
+        each frame is played out delay seconds after its timestamp, on that clock, and
+        frames that arrive too late for their slot are dropped. Frames from all streams
+        wait in one min-heap keyed by ftime.
+
+        Sources with a socket (Receiver, DecoderDevice, SocketSource) are waited on all
+        at once, so the buffer sleeps until a frame arrives or one is due. Generator
+        handlers, as taken by buffer(), can only be asked in turn; a round in which none
+        of them has a frame costs one BUFFER_HANDLER_MISS_SLEEP.
+
+        Args:
+            delay (float): Playout delay, in seconds.
+            sources (dict): Stream name to Source, or to an unprimed generator function
+                yielding RecvData, or None on a miss.
+        """
+        self.delay = delay
+        self.sources: dict[str, Source] = {}
+        self.handlers: dict[str, Generator[RecvData | None, None, None]] = {}
+        for name, source in sources.items():
+            if isinstance(source, Source):
+                self.sources[name] = source
+            else:
+                self.handlers[name] = source()
+        self.poller = zmq.Poller()
+        self.polled: dict[str, zmq.Socket] = {}  # socket registered for every source
+        self.heap: list[tuple[float, int, str, RecvData]] = []
+        self.seq = itertools.count()  # breaks ftime ties in arrival order
+        self.tdelta: float | None = None
+        self.played = dict.fromkeys(sources, 0)
+        self.late = dict.fromkeys(sources, 0)
+
+    def __iter__(self) -> Iterator[tuple[str, RecvData]]:
+        return self.play()
+
+    def play(self) -> Generator[tuple[str, RecvData], None, None]:
+        """Play frames out as they become due.
+
+        Raises:
+            RuntimeError: Raised if a source has no socket to poll, being stopped.
+
+        Yields:
+            tuple(str, data): Stream name and frame, in ftime order across streams.
+        """
+        while True:
+            now = time.time()
+            while self.heap and self.tdelta is not None:
+                if self.heap[0][0] > now + self.tdelta - self.delay:
+                    break
+                _, _, name, data = heapq.heappop(self.heap)
+                self.played[name] += 1
+                yield name, data
+            hit = False
+            for name, handler in self.handlers.items():
+                data = next(handler)
+                if data is not None:
+                    hit = True
+                    self._push(name, data, now)
+            self._wait(now, hit)
+
+    def _wait(self, now: float, hit: bool) -> None:
+        """Sleep until a source may have a frame or the next frame is due."""
+        timeout = None
+        if self.heap and self.tdelta is not None:
+            due = self.heap[0][0] - self.tdelta + self.delay
+            timeout = max(0, math.ceil((due - now) * 1000))
+        if self.handlers:
+            miss = 0 if hit else math.ceil(BUFFER_HANDLER_MISS_SLEEP * 1000)
+            timeout = miss if timeout is None else min(timeout, miss)
+        for source in self.sources.values():
+            pending = getattr(source, "poll_timeout", None)
+            wait = None if pending is None else pending()
+            if wait is not None:
+                timeout = wait if timeout is None else min(timeout, wait)
+        if self.sources:
+            self._register()
+            events = dict(self.poller.poll(timeout))
+        else:
+            if timeout:
+                time.sleep(timeout / 1000)
+            events = {}
+        now = time.time()
+        for name, source in self.sources.items():
+            pending = getattr(source, "poll_timeout", None)
+            if self.polled[name] in events or (pending is not None and pending() == 0):
+                for _ in range(PLAYOUT_BURST):
+                    try:
+                        data = source.recv(timeout=0)
+                    except TimeoutError:
+                        break
+                    self._push(name, data, now)
+
+    def _register(self) -> None:
+        """Poll the current socket of every source, which changes when it restarts."""
+        for name, source in self.sources.items():
+            socket = source.poll_socket
+            if socket is None:
+                raise RuntimeError(f"Source {name!r} has no socket to poll, start it first")
+            old = self.polled.get(name)
+            if socket is not old:
+                if old is not None:
+                    self.poller.unregister(old)
+                self.poller.register(socket, zmq.POLLIN)
+                self.polled[name] = socket
+
+    def _push(self, name: str, data: RecvData, now: float) -> None:
+        if self.tdelta is None:
+            self.tdelta = data.ftime - now
+        elif data.ftime < now + self.tdelta - self.delay:
+            self.late[name] += 1  # too late for its slot
+            return
+        heapq.heappush(self.heap, (data.ftime, next(self.seq), name, data))
+
+    def __len__(self) -> int:
+        return len(self.heap)
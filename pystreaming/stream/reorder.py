@@ -0,0 +1,169 @@
+import heapq
+import math
+import time
+from collections.abc import Generator, Iterable
+
+from ..listlib.circulardict import CircularOrderedDict
+from . import REORDER_MAXSIZE
+from .interface import RecvData
+
+
+class ReorderBuffer:
+    def __init__(self, latency: float, maxsize: int = REORDER_MAXSIZE) -> None:
+        """Restore fno order to frames that a process pool emits out of order.
+
+        A frame is released as soon as every frame before it has been released. A frame
+        that is waiting on a missing one is held for at most latency seconds, after which
+        it is released regardless and the missing frames are counted as gaps. Frames
+        arriving after their turn has passed are dropped and counted as late. Frames with
+        a negative fno (STOPSTREAM and friends) are control messages and pass straight
+        through.
+
+        Args:
+            latency (float): Longest time in seconds a frame is held back.
+            maxsize (int, optional): Most frames held at once. When full, the oldest held
+                frame is released early. Defaults to REORDER_MAXSIZE.
+
+        Raises:
+            ValueError: Raised if latency is negative or maxsize is not positive.
+        """
+        if latency < 0:
+            raise ValueError("Latency must not be negative")
+        self.latency = latency
+        # fno -> (arrival time, frame), in arrival order, so the front expires first
+        self.held: CircularOrderedDict[int, tuple[float, RecvData]] = CircularOrderedDict(maxsize)
+        self.heap: list[int] = []
+        self.expected: int | None = None
+        self.released = self.reordered = self.gaps = self.late = 0
+
+    def push(self, data: RecvData, now: float | None = None) -> list[RecvData]:
+        """Add a frame and release every frame that is due, in fno order.
+
+        Args:
+            data (RecvData): A frame.
+            now (float, optional): Arrival time. Defaults to None, which is time.time().
+
+        Returns:
+            list[RecvData]: Frames to hand on, possibly empty.
+        """
+        now = time.time() if now is None else now
+        fno = data.fno
+        if fno < 0:
+            return [*self.expire(now), data]
+        if self.expected is not None and fno < self.expected - self.held.maxsize:
+            # far behind anything we could still be waiting for: the sender restarted
+            out = self.flush()
+            self.expected = None
+        else:
+            out = []
+        if self.expected is None:
+            self.expected = fno
+        if fno < self.expected or fno in self.held:
+            self.late += 1
+            return [*out, *self.expire(now)]
+        if fno != self.expected:
+            self.reordered += 1
+        if len(self.held) == self.held.maxsize:
+            out += self._release(self._front())
+        self.held.insert_end(fno, (now, data))
+        heapq.heappush(self.heap, fno)
+        out += self._release(self.expected)
+        out += self.expire(now)
+        return out
+
+    def expire(self, now: float | None = None) -> list[RecvData]:
+        """Release frames that have been held for longer than the latency bound.
+
+        Args:
+            now (float, optional): Current time. Defaults to None, which is time.time().
+
+        Returns:
+            list[RecvData]: Frames to hand on, in fno order, possibly empty.
+        """
+        now = time.time() if now is None else now
+        out: list[RecvData] = []
+        while len(self.held):
+            fno = self._front()
+            arrival, _ = self.held[fno]
+            if now - arrival < self.latency:
+                break
+            out += self._release(fno)
+        return out
+
+    def sequence(self, frames: Iterable[RecvData]) -> Generator[RecvData, None, None]:
+        """Push a batch of frames, yielding frames as they are released.
+
+        Args:
+            frames (Iterable[RecvData]): Frames, such as those drained from a socket.
+
+        Yields:
+            RecvData: Frames to hand on, in fno order.
+        """
+        for data in frames:
+            yield from self.push(data)
+        yield from self.expire()
+
+    def flush(self) -> list[RecvData]:
+        """Release every held frame, in fno order.
+
+        Returns:
+            list[RecvData]: Held frames.
+        """
+        if not self.heap:
+            return []
+        return self._release(max(self.heap))
+
+    def deadline(self) -> float | None:
+        """Time at which the oldest held frame must be released.
+
+        Returns:
+            float | None: Absolute time, or None if no frame is held.
+        """
+        if not len(self.held):
+            return None
+        return self.held[self._front()][0] + self.latency
+
+    def timeout(self, now: float | None = None) -> int | None:
+        """Milliseconds until the next frame must be released, to poll a socket with.
+
+        Args:
+            now (float, optional): Current time. Defaults to None, which is time.time().
+
+        Returns:
+            int | None: Milliseconds, or None if no frame is held.
+        """
+        deadline = self.deadline()
+        if deadline is None:
+            return None
+        now = time.time() if now is None else now
+        return max(0, math.ceil((deadline - now) * 1000))
+
+    def _front(self) -> int:
+        """fno of the frame that has been held the longest."""
+        return next(iter(self.held.keys()))
+
+    def _release(self, upto: int) -> list[RecvData]:
+        """Release held frames up to upto, then any consecutive run that follows."""
+        out = []
+        while self.heap and (self.heap[0] <= upto or self.heap[0] == self.expected):
+            fno = heapq.heappop(self.heap)
+            self.gaps += fno - (fno if self.expected is None else self.expected)
+            _, data = self.held[fno]
+            self.held.delete(fno)
+            out.append(data)
+            self.expected = fno + 1
+        self.released += len(out)
+        return out
+
+    def __len__(self) -> int:
+        return len(self.held)
+
+    def __repr__(self):
+        rpr = "-----ReorderBuffer-----\n"
+        rpr += f"{'LATENCY': <10}{self.latency * 1e3:.1f} ms\n"
+        rpr += f"{'HELD': <10}{len(self.held)}\n"
+        rpr += f"{'RELEASED': <10}{self.released}\n"
+        rpr += f"{'REORDERED': <10}{self.reordered}\n"
+        rpr += f"{'GAPS': <10}{self.gaps}\n"
+        rpr += f"{'LATE': <10}{self.late}"
+        return rpr
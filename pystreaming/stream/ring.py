@@ -0,0 +1,256 @@
+import contextlib
+import struct
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+FREE = 0
+BUSY = 1
+
+# nslots, slotsize
+RING_HEADER = struct.Struct("<QQ")
+ALIGN = 64
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _buf(shm: shared_memory.SharedMemory) -> memoryview:
+    buf = shm.buf
+    assert buf is not None  # only None once closed, and closed rings are detached
+    return buf
+
+
+def _free(shm: shared_memory.SharedMemory, slot: int) -> None:
+    # holding shm until then keeps it from being closed while the lease still maps it
+    _buf(shm)[RING_HEADER.size + slot] = FREE
+
+
+class FrameRing:
+    def __init__(self, name: str) -> None:
+        """A fixed pool of frame slots in shared memory.
+
+        One process creates the ring and writes frames into free slots, sending only the
+        slot index to the processes that read them. Readers attach by name on first use
+        and release each slot once they are done with it, so it can be reused, or lease it
+        to have it released along with the last array viewing it.
+
+        Args:
+            name (str): Name of the shared memory block.
+        """
+        self.name = name
+        self.shm: shared_memory.SharedMemory | None = None
+        self.nslots = self.slotsize = 0
+        self.owner = False
+        self._cursor = 0
+
+    @classmethod
+    def create(cls, name: str, nslots: int, slotsize: int) -> "FrameRing":
+        """Create a new ring. The creator owns it and must unlink() it when done.
+
+        Args:
+            name (str): Name of the shared memory block.
+            nslots (int): Number of frame slots.
+            slotsize (int): Size of each slot in bytes.
+
+        Raises:
+            ValueError: Raised if nslots or slotsize is not positive.
+
+        Returns:
+            FrameRing: The new ring, with every slot free.
+        """
+        if nslots <= 0 or slotsize <= 0:
+            raise ValueError("Ring must have a positive number of slots and slot size")
+        ring = cls(name)
+        size = _align(RING_HEADER.size + nslots) + nslots * _align(slotsize)
+        ring.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        RING_HEADER.pack_into(_buf(ring.shm), 0, nslots, slotsize)
+        ring.nslots, ring.slotsize, ring.owner = nslots, slotsize, True
+        ring._states()[:] = FREE
+        return ring
+
+    def _attach(self) -> shared_memory.SharedMemory:
+        if self.shm is None:
+            shm = self.shm = shared_memory.SharedMemory(name=self.name)
+            # Only the creator owns the block. Otherwise the resource tracker of a reader
+            # process would unlink it, or warn that it leaked, when that process exits.
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+            self.nslots, self.slotsize = RING_HEADER.unpack_from(_buf(shm), 0)
+        return self.shm
+
+    def _states(self) -> np.ndarray:
+        shm = self._attach()
+        return np.frombuffer(_buf(shm), dtype=np.uint8, count=self.nslots, offset=RING_HEADER.size)
+
+    def fits(self, nbytes: int) -> bool:
+        """Whether a frame of nbytes fits in a slot.
+
+        Args:
+            nbytes (int): Size of the frame in bytes.
+
+        Returns:
+            bool: True if it fits.
+        """
+        self._attach()
+        return nbytes <= self.slotsize
+
+    def acquire(self) -> int | None:
+        """Claim a free slot for writing. Only the creating process may acquire slots.
+
+        Returns:
+            int | None: Index of the claimed slot, or None if every slot is busy.
+        """
+        states = self._states()
+        for i in range(self.nslots):
+            slot = (self._cursor + i) % self.nslots
+            if states[slot] == FREE:
+                states[slot] = BUSY
+                self._cursor = slot + 1
+                return slot
+        return None
+
+    def release(self, slot: int) -> None:
+        """Hand a slot back to the writer.
+
+        Args:
+            slot (int): Index of the slot.
+        """
+        self._states()[slot] = FREE
+
+    def busy(self) -> int:
+        """Number of slots that have not been released yet.
+
+        Returns:
+            int: Number of busy slots.
+        """
+        return int(np.count_nonzero(self._states()))
+
+    def view(self, slot: int, dtype: np.dtype | str, shape: tuple[int, ...]) -> np.ndarray:
+        """View the contents of a slot as an array, without copying.
+
+        Args:
+            slot (int): Index of the slot.
+            dtype (np.dtype): Array dtype.
+            shape (tuple): Array shape.
+
+        Raises:
+            IndexError: Raised if the slot does not exist.
+            ValueError: Raised if the array does not fit in a slot.
+
+        Returns:
+            np.ndarray: Writable view of the slot.
+        """
+        shm = self._attach()
+        offset, count = self._locate(slot, dtype, shape)
+        # frombuffer holds a buffer export for as long as the view lives, so close() cannot
+        # unmap the block from under it (np.ndarray(buffer=...) does not).
+        return np.frombuffer(_buf(shm), dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def lease(self, slot: int, dtype: np.dtype | str, shape: tuple[int, ...]) -> np.ndarray:
+        """View the contents of a slot, releasing it once nothing refers to the view.
+
+        Every array sliced or reshaped from the lease keeps it alive as its base, so the
+        slot is released only once all of them are gone. Copy the array to keep the frame
+        for longer than the slot should stay busy.
+
+        Args:
+            slot (int): Index of the slot.
+            dtype (np.dtype): Array dtype.
+            shape (tuple): Array shape.
+
+        Raises:
+            IndexError: Raised if the slot does not exist.
+            ValueError: Raised if the array does not fit in a slot.
+
+        Returns:
+            np.ndarray: Writable view of the slot.
+        """
+        shm = self._attach()
+        offset, count = self._locate(slot, dtype, shape)
+        lease = np.frombuffer(_buf(shm), dtype=dtype, count=count, offset=offset)
+        # arrays viewing it keep lease itself as their base, never each other
+        weakref.finalize(lease, _free, shm, slot).atexit = False
+        return lease.reshape(shape)
+
+    def _locate(self, slot: int, dtype: np.dtype | str, shape: tuple[int, ...]) -> tuple[int, int]:
+        """Byte offset of a slot and number of elements of an array in it, checking both."""
+        if not 0 <= slot < self.nslots:
+            raise IndexError(f"slot {slot} out of range: [0, {self.nslots})")
+        count = int(np.prod(shape))
+        nbytes = count * np.dtype(dtype).itemsize
+        if nbytes > self.slotsize:
+            raise ValueError(f"Array of {nbytes} bytes does not fit in a {self.slotsize} byte slot")
+        return _align(RING_HEADER.size + self.nslots) + slot * _align(self.slotsize), count
+
+    def close(self) -> None:
+        """Detach from the ring. Views of its slots must not be used afterwards."""
+        if self.shm is not None:
+            with contextlib.suppress(BufferError):  # views still alive; freed with the process
+                self.shm.close()
+            self.shm = None
+
+    def unlink(self) -> None:
+        """Close and destroy the ring. Only the creating process should unlink it."""
+        shm = self.shm
+        self.close()
+        if self.owner and shm is not None:
+            with contextlib.suppress(FileNotFoundError):
+                shm.unlink()
+            self.owner = False
+
+    def __repr__(self) -> str:
+        return f"FrameRing({self.name!r}, slots={self.nslots}, slotsize={self.slotsize})"
+
+
+class FramePool:
+    def __init__(self, name: str, nslots: int) -> None:
+        """The FrameRings of a pool of writer processes, as seen by the process reading them.
+
+        Writer process i creates the ring named name + str(i) with nslots slots, and
+        sends slot handles i * nslots + slot. Rings are attached on their first frame.
+
+        Args:
+            name (str): Prefix of the names of the rings.
+            nslots (int): Number of slots in every ring.
+        """
+        self.name, self.nslots = name, nslots
+        self.rings: dict[int, FrameRing] = {}
+
+    def view(self, handle: int, dtype: np.dtype | str, shape: tuple[int, ...]) -> np.ndarray:
+        """Lease the slot of a handle, see FrameRing.lease.
+
+        Args:
+            handle (int): Slot handle, as sent by a writer.
+            dtype (np.dtype): Array dtype.
+            shape (tuple): Array shape.
+
+        Raises:
+            FileNotFoundError: Raised if the writer is gone along with its ring.
+
+        Returns:
+            np.ndarray: View of the slot, released once nothing refers to it.
+        """
+        index, slot = divmod(handle, self.nslots)
+        ring = self.rings.get(index)
+        if ring is None:
+            ring = self.rings[index] = FrameRing(self.name + str(index))
+        return ring.lease(slot, dtype, shape)
+
+    def busy(self) -> int:
+        """Number of slots still leased, over every ring attached so far.
+
+        Returns:
+            int: Number of busy slots.
+        """
+        return sum(ring.busy() for ring in self.rings.values())
+
+    def close(self) -> None:
+        """Detach from every ring. Views still leased stay valid."""
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
+
+    def __repr__(self) -> str:
+        return f"FramePool({self.name!r}, slots={self.nslots}, rings={len(self.rings)})"
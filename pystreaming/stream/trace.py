@@ -0,0 +1,121 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from . import TRACE_WINDOW
+from .interface import RecvData
+
+# Points a traced frame is stamped at, in pipeline order. The index is the stage id on
+# the wire, so only ever append to this tuple.
+STAGES = (
+    "send",
+    "encoder.in",
+    "encoder.out",
+    "publisher.in",
+    "publisher.out",
+    "subscriber.in",
+    "subscriber.out",
+    "distributor.in",
+    "distributor.out",
+    "collector.in",
+    "collector.out",
+    "decoder.in",
+    "decoder.out",
+    "recv",
+    "worker",
+)
+STAGE_IDS = {name: i for i, name in enumerate(STAGES)}
+PERCENTILES = (50, 95, 99)
+OFFSET_LIMIT = 2**31 - 1  # microseconds, about 35 minutes
+
+
+def stamp(data: RecvData, stage: str) -> None:
+    """Stamp a frame with the time it reached a stage, if the frame is being traced.
+
+    Stamps are microseconds since the frame's ftime, so like RecvData.age they assume the
+    clocks of every host along the pipeline are in sync.
+
+    Args:
+        data (RecvData): A frame. Untraced frames, whose trace is None, are left alone.
+        stage (str): One of STAGES.
+    """
+    if data.trace is not None:
+        offset = round((time.time() - data.ftime) * 1e6)
+        data.trace.append((STAGE_IDS[stage], max(-OFFSET_LIMIT, min(offset, OFFSET_LIMIT))))
+
+
+def segments(trace: list[tuple[int, int]]) -> dict[str, float]:
+    """Split a trace into the time spent reaching each stamp from the one before.
+
+    The first stamp is measured from ftime. A stage that the frame passed before, like
+    the decoder of a Worker and then of a Receiver, is named stage#2 the second time.
+
+    Args:
+        trace (list): (stage, offset) stamps, as in RecvData.trace.
+
+    Returns:
+        dict: Stage name to seconds, in pipeline order, with the overall time as "total".
+    """
+    out: dict[str, float] = {}
+    last = 0
+    for stage, offset in trace:
+        name = STAGES[stage] if stage < len(STAGES) else f"stage{stage}"
+        key, n = name, 1
+        while key in out:
+            n += 1
+            key = f"{name}#{n}"
+        out[key] = (offset - last) / 1e6
+        last = offset
+    if trace:
+        out["total"] = last / 1e6
+    return out
+
+
+class LatencyStats:
+    def __init__(self, window: int = TRACE_WINDOW) -> None:
+        """Per-stage latency of the most recent traced frames.
+
+        Args:
+            window (int, optional): Number of frames to keep per stage.
+                Defaults to TRACE_WINDOW.
+        """
+        self.window = window
+        self.samples: dict[str, deque[float]] = {}
+
+    def record(self, data: RecvData) -> None:
+        """Add the stages of a frame. Untraced frames are ignored.
+
+        Args:
+            data (RecvData): A frame.
+        """
+        if not data.trace:
+            return
+        for name, seconds in segments(data.trace).items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(seconds)
+
+    def percentiles(self, q: tuple[float, ...] = PERCENTILES) -> dict[str, dict[str, float]]:
+        """Latency percentiles of every stage seen so far.
+
+        Args:
+            q (tuple, optional): Percentiles to compute. Defaults to (50, 95, 99).
+
+        Returns:
+            dict: Stage name to {"p50": seconds, ..., "count": frames}, in pipeline order.
+                The time a stage reports is the time since the stamp before it, so
+                "encoder.in" is time queued for an encoder and "encoder.out" is time spent
+                encoding.
+        """
+        out = {}
+        for name, samples in self.samples.items():
+            values = np.percentile(np.fromiter(samples, float), q)
+            stats = {f"p{p:g}": float(v) for p, v in zip(q, values, strict=True)}
+            stats["count"] = len(samples)
+            out[name] = stats
+        return out
+
+    def clear(self) -> None:
+        """Forget every recorded frame."""
+        self.samples.clear()
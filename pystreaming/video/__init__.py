@@ -4,15 +4,49 @@ STOPSTREAM = -1
 FRAMEMISS = -2
 TRACKMISS = -3
 
-COLLECT_TIMESTEP = 0.01
-DEC_TIMESTEP = 0.01
-DIST_TIMESTEP = 0.01
-ENC_TIMESTEP = 0.01
-PUB_TIMESTEP = 0.01
-SUB_TIMESTEP = 0.01
-REQ_TIMESTEP = 0.03
+REQ_PREFETCH = 2  # frames requested ahead per decoder process
+
+# Maximum messages a device process handles per wakeup
+BURST = 32
+
+# Where encoder and decoder devices run their work, see Device
+BACKEND = "process"
+BACKENDS = ("process", "thread", "inline")
+
+# Distributor constants, how the frames of a track are shared among its workers
+DIST_POLICY = "roundrobin"
+DIST_POLICIES = ("roundrobin", "broadcast", "leastloaded", "shard")
 
 # Encoder constants
+RING_SLOTS = 8
+
+# Decoder constants
+DEC_SLOTS = 8  # decoded frames each decoder process can have out at once
+
+# Codec constants
+CODEC = "jpeg"
+COMPRESS_LEVEL = 1  # zlib, zstd and png, fastest
+DECODE_SCALES = (1.0, 0.5, 0.25, 0.125)  # JPEG DCT scaling factors
+DECODE_MODES = ("bgr", "gray", "yuv")
+PIXEL_FORMAT = "bgr"  # of the frames handed to the encoders
+PIXEL_FORMATS = ("bgr", "i420", "nv12")
+
+# Simulcast constants
+LAYER_SCALES = (1.0, 0.5, 0.25, 0.125)  # halvings of the full frame
+
+# Tile delta constants
+DELTA_TILE = 32  # pixels
+DELTA_THRESHOLD = 4.0  # mean absolute difference
+KEYFRAME_INTERVAL = 30  # frames
+MOSAIC_COLUMNS = 16  # tiles per row of a delta image
+
+# Rate control constants
+QUALITY_MIN = 20
+QUALITY_STEP = 10
+MAX_SKIP = 3  # at most 1 of every MAX_SKIP + 1 frames is encoded
+RATE_INTERVAL = 0.5  # seconds between adjustments
+RATE_HEADROOM = 0.8  # recover once under this fraction of the budget
+RATE_SMOOTHING = 0.2  # weight of the newest sample in moving averages
 STOPSTREAM_DUMMY_FRAME_SIZE = 10
 STOPSTREAM_SLEEP_SECONDS = 1
 
@@ -23,6 +57,3 @@ DIST_HWM = 3
 PUB_HWM = 3
 SUB_HWM = 3
 REQ_HWM = 3
-
-# Async requester constants
-ASYNC_STOP_SLEEP_SECONDS = 0.1
@@ -0,0 +1,519 @@
+"""Frame codecs
+
+A codec turns a frame into the bytes sent as the buf of a message and back. The id of the
+codec a frame was encoded with travels in the message header, so a decoder picks the
+right codec for every frame, and streams with different codecs can share a pipeline.
+
+Array codecs (raw, zlib, lz4, zstd) prefix the payload with the dtype and shape of the
+frame, so any numeric array survives the trip unchanged. zlib, lz4 and zstd byte-shuffle
+the array first, grouping the n-th byte of every element together, which compresses
+slowly varying data such as depth or thermal frames much better. lz4 and zstd need the
+lz4 and zstandard packages; png needs Pillow. Each package, turbojpeg included, is only
+imported once a codec first needs it, so that importing the codecs loads none of them.
+
+The tiles codec wraps another codec for the tile delta mode, see pystreaming.video.delta.
+"""
+
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from ..stream.interface import MAX_NDIM
+from . import COMPRESS_LEVEL, DECODE_MODES, DECODE_SCALES, QUALITY
+
+if TYPE_CHECKING:
+    from turbojpeg import TurboJPEG
+
+# TurboJPEG constants, as turbojpeg.h and the turbojpeg package define them
+TJSAMP_420 = 2
+TJSAMP_GRAY = 3
+TJPF_BGR = 1
+TJPF_GRAY = 6
+TJFLAG_FASTUPSAMPLE = 256
+TJFLAG_FASTDCT = 2048
+
+# dtype, ndim, shape[MAX_NDIM]
+ARRAY = struct.Struct("<4sB4I")
+# keyframe?, inner codec, tile size, frame height, frame width, keyframe fno, tiles sent
+TILES = struct.Struct("<?BHIIqI")
+_RGB = {3: [2, 1, 0], 4: [2, 1, 0, 3]}  # BGR(A) <-> RGB(A)
+YUV_LAYOUTS = ("i420", "nv12")  # YUV 4:2:0 frames JpegCodec encodes directly
+
+
+@dataclass(frozen=True)
+class DecodeProfile:
+    """How to decode JPEG frames, when the consumer needs less than a full BGR frame.
+
+    Scaling happens inside the inverse DCT and gray output skips the chroma planes
+    altogether, so both cut decode time rather than adding a resize afterwards. Only
+    JPEG frames are affected; other codecs always decode in full.
+
+    Args:
+        scale (float, optional): One of DECODE_SCALES. Defaults to 1.0.
+        mode (str, optional): "bgr" for (height, width, 3) frames, "gray" for
+            (height, width) luminance, or "yuv" for the planes as they are stored. 4:2:0
+            frames come as one (height * 3 / 2, width) I420 array, with an odd height
+            rounded up, gray frames as luminance only, and anything else as the planes
+            one after another in a flat array. Defaults to "bgr".
+
+    Raises:
+        ValueError: Raised if scale or mode is not supported.
+    """
+
+    scale: float = 1.0
+    mode: str = "bgr"
+
+    def __post_init__(self) -> None:
+        if self.scale not in DECODE_SCALES:
+            raise ValueError(f"Decode scale must be one of {DECODE_SCALES}, got {self.scale}")
+        if self.mode not in DECODE_MODES:
+            raise ValueError(f"Decode mode must be one of {DECODE_MODES}, got {self.mode!r}")
+
+    @property
+    def scaling_factor(self) -> tuple[int, int] | None:
+        """The scale as a TurboJPEG scaling factor, or None at full size."""
+        return None if self.scale == 1.0 else (1, round(1 / self.scale))
+
+
+class Codec:
+    """Encodes frames to bytes and back. Subclass and register to add a codec."""
+
+    id: int = 0  # sent in the message header, unique and in [1, 255]
+    name: str = ""
+
+    def encode(
+        self, arr: np.ndarray, quality: int = QUALITY, subsampling: int = TJSAMP_420
+    ) -> bytes:
+        """Encode a frame.
+
+        Args:
+            arr (np.ndarray): Frame to encode.
+            quality (int, optional): Quality, for lossy codecs. Defaults to QUALITY.
+            subsampling (int, optional): TurboJPEG chroma subsampling, for lossy codecs.
+                Defaults to TJSAMP_420.
+
+        Raises:
+            ValueError: Raised if the codec cannot encode frames of this dtype or shape.
+
+        Returns:
+            bytes: Encoded frame.
+        """
+        raise NotImplementedError
+
+    def require(self) -> None:
+        """Check that the packages the codec needs are installed.
+
+        Raises:
+            ImportError: Raised if a package is missing.
+        """
+
+    def decode(self, buf: bytes | memoryview) -> np.ndarray:
+        """Decode a frame encoded by encode.
+
+        Args:
+            buf (bytes): Encoded frame.
+
+        Returns:
+            np.ndarray: Decoded frame.
+        """
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={self.id}, name={self.name!r})"
+
+
+def turbojpeg() -> "TurboJPEG":
+    """Import turbojpeg and load libturbojpeg, which JpegCodec does on first use."""
+    from turbojpeg import TurboJPEG
+
+    return TurboJPEG()
+
+
+class JpegCodec(Codec):
+    """Lossy TurboJPEG compression of uint8 BGR or gray frames. The default codec."""
+
+    id = 1
+    name = "jpeg"
+
+    def __init__(self) -> None:
+        self.jpeg: TurboJPEG | None = None  # loaded on first use, in the process using it
+
+    def require(self) -> None:
+        import turbojpeg  # noqa: F401
+
+    def encode(
+        self, arr: np.ndarray, quality: int = QUALITY, subsampling: int = TJSAMP_420
+    ) -> bytes:
+        if self.jpeg is None:
+            self.jpeg = turbojpeg()
+        return self.jpeg.encode(
+            arr, quality=quality, jpeg_subsample=subsampling, flags=TJFLAG_FASTDCT
+        )
+
+    def encode_yuv(
+        self,
+        arr: np.ndarray,
+        quality: int = QUALITY,
+        subsampling: int = TJSAMP_420,
+        layout: str = "i420",
+    ) -> bytes:
+        """Encode a YUV 4:2:0 frame as it comes from a camera, without a pass through BGR.
+
+        Args:
+            arr (np.ndarray): uint8 frame of shape (height * 3 / 2, width), with an even
+                height and width: the Y plane followed by the U and V planes for "i420",
+                or by rows of interleaved U and V for "nv12".
+            quality (int, optional): JPEG quality. Defaults to QUALITY.
+            subsampling (int, optional): TJSAMP_420, or TJSAMP_GRAY to encode the Y plane
+                only. Defaults to TJSAMP_420.
+            layout (str, optional): "i420" or "nv12". Defaults to "i420".
+
+        Raises:
+            ValueError: Raised if arr is not a YUV 4:2:0 frame of this layout.
+
+        Returns:
+            bytes: Encoded frame.
+        """
+        if arr.dtype != np.uint8 or arr.ndim != 2 or arr.shape[0] % 3 or layout not in YUV_LAYOUTS:
+            raise ValueError(f"Cannot encode {arr.dtype} {arr.shape} frames as {layout} JPEG")
+        h, w = arr.shape[0] * 2 // 3, arr.shape[1]
+        if h % 2 or w % 2:
+            raise ValueError(f"YUV 4:2:0 frames must have an even size, got {w}x{h}")
+        if self.jpeg is None:
+            self.jpeg = turbojpeg()
+        arr = np.ascontiguousarray(arr)
+        if subsampling == TJSAMP_GRAY:
+            arr = arr[:h]
+        else:
+            subsampling = TJSAMP_420  # the layout of the planes, whatever was asked for
+            if layout == "nv12":
+                arr = i420(arr)
+        return self.jpeg.encode_from_yuv(
+            arr, h, w, quality=quality, jpeg_subsample=subsampling, flags=TJFLAG_FASTDCT, align=1
+        )
+
+    def shape(
+        self, buf: bytes | memoryview, profile: DecodeProfile | None = None
+    ) -> tuple[int, ...] | None:
+        """Shape of the uint8 frame decode returns, read from the JPEG header alone.
+
+        Args:
+            buf (bytes): Encoded frame.
+            profile (DecodeProfile, optional): Profile it is decoded with. Defaults to None.
+
+        Returns:
+            tuple | None: Frame shape, or None for YUV planes, whose layout depends on the
+                chroma subsampling.
+        """
+        if profile is not None and profile.mode == "yuv":
+            return None
+        if self.jpeg is None:
+            self.jpeg = turbojpeg()
+        width, height, _, _ = self.jpeg.decode_header(buf)
+        if profile is not None and profile.scaling_factor is not None:
+            num, denom = profile.scaling_factor
+            width, height = -(-width * num // denom), -(-height * num // denom)
+        if profile is not None and profile.mode == "gray":
+            return (height, width)
+        return (height, width, 3)
+
+    def decode(
+        self,
+        buf: bytes | memoryview,
+        profile: DecodeProfile | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """Decode a frame, in full or as a DecodeProfile asks for.
+
+        Args:
+            buf (bytes): Encoded frame.
+            profile (DecodeProfile, optional): Profile to decode with. Defaults to None.
+            out (np.ndarray, optional): C-contiguous uint8 array of the shape returned by
+                shape to decode into, such as a slot of a FrameRing. Not supported for
+                YUV planes. Defaults to None, a new array.
+
+        Returns:
+            np.ndarray: Decoded frame, out if given.
+        """
+        if self.jpeg is None:
+            self.jpeg = turbojpeg()
+        flags = TJFLAG_FASTDCT | TJFLAG_FASTUPSAMPLE
+        if profile is None:
+            return self.jpeg.decode(buf, flags=flags, dst=out)
+        if profile.mode != "yuv":
+            gray = profile.mode == "gray"
+            dst = out[:, :, np.newaxis] if gray and out is not None else out
+            arr = self.jpeg.decode(
+                buf,
+                pixel_format=TJPF_GRAY if gray else TJPF_BGR,
+                scaling_factor=profile.scaling_factor,
+                flags=flags,
+                dst=dst,
+            )
+            return arr[:, :, 0] if gray else arr
+        # planes skip upsampling altogether, so only FASTDCT applies
+        planes = self.jpeg.decode_to_yuv_planes(
+            buf, scaling_factor=profile.scaling_factor, flags=TJFLAG_FASTDCT
+        )
+        if len(planes) == 1:
+            return planes[0]
+        y, u, v = planes
+        if u.shape[0] * 2 == y.shape[0] and u.shape[1] * 2 == y.shape[1]:
+            return np.concatenate([y.ravel(), u.ravel(), v.ravel()]).reshape(-1, y.shape[1])
+        return np.concatenate([p.ravel() for p in planes])
+
+
+class RawCodec(Codec):
+    """Uncompressed arrays of any numeric dtype and shape."""
+
+    id = 2
+    name = "raw"
+
+    def encode(
+        self, arr: np.ndarray, quality: int = QUALITY, subsampling: int = TJSAMP_420
+    ) -> bytes:
+        arr = np.ascontiguousarray(arr)
+        return describe(arr) + self.compress(arr)
+
+    def decode(self, buf: bytes | memoryview) -> np.ndarray:
+        view = memoryview(buf)
+        dtype, shape = parse(view)
+        return self.decompress(view[ARRAY.size :], dtype).reshape(shape)
+
+    def compress(self, arr: np.ndarray) -> bytes:
+        return arr.tobytes()
+
+    def decompress(self, payload: memoryview, dtype: np.dtype) -> np.ndarray:
+        return np.frombuffer(payload, dtype=dtype).copy()
+
+
+class ShuffleCodec(RawCodec):
+    """Lossless arrays, byte-shuffled, then compressed by a subclass."""
+
+    def compress(self, arr: np.ndarray) -> bytes:
+        return self.pack(shuffle(arr))
+
+    def decompress(self, payload: memoryview, dtype: np.dtype) -> np.ndarray:
+        return unshuffle(self.unpack(payload), dtype)
+
+    def pack(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def unpack(self, data: memoryview) -> bytes:
+        raise NotImplementedError
+
+
+class ZlibCodec(ShuffleCodec):
+    """Lossless arrays, byte-shuffled and deflated. Needs nothing beyond the stdlib."""
+
+    id = 3
+    name = "zlib"
+
+    def pack(self, data: bytes) -> bytes:
+        return zlib.compress(data, COMPRESS_LEVEL)
+
+    def unpack(self, data: memoryview) -> bytes:
+        return zlib.decompress(data)
+
+
+class Lz4Codec(ShuffleCodec):
+    """Lossless arrays, byte-shuffled and LZ4 compressed. Fastest, needs lz4."""
+
+    id = 4
+    name = "lz4"
+
+    def require(self) -> None:
+        import lz4.frame  # ty: ignore[unresolved-import] # noqa: F401
+
+    def pack(self, data: bytes) -> bytes:
+        import lz4.frame  # ty: ignore[unresolved-import]
+
+        return lz4.frame.compress(data)
+
+    def unpack(self, data: memoryview) -> bytes:
+        import lz4.frame  # ty: ignore[unresolved-import]
+
+        return lz4.frame.decompress(data)
+
+
+class ZstdCodec(ShuffleCodec):
+    """Lossless arrays, byte-shuffled and zstd compressed. Needs zstandard."""
+
+    id = 5
+    name = "zstd"
+
+    def require(self) -> None:
+        import zstandard  # ty: ignore[unresolved-import] # noqa: F401
+
+    def pack(self, data: bytes) -> bytes:
+        import zstandard  # ty: ignore[unresolved-import]
+
+        return zstandard.ZstdCompressor(level=COMPRESS_LEVEL).compress(data)
+
+    def unpack(self, data: memoryview) -> bytes:
+        import zstandard  # ty: ignore[unresolved-import]
+
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class PngCodec(Codec):
+    """Lossless PNG of uint8 gray, BGR or BGRA frames, or uint16 gray. Needs Pillow."""
+
+    id = 6
+    name = "png"
+
+    def require(self) -> None:
+        import PIL  # noqa: F401
+
+    def encode(
+        self, arr: np.ndarray, quality: int = QUALITY, subsampling: int = TJSAMP_420
+    ) -> bytes:
+        import io
+
+        from PIL import Image
+
+        if arr.ndim == 2 and arr.dtype in (np.uint8, np.uint16):
+            image = Image.fromarray(np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<")))
+        elif arr.dtype == np.uint8 and arr.ndim == 3 and arr.shape[2] in (3, 4):
+            image = Image.fromarray(np.ascontiguousarray(arr[:, :, _RGB[arr.shape[2]]]))
+        else:
+            raise ValueError(f"Cannot encode {arr.dtype} array of shape {arr.shape} as PNG")
+        out = io.BytesIO()
+        image.save(out, format="PNG", compress_level=COMPRESS_LEVEL)
+        return out.getvalue()
+
+    def decode(self, buf: bytes | memoryview) -> np.ndarray:
+        import io
+
+        from PIL import Image
+
+        arr = np.asarray(Image.open(io.BytesIO(buf)))
+        if arr.ndim == 3:
+            arr = arr[:, :, _RGB[arr.shape[2]]]
+        return np.ascontiguousarray(arr, dtype=np.uint16 if arr.dtype.kind == "i" else None)
+
+
+class TileCodec(Codec):
+    """Keyframes and changed tiles, built by TileDelta and patched together by TileCanvas.
+
+    The payload is a TILES header, the index of every tile sent as uint32, and then the
+    keyframe or the tiles side by side, encoded with the inner codec.
+    """
+
+    id = 7
+    name = "tiles"
+
+    def encode(
+        self, arr: np.ndarray, quality: int = QUALITY, subsampling: int = TJSAMP_420
+    ) -> bytes:
+        raise ValueError("Tile frames are built by TileDelta, see EncoderDevice(delta=...)")
+
+    def decode(self, buf: bytes | memoryview) -> np.ndarray:
+        """Decode the inner payload: the whole keyframe, or the tiles side by side."""
+        view = memoryview(buf)
+        _, inner, _, _, _, _, ntiles = TILES.unpack_from(view)
+        return lookup(inner).decode(view[TILES.size + 4 * ntiles :])
+
+
+def i420(nv12: np.ndarray) -> np.ndarray:
+    """Rearrange an NV12 frame to I420, splitting the interleaved U and V into planes.
+
+    Args:
+        nv12 (np.ndarray): uint8 frame of shape (height * 3 / 2, width).
+
+    Returns:
+        np.ndarray: The I420 frame, the same shape.
+    """
+    h = nv12.shape[0] * 2 // 3
+    out = np.empty_like(nv12)
+    out[:h] = nv12[:h]
+    chroma = nv12[h:].reshape(-1, 2)  # (u, v) pairs
+    quarter = chroma.shape[0]
+    flat = out[h:].reshape(-1)
+    flat[:quarter] = chroma[:, 0]
+    flat[quarter:] = chroma[:, 1]
+    return out
+
+
+def describe(arr: np.ndarray) -> bytes:
+    """Pack the dtype and shape of an array, as array codecs prefix their payload with.
+
+    Raises:
+        ValueError: Raised if the dtype or shape cannot be described.
+    """
+    dtype = arr.dtype.str.encode()
+    if arr.ndim > MAX_NDIM or len(dtype) > 4:
+        raise ValueError(f"Cannot encode array with dtype {arr.dtype} and shape {arr.shape}")
+    shape = [0] * MAX_NDIM
+    shape[: arr.ndim] = arr.shape
+    return ARRAY.pack(dtype, arr.ndim, *shape)
+
+
+def parse(buf: memoryview) -> tuple[np.dtype, tuple[int, ...]]:
+    """Unpack the dtype and shape packed by describe."""
+    dtype, ndim, *shape = ARRAY.unpack(buf[: ARRAY.size])
+    return np.dtype(dtype.rstrip(b"\0").decode()), tuple(shape[:ndim])
+
+
+def shuffle(arr: np.ndarray) -> bytes:
+    """Group the n-th byte of every element together."""
+    return arr.reshape(-1).view(np.uint8).reshape(-1, arr.itemsize).T.tobytes()
+
+
+def unshuffle(data: bytes, dtype: np.dtype) -> np.ndarray:
+    """Undo shuffle."""
+    return np.frombuffer(data, np.uint8).reshape(dtype.itemsize, -1).T.copy().view(dtype)
+
+
+CODECS: dict[int, Codec] = {}
+_names: dict[str, Codec] = {}
+
+
+def register(codec: Codec) -> Codec:
+    """Make a codec available to encoders and decoders, by id and by name.
+
+    Register custom codecs at import time of a module every process imports, so that
+    the decoder processes know them too.
+
+    Args:
+        codec (Codec): Codec to add.
+
+    Raises:
+        ValueError: Raised if the id is out of range, or the id or name is taken.
+
+    Returns:
+        Codec: The codec.
+    """
+    if not 0 < codec.id < 256:
+        raise ValueError(f"Codec id must be in [1, 255], got {codec.id}")
+    if codec.id in CODECS or codec.name in _names:
+        raise ValueError(f"Codec id {codec.id} or name {codec.name!r} is already registered")
+    CODECS[codec.id] = _names[codec.name] = codec
+    return codec
+
+
+def lookup(key: Any) -> Codec:
+    """Find a registered codec.
+
+    Args:
+        key (Codec | int | str): The codec itself, its id or its name.
+
+    Raises:
+        ValueError: Raised if no such codec is registered.
+
+    Returns:
+        Codec: The codec.
+    """
+    if isinstance(key, Codec):
+        return key
+    codec = CODECS.get(key) if isinstance(key, int) else _names.get(key)
+    if codec is None:
+        raise ValueError(f"Unrecognized codec: {key!r}")
+    return codec
+
+
+for _codec in (JpegCodec, RawCodec, ZlibCodec, Lz4Codec, ZstdCodec, PngCodec, TileCodec):
+    register(_codec())
@@ -1,14 +1,14 @@
 import contextlib
-import time
 
 import zmq
 
 from ..stream import interface as intf
-from . import COLLECT_HWM, COLLECT_TIMESTEP
-from .device import Device
+from ..stream.trace import stamp
+from . import BURST, COLLECT_HWM
+from .device import Device, control, drain, serve
 
 
-def collect_ps(*, shutdown, barrier, infd, outfd):
+def collect_ps(*, shutdown, infd, outfd, burst, stats):
     context = zmq.Context()
     socket = context.socket(zmq.PULL)
     socket.setsockopt(zmq.RCVHWM, COLLECT_HWM)
@@ -16,12 +16,11 @@ def collect_ps(*, shutdown, barrier, infd, outfd):
     out = context.socket(zmq.PUSH)
     out.setsockopt(zmq.SNDHWM, COLLECT_HWM)
     out.bind(outfd)
-    barrier.wait()
+    ctl = control(context, shutdown)
     try:
-        while not shutdown.is_set():
-            target = time.time() + COLLECT_TIMESTEP
-            if socket.poll(0):
-                data = intf.recv(socket=socket, buf=True, flags=zmq.NOBLOCK)
+        for _ in serve(ctl, socket):
+            for data in drain(socket, burst, stats, "collector", buf=True, copy=False):
+                stamp(data, "collector.out")
                 with contextlib.suppress(zmq.Again):
                     intf.send(
                         socket=out,
@@ -30,20 +29,21 @@ def collect_ps(*, shutdown, barrier, infd, outfd):
                         meta=data.meta,
                         buf=data.buf,
                         flags=zmq.NOBLOCK,
+                        trace=data.trace,
+                        codec=data.codec,
+                        layer=data.layer,
                     )
-            missing = target - time.time()
-            if missing > 0:
-                time.sleep(missing)  # loop takes at minimum TIMESTEP seconds
     finally:
         # Clean up sockets and context
         with contextlib.suppress(Exception):
             socket.close(linger=0)
             out.close(linger=0)
+            ctl.close(linger=0)
             context.term()
 
 
 class CollectDevice(Device):
-    def __init__(self, endpoint, seed):
+    def __init__(self, endpoint, seed, burst=BURST, warm=False):
         """Create a collection device.
 
         Binds to a zmq PULL socket and republishes through a PUSH socket.
@@ -51,11 +51,14 @@ class CollectDevice(Device):
         Args:
             endpoint (str): Descriptor of stream publishing endpoint.
             seed (str): File descriptor seed (to prevent ipc collisions).
+            burst (int, optional): Maximum messages forwarded per wakeup. Defaults to BURST.
+            warm (bool, optional): Keep the process alive when stopped, to start again
+                without spawning another, see Device. Defaults to False.
         """
         self.infd = endpoint
         self.outfd = "ipc:///tmp/decin" + seed
         dkwargs = {"infd": self.infd, "outfd": self.outfd}
-        super().__init__(collect_ps, dkwargs, 1)
+        super().__init__(collect_ps, dkwargs, 1, burst, warm=warm)
 
     def __repr__(self):
         rpr = "-----CollectDevice-----\n"
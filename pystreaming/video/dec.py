@@ -1,68 +1,272 @@
 import contextlib
+import math
+import multiprocessing as mp
 import time
-from functools import partial
+from collections import deque
+from typing import Any
 
+import numpy as np
 import zmq
-from turbojpeg import TJFLAG_FASTDCT, TJFLAG_FASTUPSAMPLE, TurboJPEG
 
 from ..stream import interface as intf
-from . import DEC_HWM, DEC_TIMESTEP
-from .device import Device
+from ..stream.interface import RecvData
+from ..stream.reorder import ReorderBuffer
+from ..stream.ring import FramePool, FrameRing
+from ..stream.trace import LatencyStats, stamp
+from . import BACKEND, BURST, DEC_HWM, DEC_SLOTS
+from .codecs import CODECS, Codec, DecodeProfile, JpegCodec, TileCodec
+from .delta import TileCanvas, prefix
+from .device import Device, control, drain, endpoint, serve
 
 
-def dec_ps(*, shutdown, barrier, infd, outfd, fwdbuf):
-    context = zmq.Context()
+def decode(
+    codec: Codec,
+    buf: bytes | memoryview,
+    profile: DecodeProfile | None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Decode a frame, with the profile and into out if the codec is JPEG."""
+    if isinstance(codec, JpegCodec):
+        return codec.decode(buf, profile, out)
+    return codec.decode(buf)
+
+
+class SlotWriter:
+    def __init__(self, name: str, slots: int, index: Any) -> None:
+        """The FrameRing a decoder process decodes into, see DecoderDevice shm.
+
+        The ring is named after the number the process takes from index, and is created
+        on the first frame, which sets its slot size.
+
+        Args:
+            name (str): Prefix of the ring names of the device.
+            slots (int): Number of slots.
+            index (mp.Value): Number of decoder processes of the device started so far.
+        """
+        with index.get_lock():
+            self.number, index.value = index.value, index.value + 1
+        self.name, self.slots = name + str(self.number), slots
+        self.ring: FrameRing | None = None
+
+    def decode(
+        self, codec: Codec, buf: bytes | memoryview, profile: DecodeProfile | None
+    ) -> tuple[np.ndarray, int | None]:
+        """Decode a frame into a free slot. JPEG frames are decoded straight into it, any
+        other codec decodes first and is copied in.
+
+        Returns:
+            tuple: The frame, and the slot handle to send it as, or None if it is in a new
+                array because no slot was free or it does not fit.
+        """
+        shape = codec.shape(buf, profile) if isinstance(codec, JpegCodec) else None
+        arr = None
+        if shape is None:
+            arr = decode(codec, buf, profile)
+            dtype, shape = arr.dtype, arr.shape
+        else:
+            dtype = np.dtype(np.uint8)
+        nbytes = math.prod(shape) * dtype.itemsize
+        if self.ring is None:
+            self.ring = FrameRing.create(self.name, self.slots, nbytes)
+        slot = self.ring.acquire() if self.ring.fits(nbytes) else None
+        if slot is None:
+            return (decode(codec, buf, profile) if arr is None else arr), None
+        view = self.ring.view(slot, dtype, shape)
+        if arr is None:
+            decode(codec, buf, profile, view)
+        else:
+            view[...] = arr
+        return view, self.number * self.slots + slot
+
+    def release(self, handle: int) -> None:
+        """Hand back the slot of a frame that could not be sent."""
+        assert self.ring is not None
+        self.ring.release(handle % self.slots)
+
+    def close(self) -> None:
+        """Destroy the ring. Frames the consumer still holds stay mapped."""
+        if self.ring is not None:
+            self.ring.unlink()
+
+
+def decode_frame(
+    data: RecvData, profile: DecodeProfile | None, fwdbuf: bool, writer: SlotWriter | None = None
+) -> RecvData:
+    """Decode the frame of a message in place, as every backend does.
+
+    Args:
+        data (RecvData): Message with the encoded frame as buf.
+        profile (DecodeProfile, optional): Profile to decode JPEG frames with.
+        fwdbuf (bool): Keep the encoded frame as buf. Otherwise only the prefix of tile
+            delta frames is kept, for the TileCanvas of the consumer.
+        writer (SlotWriter, optional): Decode into shared memory, setting data.slot.
+            Defaults to None.
+
+    Returns:
+        RecvData: data, with arr decoded, and codec set only if buf is kept.
+    """
+    # frames from senders that predate codec ids are JPEG
+    codec = CODECS.get(data.codec or JpegCodec.id)
+    if data.buf is None or codec is None:
+        data.arr = None
+    elif writer is None:
+        data.arr = decode(codec, data.buf, profile)
+    else:
+        data.arr, data.slot = writer.decode(codec, data.buf, profile)
+    stamp(data, "decoder.out")
+    if not fwdbuf:
+        tiles = data.codec == TileCodec.id and data.buf is not None
+        data.buf = prefix(data.buf) if tiles else None
+    if data.buf is None:
+        data.codec = None
+    return data
+
+
+def dec_ps(
+    *,
+    shutdown,
+    infd,
+    outfd,
+    fwdbuf,
+    profile,
+    ring,
+    slots,
+    index,
+    burst,
+    stats,
+    context=None,
+):
+    own = context is None  # threads share the context of the device, see Device
+    if own:
+        context = zmq.Context()
     socket = context.socket(zmq.PULL)
     socket.setsockopt(zmq.RCVHWM, DEC_HWM)
     socket.connect(infd)
     out = context.socket(zmq.PUSH)
     out.setsockopt(zmq.SNDHWM, DEC_HWM)
     out.connect(outfd)
-    barrier.wait()
-    decoder = partial(TurboJPEG().decode, flags=(TJFLAG_FASTDCT + TJFLAG_FASTUPSAMPLE))
+    writer = None if ring is None else SlotWriter(ring, slots, index)
+    ctl = control(context, shutdown)
     try:
-        while not shutdown.is_set():
-            target = time.time() + DEC_TIMESTEP
-            if socket.poll(0):
-                data = intf.recv(socket=socket, buf=True, flags=zmq.NOBLOCK)
-                with contextlib.suppress(zmq.Again):
+        for _ in serve(ctl, socket):
+            for data in drain(socket, burst, stats, "decoder", buf=True, copy=False):
+                decode_frame(data, profile, fwdbuf, writer)
+                try:
                     intf.send(
                         socket=out,
                         fno=data.fno,
                         ftime=data.ftime,
                         meta=data.meta,
-                        arr=decoder(data.buf) if data.buf is not None else None,
-                        buf=data.buf if fwdbuf else None,
+                        arr=data.arr,
+                        buf=data.buf,
                         flags=zmq.NOBLOCK,
+                        trace=data.trace,
+                        codec=data.codec,
+                        layer=data.layer,
+                        slot=data.slot,
                     )
-            missing = target - time.time()
-            if missing > 0:
-                time.sleep(missing)
+                except zmq.Again:
+                    if data.slot is not None:
+                        assert writer is not None  # only a writer sets slots
+                        writer.release(data.slot)
+                # a view of the slot, which would keep the ring from closing
+                data.arr = None
     finally:
         # Clean up sockets and context
         with contextlib.suppress(Exception):
             socket.close(linger=0)
             out.close(linger=0)
-            context.term()
+            ctl.close(linger=0)
+            if own:
+                context.term()
+        if writer is not None:
+            writer.close()
 
 
 class DecoderDevice(Device):
-    def __init__(self, nproc, seed, fwdbuf=False):
+    def __init__(
+        self,
+        nproc,
+        seed,
+        fwdbuf=False,
+        burst=BURST,
+        reorder=None,
+        profile=None,
+        shm=False,
+        slots=DEC_SLOTS,
+        backend=BACKEND,
+        warm=False,
+    ):
         """Create a multiprocessing frame decoder device.
 
         Args:
             nproc (int): Number of decoding processes.
             seed (str): File descriptor seed (to prevent ipc collisions).
             fwdbuf (bool, optional): True if we forward the compressed frame. Defaults to False.
+            burst (int, optional): Maximum frames a process decodes per wakeup.
+                Defaults to BURST.
+            reorder (float, optional): Return frames in fno order, holding each back for
+                at most this many seconds, see ReorderBuffer. Defaults to None.
+            profile (DecodeProfile, optional): Decode JPEG frames scaled down, as gray or
+                as YUV planes. Defaults to None, full BGR frames.
+            shm (bool, optional): Decode frames into a shared memory FrameRing of every
+                decoder process, sending only the slot over ipc. Received frames are then
+                views of their slot, which is handed back once nothing refers to them.
+                Frames that find no free slot are sent over ipc as usual. Defaults to False.
+            slots (int, optional): Number of frames the ring of every decoder process
+                holds. Defaults to DEC_SLOTS.
+            backend (str, optional): Run the decoders in nproc processes, in nproc threads
+                of this process, or "inline" in recv itself, see Device. Threads and inline
+                skip the hop from another process, which can cost more than decoding small
+                frames, and TurboJPEG releases the GIL while it decodes. Defaults to BACKEND.
+            warm (bool, optional): Keep the processes alive when stopped, to start again
+                without spawning any, see Device. Defaults to False.
+
+        Raises:
+            ValueError: Raised for an unknown backend, or shm with another backend than
+                "process".
         """
+        if shm and backend != "process":
+            raise ValueError("Shared memory frames are only for decoder processes")
         self.infd = "ipc:///tmp/decin" + seed
-        self.outfd = "ipc:///tmp/decout" + seed
+        self.outfd = endpoint(backend, "decout", seed)
         self.context, self.nproc, self.fwdbuf = zmq.Context.instance(), nproc, fwdbuf
-        dkwargs = {"infd": self.infd, "outfd": self.outfd, "fwdbuf": self.fwdbuf}
-        super().__init__(dec_ps, dkwargs, nproc)
-        self.receiver: zmq.Socket | None = self.context.socket(zmq.PULL)
-        self.receiver.setsockopt(zmq.RCVHWM, DEC_HWM)
-        self.receiver.bind(self.outfd)
+        self.profile: DecodeProfile | None = profile
+        # POSIX shared memory names are limited to 31 characters on macOS
+        self.ringname = "pd" + seed[:24] if shm else None
+        self.slots = slots
+        self.pool = None if self.ringname is None else FramePool(self.ringname, slots)
+        dkwargs = {
+            "infd": self.infd,
+            "outfd": self.outfd,
+            "fwdbuf": self.fwdbuf,
+            "profile": self.profile,
+            "ring": self.ringname,
+            "slots": self.slots,
+            "index": mp.Value("i", 0),  # decoder processes started, each names its ring
+        }
+        super().__init__(dec_ps, dkwargs, nproc, burst, backend, warm)
+        self.receiver: zmq.Socket | None = self._connect()
+        self.reorder = None if reorder is None else ReorderBuffer(reorder)
+        self.ready: deque[RecvData] = deque()
+        self.traces = LatencyStats()
+        self.canvas = TileCanvas()
+
+    def _connect(self) -> zmq.Socket:
+        """Socket that recv takes frames from the decoders on."""
+        receiver = self.context.socket(zmq.PULL)
+        receiver.setsockopt(zmq.RCVHWM, DEC_HWM)
+        if self.backend == "inline":
+            receiver.connect(self.infd)  # encoded frames, decoded in recv
+        else:
+            receiver.bind(self.outfd)
+        return receiver
+
+    def start(self) -> None:
+        """Start the decoder device, again if it was stopped."""
+        if self.receiver is None:
+            self.receiver = self._connect()
+        super().start()
 
     def stop(self) -> None:
         """Stop the decoder device and clean up resources."""
@@ -71,6 +275,8 @@ class DecoderDevice(Device):
                 self.receiver.close(linger=0)
             self.receiver = None
         super().stop()
+        if self.pool is not None:
+            self.pool.close()
 
     def recv(self, timeout=60_000):
         """Receive a package of data from the decoder pool.
@@ -83,20 +289,94 @@ class DecoderDevice(Device):
             TimeoutError: Raised when no messages are received in the timeout period.
 
         Returns:
-            list: [arr, buf, meta, ftime, fno].
+            RecvData: {arr, buf, meta, ftime, fno}. arr and buf are zero-copy views of the
+                received message; call detach() on it if they must own their memory.
+                Tile delta frames are patched into whole frames by self.canvas, and
+                dropped if their keyframe is missing. Traced frames are stamped "recv"
+                and recorded in self.traces. With shm, arr is a view of a slot that is
+                released once the last reference to it is gone.
         """
         if self.receiver is None:
             raise RuntimeError("Decoder device has been stopped")
         self.start()
-        if self.receiver.poll(timeout):
-            return intf.recv(
-                socket=self.receiver,
-                arr=True,
-                buf=self.fwdbuf,
-                flags=zmq.NOBLOCK,
-            )
-        else:
-            raise TimeoutError(f"No messages were received within the timeout period {timeout}ms")
+        end = None if timeout is None else time.time() + timeout / 1000
+        while True:
+            if self.reorder is not None:
+                data = self._recv_ordered(timeout, end)
+            elif self.receiver.poll(self._left(end)):
+                data = self._recv()
+            else:
+                raise TimeoutError(
+                    f"No messages were received within the timeout period {timeout}ms"
+                )
+            if data.codec != TileCodec.id:
+                break
+            if self.canvas.patch(data):
+                if not self.fwdbuf:
+                    data.buf = None
+                break
+        if data.trace is not None:
+            stamp(data, "recv")
+            self.traces.record(data)
+        return data
+
+    @property
+    def poll_socket(self) -> zmq.Socket | None:
+        """Socket that becomes readable when a decoded frame arrives, or inline, a frame
+        to decode."""
+        return self.receiver
+
+    def poll_timeout(self) -> int | None:
+        """Milliseconds until a frame is ready regardless of the socket, see PlayoutBuffer.
+
+        Returns:
+            int | None: 0 if a reordered frame is ready, the time to the next reorder
+                deadline, or None if only the socket can deliver a frame.
+        """
+        if self.ready:
+            return 0
+        return None if self.reorder is None else self.reorder.timeout()
+
+    def _recv(self) -> RecvData:
+        assert self.receiver is not None  # only called from recv, which checks it
+        if self.backend == "inline":
+            data = intf.recv(socket=self.receiver, buf=True, flags=zmq.NOBLOCK, copy=False)
+            stamp(data, "decoder.in")
+            return decode_frame(data, self.profile, self.fwdbuf)
+        # buf is only sent if forwarded, or for the canvas
+        return intf.recv(
+            socket=self.receiver,
+            arr=True,
+            buf=True,
+            flags=zmq.NOBLOCK,
+            copy=False,
+            ring=self.pool,
+        )
+
+    @staticmethod
+    def _left(end: float | None) -> int | None:
+        """Milliseconds until end, or None to wait forever."""
+        return None if end is None else max(0, math.ceil((end - time.time()) * 1000))
+
+    def _recv_ordered(self, timeout: int | None, end: float | None) -> RecvData:
+        """Receive through the reorder buffer, waking up for its deadlines as well."""
+        assert self.receiver is not None and self.reorder is not None
+        while not self.ready:
+            now = time.time()
+            self.ready.extend(self.reorder.expire(now))
+            if self.ready:
+                break
+            wait = self.reorder.timeout(now)
+            left = self._left(end)
+            if left is not None:
+                wait = left if wait is None else min(wait, left)
+            if self.receiver.poll(wait):
+                self.ready.extend(self.reorder.push(self._recv()))
+            elif end is not None and time.time() >= end:
+                raise TimeoutError(
+                    f"No messages were received within the timeout period {timeout}ms"
+                )
+        return self.ready.popleft()
 
     def handler(self, timeout):
         """Yield a package of data from the decoder pool.
@@ -116,8 +396,16 @@ class DecoderDevice(Device):
     def __repr__(self):
         rpr = "-----DecoderDevice-----\n"
         rpr += f"{'PCS': <8}{self.nproc}\n"
+        if self.backend != "process":
+            rpr += f"{'BACKEND': <8}{self.backend}\n"
         rpr += f"{'FWDBUF': <8}{self.fwdbuf}\n"
         rpr += f"{'IN': <8}{self.infd}\n"
         rpr += f"{'OUT': <8}{self.outfd}\n"
         rpr += f"{'HWM': <8}({DEC_HWM} > {DEC_HWM})"
+        if self.profile is not None:
+            rpr += f"\n{'PROFILE': <8}{self.profile.mode} x{self.profile.scale}"
+        if self.reorder is not None:
+            rpr += f"\n{'REORDER': <8}{self.reorder.latency * 1e3:.1f} ms"
+        if self.ringname is not None:
+            rpr += f"\n{'SHM': <8}{self.ringname} ({self.slots} slots)"
         return rpr
@@ -0,0 +1,243 @@
+import numpy as np
+
+from ..stream.interface import RecvData
+from . import DELTA_THRESHOLD, DELTA_TILE, KEYFRAME_INTERVAL, MOSAIC_COLUMNS
+from .codecs import TILES
+
+
+def pad(arr: np.ndarray, tile: int) -> np.ndarray:
+    """Pad a frame with zeros to a whole number of tiles.
+
+    Args:
+        arr (np.ndarray): Frame of shape (height, width, ...).
+        tile (int): Tile size in pixels.
+
+    Returns:
+        np.ndarray: Contiguous frame of whole tiles. arr itself if it already was one.
+    """
+    h, w = arr.shape[:2]
+    rows, cols = -(-h // tile), -(-w // tile)
+    if (rows * tile, cols * tile) != (h, w):
+        return np.pad(arr, [(0, rows * tile - h), (0, cols * tile - w)] + [(0, 0)] * (arr.ndim - 2))
+    return np.ascontiguousarray(arr)
+
+
+def grid(arr: np.ndarray, tile: int) -> np.ndarray:
+    """View a padded frame as a grid of tiles.
+
+    Args:
+        arr (np.ndarray): Contiguous frame of whole tiles, see pad.
+        tile (int): Tile size in pixels.
+
+    Returns:
+        np.ndarray: View of shape (rows, columns, tile, tile, ...).
+    """
+    rows, cols = arr.shape[0] // tile, arr.shape[1] // tile
+    return arr.reshape(rows, tile, cols, tile, *arr.shape[2:]).swapaxes(1, 2)
+
+
+def mosaic(tiles: np.ndarray) -> np.ndarray:
+    """Lay tiles out side by side, MOSAIC_COLUMNS to a row, so they encode as one image.
+
+    Args:
+        tiles (np.ndarray): Shape (n, tile, tile, ...).
+
+    Returns:
+        np.ndarray: Shape (rows * tile, columns * tile, ...). A blank tile if n is 0.
+    """
+    n, tile = tiles.shape[:2]
+    cols = min(max(n, 1), MOSAIC_COLUMNS)
+    rows = -(-max(n, 1) // cols)
+    out = np.zeros((rows * cols, *tiles.shape[1:]), dtype=tiles.dtype)
+    out[:n] = tiles
+    out = out.reshape(rows, cols, *tiles.shape[1:]).swapaxes(1, 2)
+    return out.reshape(rows * tile, cols * tile, *tiles.shape[3:])
+
+
+def unmosaic(arr: np.ndarray, n: int, tile: int) -> np.ndarray:
+    """Undo mosaic.
+
+    Args:
+        arr (np.ndarray): Output of mosaic.
+        n (int): Number of tiles.
+        tile (int): Tile size in pixels.
+
+    Returns:
+        np.ndarray: Shape (n, tile, tile, ...).
+    """
+    rows, cols = arr.shape[0] // tile, arr.shape[1] // tile
+    out = arr.reshape(rows, tile, cols, tile, *arr.shape[2:]).swapaxes(1, 2)
+    return out.reshape(rows * cols, tile, tile, *arr.shape[2:])[:n]
+
+
+def prefix(buf: bytes | memoryview) -> bytes:
+    """The TILES header and tile indices of a tiles payload, without the encoded image."""
+    ntiles = TILES.unpack_from(buf)[-1]
+    return bytes(memoryview(buf)[: TILES.size + 4 * ntiles])
+
+
+class TileDelta:
+    def __init__(
+        self,
+        tile: int = DELTA_TILE,
+        keyframe: int = KEYFRAME_INTERVAL,
+        threshold: float = DELTA_THRESHOLD,
+    ) -> None:
+        """Send only the tiles of a frame that changed since the last keyframe.
+
+        Lives in the process that sends frames. Every frame is compared to the last
+        keyframe in tiles of tile x tile pixels. A tile whose mean absolute difference
+        exceeds threshold has changed, and only changed tiles are handed to the encoders,
+        laid out side by side as one small image. Every keyframe-th frame is sent whole
+        as the next keyframe. Receivers patch the tiles into their copy of the keyframe,
+        see TileCanvas.
+
+        Args:
+            tile (int, optional): Tile size in pixels, a multiple of 16 up to 256, so that
+                JPEG blocks never straddle two tiles. Defaults to DELTA_TILE.
+            keyframe (int, optional): Frames from one keyframe to the next.
+                Defaults to KEYFRAME_INTERVAL.
+            threshold (float, optional): Mean absolute difference per value above which
+                a tile has changed. Defaults to DELTA_THRESHOLD.
+
+        Raises:
+            ValueError: Raised if tile is out of range or keyframe is not positive.
+        """
+        if not 0 < tile <= 256 or tile % 16:
+            raise ValueError(f"Tile size must be a multiple of 16 up to 256, got {tile}")
+        if keyframe <= 0:
+            raise ValueError(f"Keyframe interval must be positive, got {keyframe}")
+        self.tile, self.keyframe, self.threshold = tile, keyframe, threshold
+        self.key: np.ndarray | None = None  # the last keyframe, padded to whole tiles
+        self.keyfno = 0
+        self.since = 0  # frames since the last keyframe, including it
+        self.keyframes = self.deltas = self.sent = self.total = 0
+
+    def split(self, frame: np.ndarray, fno: int, codec: int) -> tuple[np.ndarray, bytes]:
+        """Decide what to encode of a frame.
+
+        Args:
+            frame (np.ndarray): A frame of video.
+            fno (int): Its frame number.
+            codec (int): Id of the codec the encoders compress with.
+
+        Returns:
+            tuple(np.ndarray, bytes): What to encode, either the whole frame or its
+                changed tiles side by side, and the payload prefix to send it with.
+        """
+        h, w = frame.shape[:2]
+        image = pad(frame, self.tile)
+        if (
+            self.key is None
+            or self.since >= self.keyframe
+            or self.key.shape != image.shape
+            or self.key.dtype != image.dtype
+        ):
+            self.key = image.copy() if image is frame else image
+            self.keyfno, self.since = fno, 1
+            self.keyframes += 1
+            return frame, TILES.pack(True, codec, self.tile, h, w, fno, 0)
+        self.since += 1
+        self.deltas += 1
+        changed = np.flatnonzero(self.difference(image) > self.threshold).astype("<u4")
+        tiles = grid(image, self.tile)
+        self.sent += len(changed)
+        self.total += tiles.shape[0] * tiles.shape[1]
+        rows, cols = np.divmod(changed, tiles.shape[1])
+        header = TILES.pack(False, codec, self.tile, h, w, self.keyfno, len(changed))
+        return mosaic(tiles[rows, cols]), header + changed.tobytes()
+
+    def difference(self, image: np.ndarray) -> np.ndarray:
+        """Mean absolute difference of every tile to the keyframe, in tile order.
+
+        Args:
+            image (np.ndarray): A frame padded to whole tiles, shaped like the keyframe.
+
+        Returns:
+            np.ndarray: Flat array of one value per tile.
+        """
+        assert self.key is not None
+        tile = self.tile
+        rows, cols = image.shape[0] // tile, image.shape[1] // tile
+        if image.dtype == np.uint8:
+            # max - min is the absolute difference without widening, and a column of
+            # tile values of up to 255 each fits in uint16
+            diff = np.maximum(image, self.key)
+            diff -= np.minimum(image, self.key)
+            acc = np.uint16
+        else:
+            diff = np.abs(image.astype(np.float64) - self.key)
+            acc = np.float64
+        # reduce over contiguous rows first, then over the columns of every tile
+        sums = diff.reshape(rows, tile, -1).sum(axis=1, dtype=acc)
+        sums = sums.reshape(rows * cols, -1).sum(axis=1, dtype=np.float64)
+        return sums / (image.size / (rows * cols))
+
+    def drop(self) -> None:
+        """The frame last split was never sent. If it was a keyframe, send the next one."""
+        if self.since == 1:
+            self.key = None
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of tiles sent in delta frames, 1.0 if none were sent yet."""
+        return self.sent / self.total if self.total else 1.0
+
+    def __repr__(self) -> str:
+        return (
+            f"TileDelta(tile={self.tile}, keyframe={self.keyframe}, "
+            f"threshold={self.threshold}, sent={self.ratio:.0%})"
+        )
+
+
+class TileCanvas:
+    def __init__(self) -> None:
+        """Rebuild whole frames from the keyframes and tiles sent by a TileDelta.
+
+        Lives in the process that receives decoded frames, since a keyframe only passes
+        through one of the decoder processes. Delta frames whose keyframe was lost or has
+        not arrived yet cannot be rebuilt and are dropped, until the next keyframe.
+        """
+        self.key: np.ndarray | None = None  # the last keyframe, padded to whole tiles
+        self.image: np.ndarray | None = None  # the last frame, padded to whole tiles
+        self.canvas: np.ndarray | None = None  # grid view of image
+        self.dirty: np.ndarray | None = None  # tiles of canvas that differ from key
+        self.keyfno: int | None = None
+        self.dropped = 0
+
+    def patch(self, data: RecvData) -> bool:
+        """Replace the decoded arr of a tiles frame with the whole frame.
+
+        Args:
+            data (RecvData): A frame encoded with TileCodec, decoded by a decoder process.
+                Its buf must start with the payload prefix.
+
+        Returns:
+            bool: False if the frame was dropped because its keyframe is missing.
+        """
+        if data.arr is None or data.buf is None:
+            return False
+        key, _, tile, h, w, keyfno, ntiles = TILES.unpack_from(data.buf)
+        if key:
+            self.key = pad(data.arr, tile).copy()
+            self.image = self.key.copy()
+            self.canvas = grid(self.image, tile)
+            self.dirty = np.zeros(self.canvas.shape[:2], dtype=bool)
+            self.keyfno = keyfno
+        elif keyfno != self.keyfno:
+            self.dropped += 1
+            return False
+        else:
+            assert self.key is not None and self.canvas is not None and self.dirty is not None
+            assert self.image is not None
+            changed = np.frombuffer(data.buf, "<u4", ntiles, TILES.size)
+            mask = np.zeros(self.dirty.size, dtype=bool)
+            mask[changed] = True
+            mask = mask.reshape(self.dirty.shape)
+            restore = self.dirty & ~mask  # changed last frame, back to the keyframe now
+            self.canvas[restore] = grid(self.key, tile)[restore]
+            self.canvas[mask] = unmosaic(data.arr, ntiles, tile)
+            self.dirty = mask
+        assert self.image is not None
+        data.arr = self.image[:h, :w].copy()
+        return True
@@ -1,13 +1,189 @@
+import contextlib
+import inspect
 import multiprocessing as mp
-from collections.abc import Callable
-from typing import Any
+import threading
+import time
+import uuid
+from collections.abc import Callable, Generator
+from typing import Any, TypeVar
+
+import zmq
+
+from ..stream import interface as intf
+from ..stream.interface import RecvData
+from ..stream.trace import stamp
+from . import BACKEND, BACKENDS
 
 # Process management constants
-BARRIER_TIMEOUT_SECONDS = 3
+CONTROL_TIMEOUT_MS = 3000
 PROCESS_JOIN_TIMEOUT_SHORT = 1  # seconds
 PROCESS_JOIN_TIMEOUT_LONG = 5  # seconds
 PROCESS_TERMINATE_JOIN_TIMEOUT = 1  # seconds
 
+SocketT = TypeVar("SocketT", bound=zmq.Socket)
+
+
+def endpoint(backend: str, name: str, seed: str) -> str:
+    """Endpoint between a device and its workers: inproc for threads, ipc otherwise.
+
+    Args:
+        backend (str): Backend of the device, one of BACKENDS.
+        name (str): Name of the socket.
+        seed (str): File descriptor seed (to prevent ipc collisions).
+
+    Returns:
+        str: Endpoint to bind and connect to.
+    """
+    return ("inproc://" if backend == "thread" else "ipc:///tmp/") + name + seed
+
+
+def control(context: zmq.Context[SocketT], shutdown: str) -> SocketT:
+    """Connect to the shutdown control socket of a Device. Call once every other socket is
+    set up, as the device counts the connection as the function being ready.
+
+    Args:
+        context (zmq.Context): Context of the background process, sync or asyncio.
+        shutdown (str): Control endpoint, as passed to the device function.
+
+    Returns:
+        zmq.Socket: Socket of the type the context makes, that becomes readable when
+            the device is stopped.
+    """
+    ctl = context.socket(zmq.SUB)
+    ctl.connect(shutdown)
+    ctl.subscribe(b"")
+    return ctl
+
+
+def pooled(dfunc: Callable[..., None], dkwargs: dict[str, Any], lobby: str) -> None:
+    """Body of a warm process, see Device: run dfunc once for every control endpoint
+    announced on the lobby socket, until an empty announcement closes the process.
+
+    The zmq context lives as long as the process, and is lent to dfunc if it takes a
+    'context' argument. Functions that bind sockets should create their own, as only
+    terminating a context guarantees their endpoints are free for the next run.
+
+    Args:
+        dfunc (function): Device function, see Device.
+        dkwargs (dict): Kwargs to pass to dfunc, but for 'shutdown'.
+        lobby (str): Endpoint of the lobby socket of the device.
+    """
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.connect(lobby)
+    socket.subscribe(b"")
+    kwargs = dict(dkwargs)
+    if "context" in inspect.signature(dfunc).parameters:
+        kwargs["context"] = context
+    try:
+        while shutdown := socket.recv().decode():
+            kwargs["shutdown"] = shutdown
+            dfunc(**kwargs)
+    finally:
+        socket.close(linger=0)
+        context.term()
+
+
+def serve(
+    ctl: zmq.Socket,
+    *sockets: zmq.Socket,
+    timeout: Callable[[], int | None] | None = None,
+) -> Generator[dict, None, None]:
+    """Block until one of the sockets has a message.
+
+    Args:
+        ctl (zmq.Socket): Control socket returned by control().
+        *sockets (zmq.Socket): Sockets to wait on.
+        timeout (callable, optional): Called before every wait for the longest time to
+            wait in milliseconds, or None to wait indefinitely. Defaults to None.
+
+    Yields:
+        dict: Readable sockets, mapped to their poll events, or empty on timeout.
+            Returns on shutdown.
+    """
+    poller = zmq.Poller()
+    poller.register(ctl, zmq.POLLIN)
+    for socket in sockets:
+        poller.register(socket, zmq.POLLIN)
+    while True:
+        events = dict(poller.poll(None if timeout is None else timeout()))
+        if ctl in events:
+            return
+        yield events
+
+
+def drain(
+    socket: zmq.Socket,
+    burst: int,
+    stats: "BatchStats | None" = None,
+    stage: str | None = None,
+    **kwargs: Any,
+) -> Generator[RecvData, None, None]:
+    """Receive every message already queued on a socket, up to a budget, without blocking.
+
+    Args:
+        socket (zmq.Socket): Socket to receive from.
+        burst (int): Maximum number of messages to receive.
+        stats (BatchStats, optional): Records how many messages were received. Defaults to None.
+        stage (str, optional): Device name to stamp traced messages with on arrival, as
+            stage + ".in", see pystreaming.stream.trace. Defaults to None.
+        **kwargs: Passed to interface.recv.
+
+    Yields:
+        RecvData: Received messages.
+    """
+    n = 0
+    try:
+        while n < burst:
+            data = intf.recv(socket=socket, flags=zmq.NOBLOCK, **kwargs)
+            n += 1
+            if stage is not None:
+                stamp(data, stage + ".in")
+            yield data
+    except zmq.Again:
+        pass
+    finally:
+        if stats is not None:
+            stats.record(n)
+
+
+class BatchStats:
+    def __init__(self, burst: int) -> None:
+        """Histogram of messages handled per loop iteration, shared between processes.
+
+        Args:
+            burst (int): Largest batch size that can be recorded.
+        """
+        self.counts = mp.Array("q", burst + 1)
+
+    def record(self, n: int) -> None:
+        """Record one loop iteration that handled n messages.
+
+        Args:
+            n (int): Batch size.
+        """
+        with self.counts.get_lock():
+            self.counts[n] += 1
+
+    def histogram(self) -> dict[int, int]:
+        """Number of loop iterations per batch size, leaving out unseen sizes.
+
+        Returns:
+            dict: Batch size to number of iterations.
+        """
+        counts = self.counts[:]  # one consistent copy, under a single lock acquisition
+        return {n: count for n, count in enumerate(counts) if count}
+
+    def mean(self) -> float:
+        """Mean batch size. A mean close to the burst budget means the device is saturated.
+
+        Returns:
+            float: Mean messages per loop iteration, or 0.0 if nothing was recorded.
+        """
+        hist = self.histogram()
+        total = sum(hist.values())
+        return sum(n * c for n, c in hist.items()) / total if total else 0.0
+
 
 class Device:
     def __init__(
@@ -15,61 +191,158 @@ class Device:
         dfunc: Callable[..., None],
         dkwargs: dict[str, Any],
         nproc: int,
+        burst: int | None = None,
+        backend: str = BACKEND,
+        warm: bool = False,
     ) -> None:
         """Background running device.
 
         Args:
             dfunc (function): Function to run in background.
-                Must have 'shutdown' and 'barrier' as arguments.
+                Must have 'shutdown' as an argument, the endpoint of a control socket to
+                pass to control(). The device is started once every dfunc has connected.
             dkwargs (dict): Kwargs to pass to dfunc.
             nproc (int): Number of background processes to launch.
+            burst (int, optional): Maximum messages dfunc handles per wakeup. If set, dfunc
+                must also have 'burst' and 'stats' as arguments, see drain().
+                Defaults to None.
+            backend (str, optional): "process" to run dfunc in nproc processes, "thread"
+                to run it in nproc threads of this process, or "inline" to run nothing in
+                the background, leaving the work to the subclass in the calling thread.
+                Threads get the 'context' argument, the zmq context of this process,
+                which inproc endpoints need, see endpoint(). Defaults to BACKEND.
+            warm (bool, optional): Keep the processes alive when the device is stopped,
+                so that it starts again without spawning any, until close(). Only
+                processes are kept warm, threads start fast as they are, see pooled().
+                Defaults to False.
+
+        Raises:
+            ValueError: Raised if the backend is not one of BACKENDS.
         """
         assert isinstance(dkwargs, dict)  # we only pass in arguments as kwargs
         assert nproc > 0
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend must be one of {BACKENDS}, got {backend!r}")
         self.dfunc, self.dkwargs, self.nproc = dfunc, dkwargs, nproc
-        self.barrier = mp.Barrier(nproc + 1, timeout=BARRIER_TIMEOUT_SECONDS)
-        self.shutdown = mp.Event()
-        dkwargs["barrier"] = self.barrier
-        dkwargs["shutdown"] = self.shutdown
-        self.processes: list[mp.Process] = []
+        self.backend = backend
+        self.warm = warm and backend == "process"
+        if backend == "thread":
+            dkwargs["context"] = zmq.Context.instance()
+        self.stats: BatchStats | None = None
+        if burst is not None:
+            assert burst > 0
+            self.stats = BatchStats(burst)
+            dkwargs["burst"] = burst
+            dkwargs["stats"] = self.stats
+        self.ctl: zmq.Socket | None = None  # set while started
+        self.lobby: zmq.Socket | None = None  # set while warm processes are up
+        self.processes: list[mp.Process | threading.Thread] = []
 
     def start(self) -> None:
-        """Start background processes. Does nothing if already started."""
-        if self.processes != []:
+        """Start background processes. Does nothing if already started, or inline.
+
+        Raises:
+            RuntimeError: Raised if a process does not connect in time.
+        """
+        if self.ctl is not None or self.backend == "inline":
             return
-        for _ in range(self.nproc):
-            self.processes.append(mp.Process(target=self.dfunc, kwargs=self.dkwargs))
-        for ps in self.processes:
-            ps.daemon = True
-            ps.start()
-        try:
-            self.barrier.wait()
-        except mp.BrokenBarrierError:  # type: ignore[attr-defined]
-            # Clean up processes if barrier times out
-            self.shutdown.set()
-            for ps in self.processes:
-                ps.join(timeout=PROCESS_JOIN_TIMEOUT_SHORT)
-            self.processes = []
-            self.shutdown.clear()
+        shutdown = endpoint(self.backend, "ctl", uuid.uuid1().hex)
+        self.ctl = self._publish(shutdown)
+        started = True
+        if not self.warm:
+            self.dkwargs["shutdown"] = shutdown
+            self._spawn(self.dfunc, self.dkwargs)
+        elif self.processes == []:
+            lobby = endpoint(self.backend, "pool", uuid.uuid1().hex)
+            self.lobby = self._publish(lobby)
+            self._spawn(pooled, {"dfunc": self.dfunc, "dkwargs": self.dkwargs, "lobby": lobby})
+            started = self._await(self.lobby, 1)
+        if started and self.lobby is not None:
+            self.lobby.send(shutdown.encode())  # every warm process is listening
+        # Wait until every process is subscribed, so that stop() cannot be missed
+        started = started and self._await(self.ctl, 1)
+        if not started:
+            self._halt(PROCESS_JOIN_TIMEOUT_SHORT)
             raise RuntimeError(
-                "Failed to start device processes: barrier timeout. "
+                "Failed to start device processes: they did not connect in time. "
                 "Processes may have failed to initialize."
-            ) from None
+            )
 
     def stop(self) -> None:
-        """Stop background processes. Does nothing if already stopped."""
-        if self.processes == []:
+        """Stop background processes, or only their work if warm. Does nothing if already
+        stopped."""
+        if self.ctl is None:
             return
-        self.shutdown.set()
+        if self.lobby is not None:
+            with contextlib.suppress(zmq.ZMQError):
+                self.ctl.send(b"", flags=zmq.NOBLOCK)
+            # a run is over once its control socket is closed
+            if self._await(self.ctl, 0, PROCESS_JOIN_TIMEOUT_LONG * 1000):
+                self.ctl.close(linger=0)
+                self.ctl = None
+                return
+        self._halt(PROCESS_JOIN_TIMEOUT_LONG)
+
+    def close(self) -> None:
+        """Stop the device and its warm processes for good. Same as stop() if not warm."""
+        self.stop()
+        if self.processes != []:
+            self._halt(PROCESS_JOIN_TIMEOUT_LONG)
+
+    def _publish(self, address: str) -> zmq.Socket:
+        """Bind a socket that counts its subscribers, see _await."""
+        socket = zmq.Context.instance().socket(zmq.XPUB)
+        socket.setsockopt(zmq.XPUB_VERBOSE, 1)  # report every subscriber, not just the first
+        socket.setsockopt(zmq.XPUB_VERBOSER, 1)  # and every one that leaves
+        socket.bind(address)
+        return socket
+
+    def _spawn(self, target: Callable[..., None], kwargs: dict[str, Any]) -> None:
+        """Start nproc processes, or threads, running target."""
+        worker = threading.Thread if self.backend == "thread" else mp.Process
+        self.processes = [worker(target=target, kwargs=kwargs) for _ in range(self.nproc)]
         for ps in self.processes:
-            ps.join(timeout=PROCESS_JOIN_TIMEOUT_LONG)
-            if ps.is_alive():
-                # Process didn't terminate gracefully, force terminate
-                ps.terminate()
-                ps.join(timeout=PROCESS_TERMINATE_JOIN_TIMEOUT)
-                if ps.is_alive():
-                    # Still alive, kill it
-                    ps.kill()
-                    ps.join()
+            ps.daemon = True
+            ps.start()
+
+    def _await(self, socket: zmq.Socket, event: int, timeout: int = CONTROL_TIMEOUT_MS) -> bool:
+        """Wait for every process to subscribe (event 1) to a socket, or to leave it (0).
+
+        Returns:
+            bool: False if timeout milliseconds passed without any of them doing so.
+        """
+        count = 0
+        while count < self.nproc:
+            if not socket.poll(timeout):
+                return False
+            count += socket.recv()[0] == event
+        return True
+
+    def _halt(self, timeout: float) -> None:
+        """Signal shutdown, then join, terminate or kill every process, all at once."""
+        for socket in (self.ctl, self.lobby):
+            if socket is not None:
+                with contextlib.suppress(zmq.ZMQError):
+                    socket.send(b"", flags=zmq.NOBLOCK)
+        # threads cannot be terminated, a stuck one is left to the interpreter exit
+        stuck = self._join(self.processes, timeout)
+        stuck = [ps for ps in stuck if isinstance(ps, mp.Process)]
+        for ps in stuck:
+            ps.terminate()
+        for ps in self._join(stuck, PROCESS_TERMINATE_JOIN_TIMEOUT):
+            # Still alive, kill it
+            ps.kill()
+            ps.join()
         self.processes = []
-        self.shutdown.clear()
+        for socket in (self.ctl, self.lobby):
+            if socket is not None:
+                socket.close(linger=0)
+        self.ctl = self.lobby = None
+
+    @staticmethod
+    def _join(processes: list, timeout: float) -> list:
+        """Join processes against one deadline, returning those still alive after it."""
+        deadline = time.monotonic() + timeout
+        for ps in processes:
+            ps.join(timeout=max(deadline - time.monotonic(), 0))
+        return [ps for ps in processes if ps.is_alive()]
@@ -1,87 +1,347 @@
 import contextlib
+import dataclasses
+import struct
 import time
+from collections import deque
 
 import zmq
 
 from ..listlib.circularlist import CircularList, Empty
 from ..stream import interface as intf
 from ..stream.interface import RecvData
-from . import DIST_HWM, DIST_TIMESTEP, FRAMEMISS, TRACKMISS
-from .device import Device
+from ..stream.trace import stamp
+from . import (
+    BURST,
+    DIST_HWM,
+    DIST_POLICIES,
+    DIST_POLICY,
+    FRAMEMISS,
+    RATE_SMOOTHING,
+    TRACKMISS,
+)
+from .device import Device, control, drain, serve
 
+# frames a requester can take, sent after the track name. REQ requesters send no credits
+# and are answered right away, with FRAMEMISS if no frame is queued
+CREDITS = struct.Struct("<I")
 
-def dist_ps(*, shutdown, barrier, infd, endpoint, tracks):
+
+def reply(socket: zmq.Socket, identity: bytes, data: RecvData) -> None:
+    """Send a frame to one requester of a ROUTER socket.
+
+    Args:
+        socket (zmq.Socket): ROUTER socket.
+        identity (bytes): Routing id of the requester.
+        data (RecvData): Frame to send.
+
+    Raises:
+        zmq.ZMQError: Raised if the requester is gone or not keeping up.
+    """
+    socket.send(identity, zmq.SNDMORE | zmq.NOBLOCK)
+    socket.send(b"", zmq.SNDMORE | zmq.NOBLOCK)
+    intf.send(
+        socket=socket,
+        fno=data.fno,
+        ftime=data.ftime,
+        meta=data.meta,
+        buf=data.buf,
+        flags=zmq.NOBLOCK,
+        trace=data.trace,
+        codec=data.codec,
+        layer=data.layer,
+    )
+
+
+def outgoing(data: RecvData) -> RecvData:
+    """A frame of a track queue, stamped on its way out.
+
+    Args:
+        data (RecvData): Frame to send.
+
+    Returns:
+        RecvData: The frame, with a trace of its own.
+    """
+    if data.trace is not None:  # every track queue shares the frame
+        data = dataclasses.replace(data, trace=list(data.trace))
+    stamp(data, "distributor.out")
+    return data
+
+
+def take(fqueue: CircularList[RecvData]) -> RecvData:
+    """Pop the next frame of a track queue, stamped on its way out.
+
+    Args:
+        fqueue (CircularList[RecvData]): Frames of a track.
+
+    Raises:
+        Empty: Raised if the queue is empty.
+
+    Returns:
+        RecvData: The frame, see outgoing().
+    """
+    return outgoing(fqueue.pop())
+
+
+class Track:
+    def __init__(self, policy: str = DIST_POLICY) -> None:
+        """Frames of one track and the workers that asked for them, see DistributorDevice.
+
+        Args:
+            policy (str, optional): One of DIST_POLICIES. Defaults to DIST_POLICY.
+        """
+        self.policy = policy
+        self.fqueue = CircularList[RecvData]()
+        self.waiting: dict[bytes, int] = {}  # identity to credits, in turn order
+        self.sent: dict[bytes, deque[float]] = {}  # identity to send times of frames
+        self.service: dict[bytes, float] = {}  # identity to moving average service time
+        self.shards: dict[bytes, CircularList[RecvData]] = {}  # in order of arrival
+
+    def push(self, data: RecvData) -> None:
+        """Queue a frame for the workers of the track.
+
+        Args:
+            data (RecvData): Frame to queue. Dropped under "shard" until a worker arrives.
+        """
+        if self.policy != "shard":
+            self.fqueue.push(data)
+        elif self.shards:
+            members = list(self.shards.values())
+            members[data.fno % len(members)].push(data)
+
+    def request(self, identity: bytes, credits: int) -> None:
+        """Add credits for a worker.
+
+        Args:
+            identity (bytes): Routing id of the worker.
+            credits (int): Frames it can take on top of those it already asked for.
+        """
+        self.waiting[identity] = self.waiting.get(identity, 0) + credits
+        sent = self.sent.setdefault(identity, deque())
+        now = time.perf_counter()
+        for _ in range(min(credits, len(sent))):  # each credit replaces the oldest frame
+            sample = now - sent.popleft()
+            average = self.service.get(identity, sample)
+            self.service[identity] = average + RATE_SMOOTHING * (sample - average)
+        self.join(identity)
+
+    def join(self, identity: bytes) -> None:
+        """Give a worker its shard of the frames, under "shard"."""
+        if self.policy == "shard" and identity not in self.shards:
+            self.shards[identity] = CircularList[RecvData]()
+
+    def forget(self, identity: bytes) -> None:
+        """Drop a worker that is gone, along with the frames of its shard."""
+        self.waiting.pop(identity, None)
+        self.sent.pop(identity, None)
+        self.service.pop(identity, None)
+        self.shards.pop(identity, None)
+
+    def take(self, identity: bytes) -> RecvData:
+        """Pop the next frame for a worker that asked without credits.
+
+        Args:
+            identity (bytes): Routing id of the worker.
+
+        Raises:
+            Empty: Raised if no frame is queued for it.
+
+        Returns:
+            RecvData: The frame, see take().
+        """
+        self.join(identity)
+        return take(self.shards[identity] if self.policy == "shard" else self.fqueue)
+
+    def dispatch(self, socket: zmq.Socket) -> None:
+        """Send queued frames to the workers with credits, as the policy of the track says.
+
+        A frame stays at the head of its queue until a worker takes it. Workers whose
+        pipe is full keep their credits and are passed over until the next dispatch.
+
+        Args:
+            socket (zmq.Socket): ROUTER socket.
+        """
+        full: set[bytes] = set()
+        if self.policy == "shard":
+            for identity in list(self.waiting):
+                fqueue = self.shards[identity]
+                while identity in self.waiting and identity not in full and fqueue.size:
+                    if self.send(socket, identity, outgoing(fqueue[0]), full):
+                        fqueue.pop()
+        elif self.policy == "broadcast":
+            while self.fqueue.size and any(i not in full for i in self.waiting):
+                data = take(self.fqueue)  # workers that are full miss it
+                for identity in [i for i in self.waiting if i not in full]:
+                    self.send(socket, identity, data, full)
+        else:
+            while self.fqueue.size:
+                ready = [identity for identity in self.waiting if identity not in full]
+                if not ready:
+                    break
+                identity = ready[0]
+                if self.policy == "leastloaded":  # first in turn of the least loaded
+                    identity = min(ready, key=self.backlog)
+                if self.send(socket, identity, outgoing(self.fqueue[0]), full):
+                    self.fqueue.pop()
+
+    def backlog(self, identity: bytes) -> float:
+        """Seconds a worker would take to be done with one more frame, by the frames it
+        has not replaced yet and its recent service time, or the time it has spent on
+        its oldest frame if that is longer. 0.0 for a worker that was never sent any."""
+        sent = self.sent[identity]
+        service = self.service.get(identity, 0.0)
+        if sent:
+            service = max(service, time.perf_counter() - sent[0])
+        return (len(sent) + 1) * service
+
+    def send(self, socket: zmq.Socket, identity: bytes, data: RecvData, full: set[bytes]) -> bool:
+        """Send a frame to a worker with credits and move it to the back of the line.
+
+        Args:
+            socket (zmq.Socket): ROUTER socket.
+            identity (bytes): Routing id of the worker.
+            data (RecvData): Frame to send.
+            full (set[bytes]): Workers whose pipe is full, added to if this one is. It
+                keeps its credits and its turn.
+
+        Raises:
+            zmq.ZMQError: Raised for any error but a full pipe or a worker that is gone.
+
+        Returns:
+            bool: False if the worker is full, or gone and was forgotten.
+        """
+        try:
+            reply(socket, identity, data)
+        except zmq.ZMQError as e:
+            if e.errno == zmq.EAGAIN:
+                full.add(identity)
+            elif e.errno == zmq.EHOSTUNREACH:
+                self.forget(identity)
+            else:
+                raise
+            return False
+        credits = self.waiting.pop(identity)
+        self.sent[identity].append(time.perf_counter())
+        if credits > 1:
+            self.waiting[identity] = credits - 1
+        return True
+
+
+def dist_ps(*, shutdown, infd, endpoint, tracks, routes, policies, burst, stats):
     context = zmq.Context()
     collector = context.socket(zmq.PULL)
     collector.setsockopt(zmq.RCVHWM, DIST_HWM)
     collector.bind(infd)
-    distributor = context.socket(zmq.REP)
+    distributor = context.socket(zmq.ROUTER)
+    distributor.setsockopt(zmq.ROUTER_MANDATORY, 1)  # raise rather than drop frames
     distributor.bind(endpoint)
-    barrier.wait()
-    queues: dict[str, CircularList[RecvData]] = {
-        track: CircularList[RecvData]() for track in tracks
-    }
+    ctl = control(context, shutdown)
+    queues = {track: Track(policies.get(track, DIST_POLICY)) for track in tracks}
     try:
-        while not shutdown.is_set():
-            target = time.time() + DIST_TIMESTEP
-            if collector.poll(0):  # returns 0 if no event, something else if there is
-                data = intf.recv(socket=collector, buf=True, flags=zmq.NOBLOCK)
-                for fqueue in queues.values():  # add to every buf queue
-                    fqueue.push(data)
-            if distributor.poll(0):  # got frame req
-                track = distributor.recv().decode()
-                try:
-                    data = queues[track].pop()
-                except Empty:  # Regular frame miss
-                    data = RecvData(
-                        fno=FRAMEMISS,
-                        ftime=0.0,
-                        meta=None,
-                        buf=b"nil",
-                    )
-                except KeyError:  # Track miss
-                    data = RecvData(
-                        fno=TRACKMISS,
-                        ftime=0.0,
-                        meta=None,
-                        buf=b"nil",
-                    )
-                intf.send(
-                    socket=distributor,
-                    fno=data.fno,
-                    ftime=data.ftime,
-                    meta=data.meta,
-                    buf=data.buf,
-                    flags=zmq.NOBLOCK,
-                )
-            missing = target - time.time()
-            if missing > 0:
-                time.sleep(missing)
+        for events in serve(ctl, collector, distributor):
+            if collector in events:
+                for data in drain(collector, burst, stats, "distributor", buf=True, copy=False):
+                    for track, queue in queues.items():  # add to the queue of every track
+                        if routes.get(track, 0) == data.layer:  # on the layer of the frame
+                            queue.push(data)
+                            # before a burst can overflow the queue
+                            queue.dispatch(distributor)
+            if distributor in events:  # got frame requests
+                for _ in range(burst):
+                    try:
+                        identity, _, request, *credits = distributor.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    track = request.decode()
+                    if track not in queues:  # Track miss
+                        data = RecvData(fno=TRACKMISS, ftime=0.0, meta=None, buf=b"nil")
+                    elif credits:  # served as frames arrive
+                        queues[track].request(identity, *CREDITS.unpack(credits[0]))
+                        queues[track].dispatch(distributor)
+                        continue
+                    else:
+                        try:
+                            data = queues[track].take(identity)
+                        except Empty:  # Regular frame miss
+                            data = RecvData(fno=FRAMEMISS, ftime=0.0, meta=None, buf=b"nil")
+                    try:
+                        reply(distributor, identity, data)
+                    except zmq.ZMQError as e:  # dropped, the worker asks again
+                        if e.errno == zmq.EHOSTUNREACH and track in queues:
+                            queues[track].forget(identity)  # gone, stop sharding frames to it
     finally:
         # Clean up sockets and context
         with contextlib.suppress(Exception):
             collector.close(linger=0)
             distributor.close(linger=0)
+            ctl.close(linger=0)
             context.term()
 
 
 class DistributorDevice(Device):
-    def __init__(self, tracks, endpoint, seed):
+    def __init__(self, tracks, endpoint, seed, burst=BURST, routes=None, policies=None, warm=False):
         """Create a multiprocessing frame distributor device.
 
+        Serves frames to the workers of every track from a ROUTER socket, each frame to
+        one worker. A REQ worker asks for one frame at a time and is answered right away,
+        with FRAMEMISS if none is queued. A DEALER worker sends the track name followed
+        by CREDITS, the number of frames it can take, and is sent frames as soon as they
+        arrive until its credits run out, so that many workers can wait at once.
+
+        How the frames of a track are shared among its DEALER workers is the policy of
+        the track. "roundrobin" sends each frame to the next worker in turn. "broadcast"
+        sends every frame to every worker with credits. "leastloaded" sends each frame
+        to the worker that would be done with it first, by the frames it has not asked
+        to replace yet times its recent service time, so slow workers get fewer frames.
+        "shard" sends frame fno to worker fno % n of the n workers in order of arrival,
+        so a stateful worker gets the same subset as long as no worker comes or goes.
+        REQ workers always get the next frame queued for them.
+
         Args:
             tracks (list): List of strings, where each string describes a track.
             endpoint (str): Descriptor of distributor endpoint.
             seed (str): File descriptor seed (to prevent ipc collisions).
+            burst (int, optional): Maximum encoded frames queued, and requests handled,
+                per wakeup. Defaults to BURST.
+            routes (dict, optional): Simulcast layer to serve on each track. Tracks that
+                are left out get layer 0. Defaults to None, layer 0 on every track.
+            policies (dict, optional): Policy of each track, one of DIST_POLICIES. Tracks
+                that are left out get DIST_POLICY. Defaults to None.
+            warm (bool, optional): Keep the process alive when stopped, to start again
+                without spawning another, see Device. Defaults to False.
+
+        Raises:
+            ValueError: Raised if routes or policies name a track that is not in tracks,
+                or a policy is unknown.
         """
         self.infd = "ipc:///tmp/encout" + seed
         self.endpoint, self.tracks = endpoint, tracks
-        dkwargs = {"infd": self.infd, "endpoint": self.endpoint, "tracks": self.tracks}
-        super().__init__(dist_ps, dkwargs, 1)
+        self.routes = {} if routes is None else dict(routes)
+        self.policies = {} if policies is None else dict(policies)
+        unknown = set(self.routes) - set(tracks)
+        if unknown:
+            raise ValueError(f"Routes name unknown tracks: {sorted(unknown)}")
+        unknown = set(self.policies) - set(tracks)
+        if unknown:
+            raise ValueError(f"Policies name unknown tracks: {sorted(unknown)}")
+        for policy in self.policies.values():
+            if policy not in DIST_POLICIES:
+                raise ValueError(f"Policy must be one of {DIST_POLICIES}, got {policy!r}")
+        dkwargs = {
+            "infd": self.infd,
+            "endpoint": self.endpoint,
+            "tracks": self.tracks,
+            "routes": self.routes,
+            "policies": self.policies,
+        }
+        super().__init__(dist_ps, dkwargs, 1, burst, warm=warm)
 
     def __repr__(self):
         rpr = "-----DistributorDevice-----\n"
         rpr += f"{'TRACKS': <8}{self.tracks}\n"
+        if self.routes:
+            rpr += f"{'ROUTES': <8}{self.routes}\n"
+        if self.policies:
+            rpr += f"{'POLICY': <8}{self.policies}\n"
         rpr += f"{'IN': <8}{self.infd}\n"
         rpr += f"{'OUT': <8}{self.endpoint}\n"
         rpr += f"{'HWM': <8}({DIST_HWM} > XX)"
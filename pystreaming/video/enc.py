@@ -1,82 +1,280 @@
 import contextlib
 import time
-from functools import partial
 
 import numpy as np
 import zmq
-from turbojpeg import TJFLAG_FASTDCT, TJSAMP_420, TurboJPEG
 
 from ..stream import interface as intf
+from ..stream.interface import RecvData
+from ..stream.ring import FrameRing
+from ..stream.trace import STAGE_IDS, stamp
 from . import (
+    BACKEND,
+    BURST,
+    CODEC,
     ENC_HWM,
-    ENC_TIMESTEP,
-    QUALITY,
+    PIXEL_FORMAT,
+    PIXEL_FORMATS,
+    RING_SLOTS,
     STOPSTREAM,
     STOPSTREAM_DUMMY_FRAME_SIZE,
     STOPSTREAM_SLEEP_SECONDS,
 )
-from .device import Device
+from .codecs import CODECS, Codec, JpegCodec, TileCodec, lookup
+from .delta import TileDelta
+from .device import Device, control, drain, endpoint, serve
+from .layers import Layer, pyramid, validate
+from .rate import RateController
 
 
-def enc_ps(*, shutdown, barrier, infd, outfd):
-    context = zmq.Context()
+def encode(
+    data: RecvData,
+    codec: Codec,
+    rate: RateController,
+    layers: list[Layer] | None,
+    pixel_format: str,
+) -> list[bytes]:
+    """Encode the frame of a message at every simulcast layer, as every backend does.
+
+    Args:
+        data (RecvData): Message with the raw frame as arr, and any tile delta prefix as buf.
+        codec (Codec): Codec to encode with.
+        rate (RateController): Settings to encode with, told what the frame cost.
+        layers (list[Layer], optional): Simulcast layers, or None for the whole frame.
+        pixel_format (str): Layout of the frame, one of PIXEL_FORMATS.
+
+    Returns:
+        list[bytes]: Encoded frame of every layer, or nothing if the message has no frame.
+    """
+    bufs: list[bytes] = []
+    if data.arr is None:
+        return bufs
+    start = time.perf_counter()
+    frames = [data.arr] if layers is None else pyramid(data.arr, layers)
+    for layer, arr in enumerate(frames):
+        quality = None if layers is None else layers[layer].quality
+        if quality is None:
+            quality = rate.quality
+        if pixel_format == "bgr":
+            buf_data = codec.encode(arr, quality=quality, subsampling=rate.subsampling)
+        else:
+            assert isinstance(codec, JpegCodec)  # checked by EncoderDevice
+            buf_data = codec.encode_yuv(
+                arr,
+                quality=quality,
+                subsampling=rate.subsampling,
+                layout=pixel_format,
+            )
+        if data.buf is not None:  # a tile delta prefix
+            buf_data = bytes(data.buf) + buf_data
+        bufs.append(buf_data)
+    rate.record(time.perf_counter() - start, sum(map(len, bufs)))
+    return bufs
+
+
+def forward(
+    out: zmq.Socket,
+    data: RecvData,
+    bufs: list[bytes],
+    codec: Codec,
+    rate: RateController,
+) -> None:
+    """Send the encoded layers of a message on, dropping those the socket cannot take.
+
+    Args:
+        out (zmq.Socket): Socket to the publisher or distributor.
+        data (RecvData): Message the layers were encoded from.
+        bufs (list[bytes]): Encoded frame of every layer, see encode.
+        codec (Codec): Codec they were encoded with.
+        rate (RateController): Told about every layer dropped.
+    """
+    stamp(data, "encoder.out")
+    for layer, buf_data in enumerate(bufs):
+        try:
+            intf.send(
+                socket=out,
+                fno=data.fno,
+                ftime=data.ftime,
+                meta=data.meta,
+                buf=buf_data,
+                flags=zmq.NOBLOCK,
+                trace=data.trace,
+                codec=codec.id if data.buf is None else TileCodec.id,
+                layer=layer,
+            )
+        except zmq.Again:
+            rate.record_drop()
+
+
+def outlet(context: zmq.Context, outfd: str, layers: list[Layer] | None) -> zmq.Socket:
+    """Socket that encoded frames are sent on, connected to outfd."""
+    out = context.socket(zmq.PUSH)
+    # every layer of a frame is its own message
+    out.setsockopt(zmq.SNDHWM, ENC_HWM * (1 if layers is None else len(layers)))
+    out.connect(outfd)
+    return out
+
+
+def enc_ps(
+    *,
+    shutdown,
+    infd,
+    outfd,
+    ring,
+    rate,
+    codec,
+    layers,
+    pixel_format,
+    burst,
+    stats,
+    context=None,
+):
+    own = context is None  # threads share the context of the device, see Device
+    if own:
+        context = zmq.Context()
     socket = context.socket(zmq.PULL)
     socket.setsockopt(zmq.RCVHWM, ENC_HWM)
     socket.connect(infd)
-    out = context.socket(zmq.PUSH)
-    out.setsockopt(zmq.SNDHWM, ENC_HWM)
-    out.connect(outfd)
-    barrier.wait()
-    encoder = partial(
-        TurboJPEG().encode,
-        quality=QUALITY,
-        jpeg_subsample=TJSAMP_420,
-        flags=TJFLAG_FASTDCT,
-    )
+    out = outlet(context, outfd, layers)
+    ring = None if ring is None else FrameRing(ring)
+    ctl = control(context, shutdown)
+    codec = lookup(codec)
     try:
-        while not shutdown.is_set():
-            target = time.time() + ENC_TIMESTEP
-            if socket.poll(0):
-                data = intf.recv(socket=socket, arr=True, flags=zmq.NOBLOCK)
-                if data.arr is not None:
-                    buf_data = encoder(data.arr)
-                with contextlib.suppress(zmq.Again):
-                    intf.send(
-                        socket=out,
-                        fno=data.fno,
-                        ftime=data.ftime,
-                        meta=data.meta,
-                        buf=buf_data,
-                        flags=zmq.NOBLOCK,
-                    )
-            missing = target - time.time()
-            if missing > 0:
-                time.sleep(missing)
+        for _ in serve(ctl, socket):
+            for data in drain(
+                socket, burst, stats, "encoder", arr=True, buf=True, copy=False, ring=ring
+            ):
+                bufs = encode(data, codec, rate, layers, pixel_format)
+                if data.slot is not None:
+                    # the frame is compressed, hand its slot back to the producer
+                    assert ring is not None  # slots are only sent along with a ring
+                    data.arr = None
+                    ring.release(data.slot)
+                forward(out, data, bufs, codec, rate)
     finally:
         # Clean up sockets and context
         with contextlib.suppress(Exception):
             socket.close(linger=0)
             out.close(linger=0)
-            context.term()
+            ctl.close(linger=0)
+            if ring is not None:
+                ring.close()
+            if own:
+                context.term()
 
 
 class EncoderDevice(Device):
-    def __init__(self, nproc, seed):
+    def __init__(
+        self,
+        nproc,
+        seed,
+        burst=BURST,
+        shm=False,
+        slots=RING_SLOTS,
+        rate=None,
+        trace=False,
+        codec=CODEC,
+        delta=None,
+        layers=None,
+        pixel_format=PIXEL_FORMAT,
+        backend=BACKEND,
+        warm=False,
+    ):
         """Create a multiprocessing frame encoder device.
 
         Args:
             nproc (int): Number of encoding processes.
             seed (str): File descriptor seed (to prevent ipc collisions).
+            burst (int, optional): Maximum frames a process encodes per wakeup.
+                Defaults to BURST.
+            shm (bool, optional): Hand frames to the encoders through a shared memory
+                FrameRing, sending only the slot index over ipc. Defaults to False.
+            slots (int, optional): Number of frames the ring holds. Defaults to RING_SLOTS.
+            rate (RateController, optional): Adapts quality and frame rate to encoder load.
+                Defaults to None, which creates one with default settings.
+            trace (bool, optional): Stamp every frame as it passes each device on its way
+                to the receivers, see pystreaming.stream.trace. Defaults to False.
+            codec (str | Codec, optional): Name of a registered codec to encode frames
+                with, or the codec itself, see pystreaming.video.codecs. Encoder processes
+                and receivers find the codec by its id, so it must be registered. The rate
+                controller's quality settings only apply to lossy codecs. Defaults to CODEC.
+            delta (TileDelta, optional): Encode only the tiles that changed since the last
+                keyframe. Defaults to None, which encodes every frame whole.
+            layers (list[Layer], optional): Encode every frame at each of these scales,
+                largest first, and send each as its own simulcast layer. The layer number
+                is its index in the list. Defaults to None, a single layer 0 of full frames.
+            pixel_format (str, optional): Layout of the frames sent, one of PIXEL_FORMATS.
+                "i420" and "nv12" frames straight from a camera are JPEG encoded without a
+                pass through BGR, see JpegCodec.encode_yuv. Defaults to PIXEL_FORMAT.
+            backend (str, optional): Run the encoders in nproc processes, in nproc threads
+                of this process, or "inline" in send itself, see Device. Threads and inline
+                skip the hop to another process, which can cost more than encoding small
+                frames, and TurboJPEG releases the GIL while it encodes. Defaults to BACKEND.
+            warm (bool, optional): Keep the processes alive when stopped, to start again
+                without spawning any, see Device. Defaults to False.
+
+        Raises:
+            ValueError: Raised if the codec is not registered, layers are not valid, or
+                layers are combined with delta. Also raised for an unknown pixel_format,
+                or a YUV one with a codec other than JPEG, with layers or with delta, and
+                for an unknown backend, or shm with another backend than "process".
+            ImportError: Raised if a package the codec needs is missing.
         """
+        if shm and backend != "process":
+            raise ValueError("Shared memory frames are only for encoder processes")
         self.context = zmq.Context.instance()
-        self.infd = "ipc:///tmp/encin" + seed
+        self.infd = endpoint(backend, "encin", seed)
         self.outfd = "ipc:///tmp/encout" + seed
-        dkwargs = {"infd": self.infd, "outfd": self.outfd}
-        super().__init__(enc_ps, dkwargs, nproc)
+        # POSIX shared memory names are limited to 31 characters on macOS
+        self.ringname = "ps" + seed[:24] if shm else None
+        self.slots = slots
+        self.ring: FrameRing | None = None
+        self.rate = RateController() if rate is None else rate
+        self.trace = trace
+        self.codec: Codec = lookup(codec)
+        if type(CODECS.get(self.codec.id)) is not type(self.codec):
+            raise ValueError(f"Codec {self.codec.name!r} is not registered, see register")
+        self.codec.require()
+        self.delta: TileDelta | None = delta
+        self.layers: list[Layer] | None = None if layers is None else validate(layers)
+        if self.layers is not None and delta is not None:
+            raise ValueError("Tile delta encoding does not work with simulcast layers")
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"Pixel format must be one of {PIXEL_FORMATS}, got {pixel_format!r}")
+        if pixel_format != "bgr" and (
+            not isinstance(self.codec, JpegCodec) or layers is not None or delta is not None
+        ):
+            # layers and tiles would have to cut every plane on its own
+            raise ValueError(f"{pixel_format} frames can only be JPEG encoded whole")
+        self.pixel_format = pixel_format
+        dkwargs = {
+            "infd": self.infd,
+            "outfd": self.outfd,
+            "ring": self.ringname,
+            "rate": self.rate,
+            "codec": self.codec.id,
+            "layers": self.layers,
+            "pixel_format": self.pixel_format,
+        }
+        super().__init__(enc_ps, dkwargs, nproc, burst, backend, warm)
         self.idx = 0
-        self.sender = self.context.socket(zmq.PUSH)
-        self.sender.setsockopt(zmq.SNDHWM, ENC_HWM)
-        self.sender.bind(self.infd)
+        self.sender: zmq.Socket | None = self._connect()
+
+    def _connect(self) -> zmq.Socket:
+        """Socket that send hands frames to the encoders on."""
+        if self.backend == "inline":
+            # frames are encoded in send, and sent straight on
+            return outlet(self.context, self.outfd, self.layers)
+        sender = self.context.socket(zmq.PUSH)
+        sender.setsockopt(zmq.SNDHWM, ENC_HWM)
+        sender.bind(self.infd)
+        return sender
+
+    def start(self) -> None:
+        """Start the encoder device, again if it was stopped."""
+        if self.sender is None:
+            self.sender = self._connect()
+        super().start()
 
     def stop(self) -> None:
         """Stop the encoder device and clean up resources."""
@@ -85,49 +283,127 @@ class EncoderDevice(Device):
                 self.sender.close(linger=0)
             self.sender = None
         super().stop()
+        if self.ring is not None:
+            self.ring.unlink()
+            self.ring = None
 
     def send(self, frame: np.ndarray | None) -> None:
         """Send a frame to the encoder bank.
 
+        Frames are skipped or dropped, rather than queued, when the encoders cannot keep
+        up. See self.rate for the current settings and drop counts.
+
         Args:
             frame (np.ndarray | None): A frame of video. Send None to stop the stream.
 
         Raises:
-            RuntimeError: Raised if encoder processes cannot compress frame fast enough
+            RuntimeError: Raised if the device has been stopped.
         """
         if self.sender is None:
             raise RuntimeError("Encoder device has been stopped")
+        if frame is None:
+            # a frame the encoders can encode like any other
+            size = STOPSTREAM_DUMMY_FRAME_SIZE
+            shape = (size, size, 3) if self.pixel_format == "bgr" else (size * 3 // 2, size)
+            dummy = np.zeros(shape, dtype=np.uint8)
+            if self.backend == "inline":
+                self._encode(RecvData(meta=None, ftime=time.time(), fno=STOPSTREAM, arr=dummy))
+            else:
+                with contextlib.suppress(zmq.Again):
+                    intf.send(
+                        socket=self.sender,
+                        fno=STOPSTREAM,
+                        ftime=time.time(),
+                        meta=None,
+                        arr=dummy,
+                        flags=zmq.NOBLOCK,
+                    )
+            time.sleep(STOPSTREAM_SLEEP_SECONDS)
+            self.stop()
+            return
+        now = time.time()
+        if not self.rate.admit(now):
+            return
+        arr, head = frame, None
+        if self.delta is not None:
+            arr, head = self.delta.split(frame, self.idx, self.codec.id)
+        slot = None
         try:
-            if frame is None:
+            slot = self._write(arr)
+            trace = None
+            if self.trace:
+                trace = [(STAGE_IDS["send"], round((time.time() - now) * 1e6))]
+            if self.backend == "inline":
+                data = RecvData(meta=None, ftime=now, fno=self.idx, arr=arr, buf=head, trace=trace)
+                self._encode(data)
+            else:
                 intf.send(
                     socket=self.sender,
-                    fno=STOPSTREAM,
-                    ftime=time.time(),
+                    fno=self.idx,
+                    ftime=now,
+                    arr=arr,
+                    buf=head,
                     meta=None,
-                    arr=np.zeros((STOPSTREAM_DUMMY_FRAME_SIZE, STOPSTREAM_DUMMY_FRAME_SIZE, 3)),
                     flags=zmq.NOBLOCK,
+                    slot=slot,
+                    trace=trace,
                 )
-                time.sleep(STOPSTREAM_SLEEP_SECONDS)
-                self.stop()
-                return
-            intf.send(
-                socket=self.sender,
-                fno=self.idx,
-                ftime=time.time(),
-                arr=frame,
-                meta=None,
-                flags=zmq.NOBLOCK,
-            )
-            self.idx += 1
-        except zmq.Again as e:
-            raise RuntimeError(
-                "Worker processes are not processing frames fast enough. Decrease resolution or increase nproc."
-            ) from e
+        except zmq.Again:
+            if slot is not None:
+                assert self.ring is not None  # _write created it
+                self.ring.release(slot)
+            if self.delta is not None:
+                self.delta.drop()
+            self.rate.drop()
+            return
+        self.idx += 1
+
+    def _encode(self, data: RecvData) -> None:
+        """Encode a frame in the calling thread, the way enc_ps does, and send it on."""
+        assert self.sender is not None  # only called from send, which checks it
+        stamp(data, "encoder.in")
+        bufs = encode(data, self.codec, self.rate, self.layers, self.pixel_format)
+        forward(self.sender, data, bufs, self.codec, self.rate)
+
+    def _write(self, frame: np.ndarray) -> int | None:
+        """Copy a frame into a free ring slot, creating the ring on the first frame.
+
+        Args:
+            frame (np.ndarray): A frame of video.
+
+        Raises:
+            zmq.Again: Raised if every slot is still waiting to be encoded.
+
+        Returns:
+            int | None: The slot written to, or None to send the frame over ipc instead.
+        """
+        if self.ringname is None:
+            return None
+        if self.ring is None:
+            self.ring = FrameRing.create(self.ringname, self.slots, frame.nbytes)
+        if not self.ring.fits(frame.nbytes):
+            return None  # larger than the first frame, which sized the ring
+        slot = self.ring.acquire()
+        if slot is None:
+            raise zmq.Again()
+        self.ring.view(slot, frame.dtype, frame.shape)[...] = frame
+        return slot
 
     def __repr__(self):
         rpr = "-----EncoderDevice-----\n"
         rpr += f"{'PCS': <8}{self.nproc}\n"
+        if self.backend != "process":
+            rpr += f"{'BACKEND': <8}{self.backend}\n"
         rpr += f"{'IN': <8}{self.infd}\n"
         rpr += f"{'OUT': <8}{self.outfd}\n"
-        rpr += f"{'HWM': <8}({ENC_HWM} > {ENC_HWM})"
+        rpr += f"{'HWM': <8}({ENC_HWM} > {ENC_HWM})\n"
+        rpr += f"{'CODEC': <8}{self.codec.name}"
+        if self.pixel_format != "bgr":
+            rpr += f" from {self.pixel_format}"
+        if self.delta is not None:
+            rpr += f"\n{'DELTA': <8}{self.delta}"
+        if self.layers is not None:
+            rpr += f"\n{'LAYERS': <8}{[layer.scale for layer in self.layers]}"
+        if self.ringname is not None:
+            rpr += f"\n{'SHM': <8}{self.ringname} ({self.slots} slots)"
         return rpr
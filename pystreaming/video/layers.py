@@ -0,0 +1,94 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from . import LAYER_SCALES
+
+
+class Layer(NamedTuple):
+    """One resolution of a simulcast stream.
+
+    Args:
+        scale (float, optional): Size relative to the frames sent, one of LAYER_SCALES.
+            Defaults to 1.0.
+        quality (int, optional): JPEG quality of this layer. Defaults to None, which
+            follows the rate controller.
+    """
+
+    scale: float = 1.0
+    quality: int | None = None
+
+
+def validate(layers: list[Layer]) -> list[Layer]:
+    """Check that layers can be encoded from one frame, largest first.
+
+    Args:
+        layers (list[Layer]): Layers, their index in the list being their layer number.
+
+    Raises:
+        ValueError: Raised if there are no layers, a scale is not in LAYER_SCALES, or
+            the scales do not strictly decrease.
+
+    Returns:
+        list[Layer]: layers as Layer tuples.
+    """
+    layers = [Layer(*layer) for layer in layers]
+    if not layers:
+        raise ValueError("Simulcast needs at least one layer")
+    scales = [layer.scale for layer in layers]
+    for scale in scales:
+        if scale not in LAYER_SCALES:
+            raise ValueError(f"Layer scale must be one of {LAYER_SCALES}, got {scale}")
+    if any(a <= b for a, b in zip(scales, scales[1:], strict=False)):
+        raise ValueError(f"Layer scales must decrease from layer 0 on, got {scales}")
+    return layers
+
+
+def halve(arr: np.ndarray) -> np.ndarray:
+    """Downscale a frame to half its size, averaging blocks of 2 x 2 pixels.
+
+    An odd last row or column is dropped. Frames smaller than 2 x 2 are returned as is.
+
+    Args:
+        arr (np.ndarray): Frame of shape (height, width, ...).
+
+    Returns:
+        np.ndarray: Frame of shape (height // 2, width // 2, ...) and the same dtype.
+    """
+    h, w = arr.shape[0] // 2, arr.shape[1] // 2
+    if not h or not w:
+        return arr
+    rest = arr.shape[2:]
+    blocks = arr[: 2 * h, : 2 * w]
+    if arr.dtype == np.uint8:
+        # add pairs of rows, then pairs of columns, in uint16 where 4 x 255 fits. Adding
+        # strided views is several times faster than sum over a reshaped axis
+        rows = np.add(blocks[0::2], blocks[1::2], dtype=np.uint16).reshape(h, w, 2, -1)
+        out = np.add(rows[:, :, 0], rows[:, :, 1])
+        out += 2  # round to nearest
+        out >>= 2
+        return out.astype(np.uint8).reshape(h, w, *rest)
+    out = blocks.reshape(h, 2, w, 2, *rest).mean(axis=(1, 3))
+    if np.issubdtype(arr.dtype, np.integer):
+        out = np.rint(out)
+    return out.astype(arr.dtype)
+
+
+def pyramid(arr: np.ndarray, layers: list[Layer]) -> list[np.ndarray]:
+    """Downscale a frame to every layer, each from the next larger one.
+
+    Args:
+        arr (np.ndarray): Frame of video.
+        layers (list[Layer]): Validated layers, see validate.
+
+    Returns:
+        list[np.ndarray]: The frame of every layer. A layer of scale 1.0 is arr itself.
+    """
+    out = []
+    scale = 1.0
+    for layer in layers:
+        while scale > layer.scale:
+            arr = halve(arr)
+            scale /= 2
+        out.append(arr)
+    return out
@@ -1,14 +1,44 @@
 import contextlib
-import time
+from collections.abc import Generator, Iterable
 
 import zmq
 
 from ..stream import interface as intf
-from . import PUB_HWM, PUB_TIMESTEP
-from .device import Device
+from ..stream.interface import RecvData
+from ..stream.reorder import ReorderBuffer
+from ..stream.trace import stamp
+from . import BURST, PUB_HWM
+from .device import Device, control, drain, serve
 
 
-def pullpub_ps(*, shutdown, barrier, infd, outfd):
+def sequence(
+    orders: dict[int, ReorderBuffer], frames: Iterable[RecvData], latency: float
+) -> Generator[RecvData, None, None]:
+    """Reorder frames with one ReorderBuffer per simulcast layer, since layers share fnos.
+
+    Args:
+        orders (dict[int, ReorderBuffer]): Layer to its buffer, added to as layers appear.
+        frames (Iterable[RecvData]): Frames, such as those drained from a socket.
+        latency (float): Latency of new buffers, see ReorderBuffer.
+
+    Yields:
+        RecvData: Frames to hand on, in fno order within every layer.
+    """
+    for data in frames:
+        if data.layer not in orders:
+            orders[data.layer] = ReorderBuffer(latency)
+        yield from orders[data.layer].push(data)
+    for order in orders.values():
+        yield from order.expire()
+
+
+def timeout(orders: dict[int, ReorderBuffer]) -> int | None:
+    """Milliseconds until the next frame of any layer must be released, or None."""
+    waits = [wait for order in orders.values() if (wait := order.timeout()) is not None]
+    return min(waits, default=None)
+
+
+def pullpub_ps(*, shutdown, infd, outfd, reorder, burst, stats):
     context = zmq.Context()
     socket = context.socket(zmq.PULL)
     socket.setsockopt(zmq.RCVHWM, PUB_HWM)
@@ -16,12 +46,13 @@ def pullpub_ps(*, shutdown, barrier, infd, outfd):
     out = context.socket(zmq.PUB)
     out.setsockopt(zmq.SNDHWM, PUB_HWM)
     out.bind(outfd)
-    barrier.wait()
+    ctl = control(context, shutdown)
+    orders: dict[int, ReorderBuffer] = {}
     try:
-        while not shutdown.is_set():
-            target = time.time() + PUB_TIMESTEP
-            if socket.poll(0):
-                data = intf.recv(socket=socket, buf=True, flags=zmq.NOBLOCK)
+        for _ in serve(ctl, socket, timeout=None if reorder is None else lambda: timeout(orders)):
+            frames = drain(socket, burst, stats, "publisher", buf=True, copy=False)
+            for data in frames if reorder is None else sequence(orders, frames, reorder):
+                stamp(data, "publisher.out")
                 with contextlib.suppress(zmq.Again):
                     intf.send(
                         socket=out,
@@ -30,32 +61,42 @@ def pullpub_ps(*, shutdown, barrier, infd, outfd):
                         meta=data.meta,
                         buf=data.buf,
                         flags=zmq.NOBLOCK,
+                        trace=data.trace,
+                        codec=data.codec,
+                        layer=data.layer,
                     )
-            missing = target - time.time()
-            if missing > 0:
-                time.sleep(missing)  # loop takes at minimum TIMESTEP seconds
     finally:
         # Clean up sockets and context
         with contextlib.suppress(Exception):
             socket.close(linger=0)
             out.close(linger=0)
+            ctl.close(linger=0)
             context.term()
 
 
 class PublisherDevice(Device):
-    def __init__(self, endpoint, seed):
+    def __init__(self, endpoint, seed, burst=BURST, reorder=None, warm=False):
         """Create a publisher device.
 
-        Binds to a zmq PULL socket and republishes through a PUB socket.
+        Binds to a zmq PULL socket and republishes through a PUB socket. Subscribers
+        choose a simulcast layer by subscription, and the PUB socket only sends them the
+        messages of that layer, see interface.topic.
 
         Args:
             endpoint (str): Descriptor of stream publishing endpoint.
             seed (str): File descriptor seed (to prevent ipc collisions).
+            burst (int, optional): Maximum messages forwarded per wakeup. Defaults to BURST.
+            reorder (float, optional): Publish frames in fno order, holding each back for
+                at most this many seconds, see ReorderBuffer. Every simulcast layer is
+                reordered on its own. Defaults to None.
+            warm (bool, optional): Keep the process alive when stopped, to start again
+                without spawning another, see Device. Defaults to False.
         """
         self.infd = "ipc:///tmp/encout" + seed
         self.outfd = endpoint
-        dkwargs = {"infd": self.infd, "outfd": self.outfd}
-        super().__init__(pullpub_ps, dkwargs, 1)
+        self.reorder = reorder
+        dkwargs = {"infd": self.infd, "outfd": self.outfd, "reorder": reorder}
+        super().__init__(pullpub_ps, dkwargs, 1, burst, warm=warm)
 
     def __repr__(self):
         rpr = "-----PublisherDevice-----\n"
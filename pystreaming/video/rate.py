@@ -0,0 +1,183 @@
+import multiprocessing as mp
+import time
+
+from . import (
+    MAX_SKIP,
+    QUALITY,
+    QUALITY_MIN,
+    QUALITY_STEP,
+    RATE_HEADROOM,
+    RATE_INTERVAL,
+    RATE_SMOOTHING,
+)
+from .codecs import TJSAMP_420, TJSAMP_GRAY
+
+# Chroma subsampling, from lightest to heaviest. Gray drops color altogether.
+SUBSAMPLING = (TJSAMP_420, TJSAMP_GRAY)
+
+
+class RateController:
+    def __init__(
+        self,
+        quality: int = QUALITY,
+        bitrate: float | None = None,
+        latency: float | None = None,
+        floor: int = QUALITY_MIN,
+    ) -> None:
+        """Adapt JPEG quality, chroma subsampling and frame rate to encoder load.
+
+        The controller lives in the process that sends frames. Encoder processes read the
+        current settings from it and report what each frame cost through shared memory.
+        Every RATE_INTERVAL seconds it degrades one step if the encoders fell behind (a
+        frame was dropped because their queue or the one after them was full), if encoding
+        took longer than the latency budget, or if the output exceeded the target bitrate.
+        Once there is headroom again it recovers one step. Steps lower the quality first, then subsample
+        harder, then skip frames.
+
+        Args:
+            quality (int, optional): Highest quality, used while there is no pressure.
+                Defaults to QUALITY.
+            bitrate (float, optional): Target output in bits per second. Defaults to None.
+            latency (float, optional): Budget in seconds to encode one frame.
+                Defaults to None.
+            floor (int, optional): Lowest quality. Defaults to QUALITY_MIN.
+
+        Raises:
+            ValueError: Raised if floor and quality are not an ascending range in (0, 100].
+        """
+        if not 0 < floor <= quality <= 100:
+            raise ValueError(f"Quality range [{floor}, {quality}] is not within (0, 100]")
+        self.bitrate_target = bitrate
+        self.latency_budget = latency
+        qualities = list(range(quality, floor, -QUALITY_STEP)) + [floor]
+        # (quality, subsampling index, frames skipped per encoded frame), lightest first
+        self.levels = (
+            [(q, 0, 0) for q in qualities]
+            + [(floor, s, 0) for s in range(1, len(SUBSAMPLING))]
+            + [(floor, len(SUBSAMPLING) - 1, k) for k in range(1, MAX_SKIP + 1)]
+        )
+        self.level = 0
+        # Settings read by encoder processes, written only by the sender
+        self.settings = mp.RawArray("i", [quality, SUBSAMPLING[0]])
+        # Moving averages of encode seconds and output bytes per frame, and the number of
+        # layers dropped at the encoder outlet since the last update, written by encoders
+        self.costs = mp.Array("d", 3)
+        self.frames = self.dropped = self.skipped = 0
+        self.period = 0.0
+        self.pressure = False
+        self.last: float | None = None
+        self.updated: float | None = None
+
+    @property
+    def quality(self) -> int:
+        """Current JPEG quality."""
+        return self.settings[0]
+
+    @property
+    def subsampling(self) -> int:
+        """Current TurboJPEG chroma subsampling (TJSAMP_*)."""
+        return self.settings[1]
+
+    @property
+    def skip(self) -> int:
+        """Number of frames currently skipped for every frame encoded."""
+        return self.levels[self.level][2]
+
+    @property
+    def encode_time(self) -> float:
+        """Moving average of seconds spent encoding one frame."""
+        return self.costs[0]
+
+    @property
+    def bitrate(self) -> float:
+        """Estimated output in bits per second."""
+        if not self.period:
+            return 0.0
+        return self.costs[1] * 8 / (self.period * (self.skip + 1))
+
+    def record(self, seconds: float, nbytes: int) -> None:
+        """Report the cost of one encoded frame. Called from encoder processes.
+
+        Args:
+            seconds (float): Time spent encoding.
+            nbytes (int): Size of the compressed frame.
+        """
+        with self.costs.get_lock():
+            if self.costs[1]:
+                self.costs[0] += RATE_SMOOTHING * (seconds - self.costs[0])
+                self.costs[1] += RATE_SMOOTHING * (nbytes - self.costs[1])
+            else:
+                self.costs[0], self.costs[1] = seconds, nbytes
+
+    def record_drop(self) -> None:
+        """Report a layer dropped because the socket after the encoder was full. Called
+        from encoder processes.
+        """
+        with self.costs.get_lock():
+            self.costs[2] += 1
+
+    def admit(self, now: float | None = None) -> bool:
+        """Decide whether to encode the next frame, adjusting settings when due.
+
+        Args:
+            now (float, optional): Current time. Defaults to None, which is time.time().
+
+        Returns:
+            bool: False if the frame should be skipped to shed load.
+        """
+        now = time.time() if now is None else now
+        if self.last is not None:
+            interval = now - self.last
+            self.period += RATE_SMOOTHING * (interval - self.period) if self.period else interval
+        self.last = now
+        if self.updated is None:
+            self.updated = now
+        elif now - self.updated >= RATE_INTERVAL:
+            self._update()
+            self.updated = now
+        self.frames += 1
+        if self.frames % (self.skip + 1):
+            self.skipped += 1
+            return False
+        return True
+
+    def drop(self) -> None:
+        """Report a frame that was admitted but dropped because the encoders were busy."""
+        self.dropped += 1
+        self.pressure = True
+
+    def _update(self) -> None:
+        with self.costs.get_lock():
+            if self.costs[2]:
+                self.dropped += int(self.costs[2])
+                self.costs[2] = 0
+                self.pressure = True
+        encode, bitrate = self.encode_time, self.bitrate
+        latency, target = self.latency_budget, self.bitrate_target
+        if (
+            self.pressure
+            or (latency is not None and encode > latency)
+            or (target is not None and bitrate > target)
+        ):
+            self._set(self.level + 1)
+        elif (latency is None or encode < latency * RATE_HEADROOM) and (
+            target is None or bitrate < target * RATE_HEADROOM
+        ):
+            self._set(self.level - 1)
+        self.pressure = False
+
+    def _set(self, level: int) -> None:
+        self.level = min(max(level, 0), len(self.levels) - 1)
+        quality, subsampling, _ = self.levels[self.level]
+        self.settings[0], self.settings[1] = quality, SUBSAMPLING[subsampling]
+
+    def __repr__(self):
+        rpr = "-----RateController-----\n"
+        rpr += f"{'QUALITY': <10}{self.quality}\n"
+        rpr += f"{'SUBSAMP': <10}{self.subsampling}\n"
+        rpr += f"{'SKIP': <10}{self.skip}\n"
+        rpr += f"{'DROPPED': <10}{self.dropped}\n"
+        rpr += f"{'SKIPPED': <10}{self.skipped}\n"
+        rpr += f"{'ENCODE': <10}{self.encode_time * 1e3:.2f} ms\n"
+        rpr += f"{'BITRATE': <10}{self.bitrate / 1e6:.2f} Mbps"
+        return rpr
@@ -1,24 +1,22 @@
 import asyncio
 import contextlib
-from multiprocessing.synchronize import Barrier, Event
 
 import zmq
 import zmq.asyncio
 
+from ..stream import interface as intf
 from . import (
-    ASYNC_STOP_SLEEP_SECONDS,
     FRAMEMISS,
     REQ_HWM,
-    REQ_TIMESTEP,
+    REQ_PREFETCH,
     STOPSTREAM,
     TRACKMISS,
 )
-from .device import Device
+from .device import Device, control
+from .dist import CREDITS
 
 """Stop on STOPSTREAM, or TRACKMISS
-Continue on FRAMEMISS
-Wait at most TIMEOUT for receiving a response?
-    have to use async poll for this behavior
+Skip FRAMEMISS, which a distributor only sends to requesters without credits
 """
 
 
@@ -27,57 +25,49 @@ async def aioreq(
     source: str,
     track: str,
     drain: zmq.asyncio.Socket,
-    lock: asyncio.Lock,
+    prefetch: int,
 ) -> None:
-    socket = context.socket(zmq.REQ)
+    socket = context.socket(zmq.DEALER)
     socket.connect(source)
     track_bytes = bytes(track, "utf-8")
+    # keep prefetch frames in flight, and ask for one more as each is handed on
+    await socket.send_multipart([b"", track_bytes, CREDITS.pack(prefetch)])
     while True:
-        await asyncio.sleep(REQ_TIMESTEP)
-        await socket.send(track_bytes)
-        buf = await socket.recv()
-        meta = await socket.recv_pyobj()
-        ftime = await socket.recv_pyobj()
-        fno = await socket.recv_pyobj()
+        _, *frames = await socket.recv_multipart(copy=False)
+        fno = intf.unpack(frames, arr=False, buf=False).fno
         if fno == STOPSTREAM:
             raise StopAsyncIteration("Stop stream signal received. Exiting.")
-        if fno == FRAMEMISS:
-            continue  # throw away if no frame available
         if fno == TRACKMISS:
             raise StopAsyncIteration(f'Track "{track}" was not recognized. Exiting.')
-        with contextlib.suppress(zmq.Again):
-            async with lock:
-                await drain.send(buf, copy=False, flags=zmq.SNDMORE | zmq.NOBLOCK)
-                await drain.send_pyobj(meta, flags=zmq.SNDMORE | zmq.NOBLOCK)
-                await drain.send_pyobj(ftime, flags=zmq.SNDMORE | zmq.NOBLOCK)
-                await drain.send_pyobj(fno, flags=zmq.NOBLOCK)
+        if fno != FRAMEMISS:
+            # blocks while the decoders are full, so they set the pace of requests
+            await drain.send_multipart(frames, copy=False)
+        await socket.send_multipart([b"", track_bytes, CREDITS.pack(1)])
 
 
-async def stop(shutdown: Event) -> None:
-    while True:
-        await asyncio.sleep(ASYNC_STOP_SLEEP_SECONDS)
-        if shutdown.is_set():
-            raise StopAsyncIteration()
+async def stop(ctl: zmq.asyncio.Socket) -> None:
+    await ctl.recv()
+    raise StopAsyncIteration()
 
 
 def aiomain(
     *,
-    shutdown: Event,
-    barrier: Barrier,
+    shutdown: str,
     source: str,
     outfd: str,
     track: str,
     nthread: int,
+    prefetch: int,
 ) -> None:
     context = zmq.asyncio.Context()
     drain = context.socket(zmq.PUSH)
     drain.setsockopt(zmq.SNDHWM, REQ_HWM)
     drain.bind(outfd)
-    lock = asyncio.Lock()
-    args = [aioreq(context, source, track, drain, lock) for _ in range(nthread)]
-    args.append(stop(shutdown))
-    loop = asyncio.get_event_loop()
-    barrier.wait()
+    args = [aioreq(context, source, track, drain, prefetch) for _ in range(nthread)]
+    args.append(stop(control(context, shutdown)))
+    # a fresh loop, as a process forked from a running event loop inherits it as running
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     try:
         loop.run_until_complete(asyncio.gather(*args))
     except StopAsyncIteration:
@@ -91,28 +81,44 @@ def aiomain(
 
 
 class RequesterDevice(Device):
-    def __init__(self, source, track, nthread, seed):
+    def __init__(self, source, track, nthread, seed, prefetch=REQ_PREFETCH, warm=False):
         """Create a asyncio frame requester device.
 
+        Every requester thread keeps prefetch frames requested ahead from the
+        distributor, which sends them as soon as they arrive, and asks for the next one
+        as each is handed to the decoders. Requests are paced by the decoders alone.
+
         Args:
             source (str): Descriptor of stream endpoint.
             track (str): Video stream track name.
             nthread (int): Number of requester threads.
             seed (str): File descriptor seed (to prevent ipc collisions).
+            prefetch (int, optional): Frames in flight per requester thread.
+                Defaults to REQ_PREFETCH.
+            warm (bool, optional): Keep the process alive when stopped, to start again
+                without spawning another, see Device. Defaults to False.
+
+        Raises:
+            ValueError: Raised if prefetch is not positive.
         """
+        if prefetch <= 0:
+            raise ValueError(f"Prefetch must be positive, got {prefetch}")
         self.outfd = "ipc:///tmp/decin" + seed
         self.source, self.nthread, self.track = source, nthread, track
+        self.prefetch = prefetch
         dkwargs = {
             "source": self.source,
             "outfd": self.outfd,
             "track": self.track,
             "nthread": self.nthread,
+            "prefetch": self.prefetch,
         }
-        super().__init__(aiomain, dkwargs, 1)
+        super().__init__(aiomain, dkwargs, 1, warm=warm)
 
     def __repr__(self):
         rpr = "-----RequesterDevice-----\n"
         rpr += f"{'THDS': <8}{self.nthread}\n"
+        rpr += f"{'PREFETCH': <8}{self.prefetch}\n"
         rpr += f"{'TRACK': <8}{self.track}\n"
         rpr += f"{'IN': <8}{self.source}\n"
         rpr += f"{'OUT': <8}{self.outfd}\n"
@@ -1,28 +1,27 @@
 import contextlib
-import time
 
 import zmq
 
 from ..stream import interface as intf
-from . import SUB_HWM, SUB_TIMESTEP
-from .device import Device
+from ..stream.trace import stamp
+from . import BURST, SUB_HWM
+from .device import Device, control, drain, serve
 
 
-def subpush_ps(*, shutdown, barrier, infd, outfd):
+def subpush_ps(*, shutdown, infd, outfd, layer, burst, stats):
     context = zmq.Context()
     socket = context.socket(zmq.SUB)
     socket.setsockopt(zmq.RCVHWM, SUB_HWM)
     socket.connect(infd)
-    socket.subscribe("")  # subscribe to all topics
+    socket.subscribe(intf.topic(layer))
     out = context.socket(zmq.PUSH)
     out.setsockopt(zmq.SNDHWM, SUB_HWM)
     out.bind(outfd)
-    barrier.wait()
+    ctl = control(context, shutdown)
     try:
-        while not shutdown.is_set():
-            target = time.time() + SUB_TIMESTEP
-            if socket.poll(0):
-                data = intf.recv(socket=socket, buf=True, flags=zmq.NOBLOCK)
+        for _ in serve(ctl, socket):
+            for data in drain(socket, burst, stats, "subscriber", buf=True, copy=False):
+                stamp(data, "subscriber.out")
                 with contextlib.suppress(zmq.Again):
                     intf.send(
                         socket=out,
@@ -31,20 +30,21 @@ def subpush_ps(*, shutdown, barrier, infd, outfd):
                         meta=data.meta,
                         buf=data.buf,
                         flags=zmq.NOBLOCK,
+                        trace=data.trace,
+                        codec=data.codec,
+                        layer=data.layer,
                     )
-            missing = target - time.time()
-            if missing > 0:
-                time.sleep(missing)  # loop takes at minimum TIMESTEP seconds
     finally:
         # Clean up sockets and context
         with contextlib.suppress(Exception):
             socket.close(linger=0)
             out.close(linger=0)
+            ctl.close(linger=0)
             context.term()
 
 
 class SubscriberDevice(Device):
-    def __init__(self, endpoint, seed):
+    def __init__(self, endpoint, seed, burst=BURST, layer=0, warm=False):
         """Create a multiprocessing subscriber.
 
         Connects to a zmq SUB socket and republishes through a PUSH socket.
@@ -52,15 +52,23 @@ class SubscriberDevice(Device):
         Args:
             endpoint (str): Descriptor of stream publishing endpoint.
             seed (str, optional): File descriptor seed (to prevent ipc collisions). Defaults to "".
+            burst (int, optional): Maximum messages forwarded per wakeup. Defaults to BURST.
+            layer (int, optional): Simulcast layer to subscribe to. The publisher only
+                sends this layer, see interface.topic. Defaults to 0, the largest layer or
+                the only one.
+            warm (bool, optional): Keep the process alive when stopped, to start again
+                without spawning another, see Device. Defaults to False.
         """
         self.infd = endpoint
         self.outfd = "ipc:///tmp/decin" + seed
-        dkwargs = {"infd": self.infd, "outfd": self.outfd}
-        super().__init__(subpush_ps, dkwargs, 1)
+        self.layer = layer
+        dkwargs = {"infd": self.infd, "outfd": self.outfd, "layer": self.layer}
+        super().__init__(subpush_ps, dkwargs, 1, burst, warm=warm)
 
     def __repr__(self):
         rpr = "-----SubscriberDevice-----\n"
         rpr += f"{'IN': <8}{self.infd}\n"
         rpr += f"{'OUT': <8}{self.outfd}\n"
+        rpr += f"{'LAYER': <8}{self.layer}\n"
         rpr += f"{'HWM': <8}({SUB_HWM} > {SUB_HWM})"
         return rpr
@@ -1,3 +1,5 @@
+import functools
+
 TEST_S: int = 0
 TEST_M: int = 1
 TEST_L: int = 2
@@ -42,3 +44,39 @@ def loadimage(enum: int):  # type: ignore[return]  # PIL.Image not easily typed
         return Image.open(truepath)
     except IndexError as e:
         raise IndexError(f"Unrecognized image option: {enum}") from e
+
+
+@functools.cache
+def encodecard(
+    enum: int, angles: tuple[int, ...] = (0,), quality: int | None = None, scale: float = 1.0
+) -> tuple[bytes, ...]:
+    """JPEG encode a test image or a test card, once per process.
+
+    Args:
+        enum (int): One of the test images, see loadimage.
+        angles (tuple[int, ...], optional): Rotations in degrees to encode the image at.
+            Defaults to (0,).
+        quality (int, optional): JPEG quality. Defaults to None, which is QUALITY.
+        scale (float, optional): Size to encode the image at, as a simulcast layer of
+            that scale would, see Layer. Defaults to 1.0.
+
+    Raises:
+        IndexError: Raised when received enum is not defined.
+
+    Returns:
+        tuple[bytes, ...]: One JPEG per angle, of the image in BGR like any camera frame.
+    """
+    import numpy as np
+
+    from .. import QUALITY
+    from ..codecs import lookup
+    from ..layers import Layer, pyramid
+
+    image = loadimage(enum).convert("RGB")
+    jpeg = lookup("jpeg")
+    quality = QUALITY if quality is None else quality
+    frames = (np.asarray(image.rotate(angle))[:, :, ::-1] for angle in angles)
+    return tuple(
+        jpeg.encode(np.ascontiguousarray(pyramid(arr, [Layer(scale)])[0]), quality)
+        for arr in frames
+    )
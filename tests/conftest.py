@@ -0,0 +1,33 @@
+import time
+
+import numpy as np
+
+FRAME = np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+def first(streamer, receiver, frame=FRAME, deadline=10):
+    """Send frames until the receiver gets one, and return it."""
+    end = time.time() + deadline
+    while time.time() < end:
+        streamer.send(frame)
+        try:
+            data = receiver.recv(timeout=50)
+        except TimeoutError:
+            continue
+        if data.fno >= 0:
+            return data
+    raise TimeoutError("No frame arrived")
+
+
+async def afirst(streamer, receiver, frame=FRAME, deadline=10):
+    """Same as first, for an AsyncStreamer and AsyncReceiver."""
+    end = time.time() + deadline
+    while time.time() < end:
+        await streamer.send(frame)
+        try:
+            data = await receiver.recv(timeout=50)
+        except TimeoutError:
+            continue
+        if data.fno >= 0:
+            return data
+    raise TimeoutError("No frame arrived")
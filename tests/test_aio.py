@@ -0,0 +1,111 @@
+import asyncio
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+import pystreaming as ps
+from tests.conftest import afirst
+
+FRAME = np.full((48, 64, 3), 128, dtype=np.uint8)
+
+
+def test_streams_on_one_loop():
+    async def stream():
+        endpoint = "ipc:///tmp/testaio" + uuid.uuid1().hex
+        async with (
+            ps.AsyncStreamer(endpoint, nproc=1) as streamer,
+            ps.AsyncReceiver(endpoint, nproc=1) as receiver,
+        ):
+            return await afirst(streamer, receiver, FRAME)
+
+    async def main():
+        return await asyncio.gather(*[stream() for _ in range(3)])
+
+    for data in asyncio.run(main()):
+        assert data.arr.shape == FRAME.shape
+
+
+def test_cancel_and_stop():
+    endpoint = "ipc:///tmp/testaio" + uuid.uuid1().hex
+
+    async def main():
+        async with (
+            ps.AsyncStreamer(endpoint, nproc=1) as streamer,
+            ps.AsyncReceiver(endpoint, nproc=1) as receiver,
+        ):
+            waiting = asyncio.ensure_future(receiver.recv())
+            await asyncio.sleep(0.1)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            await afirst(streamer, receiver, FRAME)  # still receives after a cancelled recv
+
+            async def collect():
+                return [data async for data in receiver]
+
+            frames = asyncio.ensure_future(collect())
+            await asyncio.sleep(0.1)
+        assert isinstance(await asyncio.wait_for(frames, 5), list)  # ended by stopping
+        with pytest.raises(RuntimeError):
+            await receiver.recv()
+        with pytest.raises(RuntimeError):
+            await streamer.send(FRAME)
+
+    asyncio.run(main())
+
+
+def test_worker():
+    source = "ipc:///tmp/testaio" + uuid.uuid1().hex
+    drain = "ipc:///tmp/testaio" + uuid.uuid1().hex
+
+    async def main():
+        async with (
+            ps.AsyncStreamer(source, nproc=1, mapreduce=True) as streamer,
+            ps.AsyncWorker(source, drain, reqthread=1, decproc=1) as worker,
+            ps.AsyncReceiver(drain, nproc=1, mapreduce=True) as receiver,
+        ):
+            end = time.time() + 10
+            while time.time() < end:
+                await streamer.send(FRAME)
+                try:
+                    data = await worker.recv(timeout=50)
+                except TimeoutError:
+                    continue
+                if data.fno < 0:
+                    continue
+                data.meta = b"seen"
+                await worker.send(data)
+                try:
+                    return await receiver.recv(timeout=1000)
+                except TimeoutError:
+                    continue
+
+    data = asyncio.run(main())
+    assert data.meta == b"seen"
+    assert data.arr.shape == FRAME.shape
+
+
+def test_audio():
+    endpoint = "ipc:///tmp/testaio" + uuid.uuid1().hex
+
+    async def main():
+        streamer = ps.AudioStreamer(endpoint)
+        receiver = ps.AsyncAudioReceiver(endpoint)
+        try:
+            with pytest.raises(TimeoutError):
+                await receiver.recv(timeout=50)
+            end = time.time() + 10
+            while time.time() < end:
+                streamer.send(np.arange(16, dtype=np.float32))
+                try:
+                    return await receiver.recv(timeout=50)
+                except TimeoutError:
+                    continue
+        finally:
+            receiver.close()
+            streamer.close()
+
+    data = asyncio.run(main())
+    assert np.array_equal(data.arr, np.arange(16, dtype=np.float32))
@@ -0,0 +1,57 @@
+import threading
+import uuid
+
+import numpy as np
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.video import codecs
+from tests.conftest import first
+
+FRAME = np.arange(48 * 64 * 3, dtype=np.uint8).reshape(48, 64, 3)
+
+
+@pytest.mark.parametrize(
+    "encoder, decoder", [("thread", "thread"), ("inline", "inline"), ("process", "inline")]
+)
+def test_stream(encoder, decoder):
+    endpoint = "ipc:///tmp/testbackends" + uuid.uuid1().hex
+    with (
+        ps.Streamer(endpoint, codec="zlib", trace=True, backend=encoder) as streamer,
+        ps.Receiver(endpoint, backend=decoder) as receiver,
+    ):
+        data = first(streamer, receiver, FRAME)
+    assert np.array_equal(data.arr, FRAME)
+    assert {"encoder.in", "encoder.out", "decoder.in", "decoder.out"} <= receiver.latency().keys()
+
+
+def test_threads():
+    seed = uuid.uuid1().hex
+    dec = ps.DecoderDevice(2, seed, backend="thread")
+    assert dec.outfd.startswith("inproc://")
+    source = zmq.Context.instance().socket(zmq.PUSH)
+    source.bind(dec.infd)
+    zlib = codecs.lookup("zlib")
+    before = threading.active_count()
+    dec.start()
+    try:
+        assert threading.active_count() == before + 2
+        intf.send(socket=source, fno=7, ftime=0.0, meta=None, buf=zlib.encode(FRAME), codec=zlib.id)
+        data = dec.recv(timeout=5000)
+        assert data.fno == 7
+        assert np.array_equal(data.arr, FRAME)
+    finally:
+        source.close(linger=0)
+        dec.stop()
+    assert threading.active_count() == before
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        ps.EncoderDevice(1, uuid.uuid1().hex, backend="fibers")
+    with pytest.raises(ValueError):
+        ps.EncoderDevice(1, uuid.uuid1().hex, shm=True, backend="thread")
+    with pytest.raises(ValueError):
+        ps.DecoderDevice(1, uuid.uuid1().hex, shm=True, backend="inline")
@@ -0,0 +1,94 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+import pystreaming as ps
+from pystreaming.stream.interface import RecvData
+from pystreaming.video import STOPSTREAM
+
+
+class Frames:
+    """A source of frames that are due at given times after it was created."""
+
+    def __init__(self, frames):
+        self.frames = list(frames)  # (seconds after start, RecvData)
+        self.start = time.time()
+
+    def recv(self, timeout):
+        if not self.frames:
+            time.sleep(timeout / 1000)
+            raise TimeoutError
+        wait = self.start + self.frames[0][0] - time.time()
+        if timeout is not None and wait > timeout / 1000:
+            time.sleep(timeout / 1000)
+            raise TimeoutError
+        time.sleep(max(wait, 0))
+        return self.frames.pop(0)[1]
+
+
+def frame(fno, shape=(4, 6, 3), at=0.0):
+    arr = np.full(shape, max(fno, 0), dtype=np.uint8)
+    return at, RecvData(meta=fno, ftime=float(fno), fno=fno, arr=arr)
+
+
+def test_size_and_latency():
+    source = Frames([frame(i) for i in range(5)] + [frame(5, at=0.2)])
+    batcher = ps.Batcher(source, size=3, latency=0.05)
+    first = batcher.recv()
+    assert first.arr.shape == (3, 4, 6, 3)
+    assert first.fno.tolist() == [0, 1, 2]
+    assert first.ftime.tolist() == [0.0, 1.0, 2.0]
+    assert first.meta == [0, 1, 2]
+    assert np.array_equal(first.arr[:, 0, 0, 0], [0, 1, 2])
+    assert first.frames[1].arr.base is first.arr.base  # rows of the batch
+    second = batcher.recv()  # frame 5 comes too late to join
+    assert second.fno.tolist() == [3, 4]
+    assert batcher.recv().fno.tolist() == [5]
+    with pytest.raises(TimeoutError):
+        batcher.recv(timeout=10)
+    assert batcher.fill == 6 / 9
+
+
+def test_buffers_are_reused():
+    source = Frames([frame(i) for i in range(6)] + [frame(6, shape=(2, 2, 3))])
+    batcher = ps.Batcher(source, size=2, buffers=2)
+    bases = [batcher.recv().arr.base for _ in range(3)]
+    assert bases[0] is bases[2] and bases[0] is not bases[1]
+    assert batcher.recv().arr.shape == (1, 2, 2, 3)  # another shape, another buffer
+
+
+def test_shape_change_and_stop():
+    frames = [frame(0), frame(1, shape=(2, 2)), frame(STOPSTREAM), frame(2)]
+    batcher = ps.Batcher(Frames(frames), size=4, latency=0.05)
+    assert [batch.fno.tolist() for batch in batcher.handler(100)] == [[0], [1]]
+    assert batcher.stopped
+
+    with pytest.raises(ValueError):
+        ps.Batcher(Frames([]), size=0)
+    with pytest.raises(ValueError):
+        ps.Batcher(Frames([]), buffers=0)
+
+
+def test_stream_batches():
+    endpoint = "ipc:///tmp/testbatch" + uuid.uuid1().hex
+    sent = np.full((48, 64, 3), 128, dtype=np.uint8)
+    with ps.Streamer(endpoint, codec="zlib") as streamer, ps.Receiver(endpoint) as receiver:
+        batcher = ps.Batcher(receiver, size=4, latency=0.05)
+        deadline = time.time() + 10
+        batch = None
+        while time.time() < deadline:
+            for _ in range(4):
+                streamer.send(sent)
+                time.sleep(0.005)
+            try:
+                batch = batcher.recv(timeout=50)
+            except TimeoutError:
+                continue
+            if len(batch.fno) > 1:
+                break
+    assert batch is not None
+    assert batch.arr.shape[1:] == sent.shape
+    assert np.array_equal(batch.arr[0], sent)
+    assert len(set(batch.fno.tolist())) == len(batch.fno)
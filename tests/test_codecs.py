@@ -0,0 +1,201 @@
+import importlib.util
+import time
+import uuid
+
+import numpy as np
+import pytest
+from turbojpeg import TJSAMP_GRAY
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.video import codecs
+
+rng = np.random.default_rng(0)
+FRAMES = {
+    "bgr": rng.integers(0, 255, (48, 64, 3), dtype=np.uint8),
+    "depth": rng.integers(0, 5000, (48, 64), dtype=np.uint16),
+    "thermal": rng.normal(30, 2, (48, 64)).astype(np.float32),
+}
+LOSSLESS = {
+    "raw": set(FRAMES),
+    "zlib": set(FRAMES),
+    "lz4": set(FRAMES),
+    "zstd": set(FRAMES),
+    "png": {"bgr", "depth"},
+}
+
+
+@pytest.mark.parametrize("name", list(LOSSLESS))
+def test_lossless_roundtrip(name):
+    codec = codecs.lookup(name)
+    try:
+        codec.require()
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+    for kind, frame in FRAMES.items():
+        if kind in LOSSLESS[name]:
+            out = codec.decode(codec.encode(frame))
+            assert out.dtype == frame.dtype
+            assert np.array_equal(out, frame)
+        else:
+            with pytest.raises(ValueError):
+                codec.encode(frame)
+
+
+def test_jpeg():
+    codec = codecs.lookup("jpeg")
+    frame = np.full((48, 64, 3), 128, dtype=np.uint8)
+    out = codec.decode(codec.encode(frame))
+    assert out.shape == frame.shape
+    assert np.abs(out.astype(int) - 128).max() < 4
+    with pytest.raises(ValueError):
+        codec.encode(FRAMES["depth"])
+
+
+def test_registry():
+    assert codecs.lookup(codecs.JpegCodec.id) is codecs.lookup("jpeg")
+    with pytest.raises(ValueError):
+        codecs.lookup("nope")
+    with pytest.raises(ValueError):
+        codecs.register(codecs.RawCodec())  # id and name taken
+
+    class Unregistered(codecs.RawCodec):
+        id = 200
+        name = "unregistered"
+
+    with pytest.raises(ValueError):  # encoder processes would not find it
+        ps.EncoderDevice(1, uuid.uuid1().hex, codec=Unregistered())
+
+    parts = intf.pack(fno=0, ftime=0.0, meta=None, buf=b"x", codec=codecs.ZlibCodec.id)
+    assert intf.unpack(parts).codec == codecs.ZlibCodec.id
+    assert intf.unpack(intf.pack(fno=0, ftime=0.0, meta=None, buf=b"x")).codec is None
+
+
+@pytest.mark.skipif(importlib.util.find_spec("lz4") is not None, reason="lz4 is installed")
+def test_missing_package():
+    with pytest.raises(ImportError):
+        ps.EncoderDevice(1, uuid.uuid1().hex, codec="lz4")
+
+
+def test_stream_depth():
+    endpoint = "ipc:///tmp/testcodecs" + uuid.uuid1().hex
+    frame = FRAMES["depth"]
+    with ps.Streamer(endpoint, codec="zlib") as streamer, ps.Receiver(endpoint) as receiver:
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            streamer.send(frame)
+            try:
+                data = receiver.recv(timeout=50)
+            except TimeoutError:
+                continue
+            if data.fno >= 0:
+                break
+    assert data.arr is not None
+    assert data.arr.dtype == np.uint16
+    assert np.array_equal(data.arr, frame)
+
+
+def test_decode_profile():
+    codec = codecs.lookup("jpeg")
+    buf = codec.encode(FRAMES["bgr"])
+    assert codec.decode(buf, ps.DecodeProfile()).shape == (48, 64, 3)
+    assert codec.decode(buf, ps.DecodeProfile(0.5)).shape == (24, 32, 3)
+    assert codec.decode(buf, ps.DecodeProfile(0.25, "gray")).shape == (12, 16)
+    assert codec.decode(buf, ps.DecodeProfile(mode="yuv")).shape == (72, 64)  # I420
+    gray = codec.encode(FRAMES["bgr"], subsampling=TJSAMP_GRAY)
+    assert codec.decode(gray, ps.DecodeProfile(0.125, "yuv")).shape == (6, 8)
+    with pytest.raises(ValueError):
+        ps.DecodeProfile(0.3)
+    with pytest.raises(ValueError):
+        ps.DecodeProfile(mode="rgb")
+
+
+def test_stream_profile():
+    endpoint = "ipc:///tmp/testcodecs" + uuid.uuid1().hex
+    profile = ps.DecodeProfile(0.5, "gray")
+    with ps.Streamer(endpoint) as streamer, ps.Receiver(endpoint, profile=profile) as receiver:
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            streamer.send(FRAMES["bgr"])
+            try:
+                data = receiver.recv(timeout=50)
+            except TimeoutError:
+                continue
+            if data.fno >= 0:
+                break
+    assert data.arr is not None
+    assert data.arr.shape == (24, 32)
+
+
+def test_yuv_ingest():
+    codec = codecs.lookup("jpeg")
+    frame = FRAMES["bgr"]
+    yuv = codec.decode(codec.encode(frame), ps.DecodeProfile(mode="yuv"))
+    nv12 = yuv.copy()
+    chroma = nv12[48:].reshape(-1, 2)
+    chroma[:, 0], chroma[:, 1] = yuv[48:60].ravel(), yuv[60:].ravel()
+    assert np.array_equal(codecs.i420(nv12), yuv)
+
+    out = codec.decode(codec.encode_yuv(yuv))
+    assert out.shape == frame.shape
+    assert np.array_equal(codec.decode(codec.encode_yuv(nv12, layout="nv12")), out)
+    gray = codec.encode_yuv(yuv, subsampling=TJSAMP_GRAY)
+    assert codec.decode(gray, ps.DecodeProfile(mode="gray")).shape == (48, 64)
+    with pytest.raises(ValueError):
+        codec.encode_yuv(frame)
+    with pytest.raises(ValueError):
+        ps.EncoderDevice(1, uuid.uuid1().hex, codec="zlib", pixel_format="nv12")
+    with pytest.raises(ValueError):
+        ps.EncoderDevice(1, uuid.uuid1().hex, pixel_format="rgb")
+
+
+def test_stream_yuv():
+    endpoint = "ipc:///tmp/testcodecs" + uuid.uuid1().hex
+    codec = codecs.lookup("jpeg")
+    yuv = codec.decode(codec.encode(FRAMES["bgr"]), ps.DecodeProfile(mode="yuv"))
+    profile = ps.DecodeProfile(mode="yuv")
+    with (
+        ps.Streamer(endpoint, pixel_format="i420") as streamer,
+        ps.Receiver(endpoint, profile=profile) as receiver,
+    ):
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            streamer.send(yuv)
+            try:
+                data = receiver.recv(timeout=50)
+            except TimeoutError:
+                continue
+            if data.fno >= 0:
+                break
+    assert data.arr is not None
+    assert data.arr.shape == yuv.shape
+    assert np.abs(data.arr.astype(int) - yuv).mean() < 8
+
+
+def test_send_encoded():
+    endpoint = "ipc:///tmp/testcodecs" + uuid.uuid1().hex
+    jpegs = ps.encodecard(ps.TEST_S, (0, 90))
+    assert ps.encodecard(ps.TEST_S, (0, 90)) is jpegs  # encoded once
+    with ps.Streamer(endpoint) as streamer, ps.Receiver(endpoint) as receiver:
+        with pytest.raises(ValueError):
+            streamer.send_encoded(jpegs[0], codec="nope")
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            streamer.send_encoded(jpegs[1], meta=b"card")
+            try:
+                data = receiver.recv(timeout=50)
+            except TimeoutError:
+                continue
+            if data.fno >= 0:
+                break
+        assert streamer.encoder.rate.frames == 0  # nothing went through the encoders
+    assert data.meta == b"card"
+    assert data.arr.shape == (480, 640, 3)
+
+
+def test_encodecard_scale():
+    jpeg = codecs.lookup("jpeg")
+    (full,) = ps.encodecard(ps.TEST_S)
+    (half,) = ps.encodecard(ps.TEST_S, scale=0.5)
+    assert jpeg.decode(full).shape == (480, 640, 3)
+    assert jpeg.decode(half).shape == (240, 320, 3)
@@ -93,6 +93,8 @@ def test_circular_dict():
 
     for k, i in zip(cd.keys(), range(2, 7), strict=True):
         assert k == i
+    assert 2 in cd
+    assert 1 not in cd
 
     cd.insert_end(3, 100)
     cd[2] = -100
@@ -0,0 +1,95 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+import pystreaming as ps
+from pystreaming.stream.interface import RecvData
+from pystreaming.video import codecs
+from pystreaming.video.delta import TileCanvas, mosaic, prefix, unmosaic
+
+rng = np.random.default_rng(0)
+BACKGROUND = rng.integers(0, 255, (100, 130, 3), dtype=np.uint8)
+
+
+def scene(i, dtype=np.uint8):
+    """A static background with a box moving across it, on a frame of odd size."""
+    frame = BACKGROUND.copy()
+    frame[20:40, 10 * i : 10 * i + 20] = 0
+    return frame.astype(dtype)
+
+
+def roundtrip(delta, canvas, frame, fno, codec="raw"):
+    inner = codecs.lookup(codec)
+    arr, head = delta.split(frame, fno, inner.id)
+    buf = head + inner.encode(arr)
+    data = RecvData(
+        meta=None, ftime=0.0, fno=fno, arr=codecs.lookup("tiles").decode(buf), buf=prefix(buf)
+    )
+    return data if canvas.patch(data) else None
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+def test_patch_is_exact(dtype):
+    delta, canvas = ps.TileDelta(tile=16, keyframe=4, threshold=0), TileCanvas()
+    for i in range(10):
+        frame = scene(i, dtype)
+        data = roundtrip(delta, canvas, frame, i)
+        assert data is not None
+        assert data.arr.dtype == dtype
+        assert np.array_equal(data.arr, frame)
+    assert delta.keyframes == 3
+    assert delta.deltas == 7
+    assert 0 < delta.ratio < 0.2  # only the tiles around the box were sent
+
+
+def test_mosaic():
+    tiles = rng.integers(0, 255, (20, 16, 16, 3), dtype=np.uint8)
+    arr = mosaic(tiles)
+    assert arr.shape == (32, 256, 3)
+    assert np.array_equal(unmosaic(arr, 20, 16), tiles)
+    assert mosaic(tiles[:0]).shape == (16, 16, 3)
+
+
+def test_lost_keyframe():
+    delta, canvas = ps.TileDelta(tile=16, keyframe=3), TileCanvas()
+    assert roundtrip(delta, canvas, scene(0), 0) is not None
+    delta.split(scene(1), 1, codecs.RawCodec.id)  # never sent
+    delta.drop()
+    assert roundtrip(delta, canvas, scene(2), 2) is not None
+    delta.split(scene(3), 3, codecs.RawCodec.id)  # a keyframe, lost on the way
+    assert roundtrip(delta, canvas, scene(4), 4) is None
+    assert canvas.dropped == 1
+
+    with pytest.raises(ValueError):
+        ps.TileDelta(tile=24)
+    with pytest.raises(ValueError):
+        ps.TileDelta(keyframe=0)
+    with pytest.raises(ValueError):
+        ps.Streamer("ipc:///tmp/unused", mapreduce=True, delta=ps.TileDelta())
+
+
+def test_stream_delta():
+    endpoint = "ipc:///tmp/testdelta" + uuid.uuid1().hex
+    delta = ps.TileDelta(tile=16, keyframe=5, threshold=0)
+    with (
+        ps.Streamer(endpoint, codec="zlib", delta=delta) as streamer,
+        ps.Receiver(endpoint, reorder=0.1) as receiver,
+    ):
+        frames = {}
+        received = []
+        deadline = time.time() + 10
+        while len(received) < 10 and time.time() < deadline:
+            fno = streamer.encoder.idx
+            frames[fno] = scene(fno % 10)
+            streamer.send(frames[fno])
+            try:
+                data = receiver.recv(timeout=50)
+            except TimeoutError:
+                continue
+            if data.fno >= 0:
+                assert np.array_equal(data.arr, frames[data.fno])
+                received.append(data.fno)
+    assert len(received) == 10
+    assert delta.deltas > 0
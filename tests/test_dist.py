@@ -0,0 +1,197 @@
+import contextlib
+import time
+import uuid
+
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.stream.interface import RecvData
+from pystreaming.video import FRAMEMISS, TRACKMISS
+from pystreaming.video.dist import CREDITS, Track
+
+CREDIT = 2  # frames every worker asks for ahead
+
+
+@contextlib.contextmanager
+def distributor(policy=None):
+    seed = uuid.uuid1().hex
+    policies = None if policy is None else {"none": policy}
+    device = ps.DistributorDevice(["none"], "ipc:///tmp/testdist" + seed, seed, policies=policies)
+    device.start()
+    source = zmq.Context.instance().socket(zmq.PUSH)
+    source.connect(device.infd)
+    try:
+        yield device, source
+    finally:
+        source.close(linger=0)
+        device.stop()
+
+
+@contextlib.contextmanager
+def dealers(device, n, credit=CREDIT):
+    """n DEALER workers that asked for credit frames each, in order."""
+    workers = [zmq.Context.instance().socket(zmq.DEALER) for _ in range(n)]
+    try:
+        for worker in workers:
+            worker.connect(device.endpoint)
+            worker.send_multipart([b"", b"none", CREDITS.pack(credit)])
+            time.sleep(0.05)  # arrive in order
+        yield workers
+    finally:
+        for worker in workers:
+            worker.close(linger=0)
+
+
+def fnos(worker):
+    """Frame numbers a worker was sent, waiting a little for the last ones."""
+    out = []
+    while worker.poll(200):
+        out.append(intf.unpack(worker.recv_multipart()[1:]).fno)
+    return out
+
+
+@pytest.fixture
+def dist():
+    with distributor() as (device, source):
+        yield device, source
+
+
+@pytest.mark.parametrize("nworkers", [1, 2, 4, 8, 16, 32])
+def test_credit_workers_scale(dist, nworkers):
+    device, source = dist
+    context = zmq.Context.instance()
+    workers = [context.socket(zmq.DEALER) for _ in range(nworkers)]
+    poller = zmq.Poller()
+    for worker in workers:
+        worker.connect(device.endpoint)
+        worker.send_multipart([b"", b"none", CREDITS.pack(CREDIT)])
+        poller.register(worker, zmq.POLLIN)
+    received: dict[int, int] = {}  # fno -> worker
+    nframes = 4 * nworkers
+    try:
+        time.sleep(0.2)  # every request is parked before the first frame
+        fno, deadline = 0, time.time() + 10
+        while len(received) < nframes and time.time() < deadline:
+            # no more in flight than a track queue holds, in case credits come back late
+            if fno < nframes and fno - len(received) < min(CREDIT * nworkers, 8):
+                intf.send(socket=source, fno=fno, ftime=time.time(), meta=None, buf=b"jpeg")
+                fno += 1
+            for worker, _ in poller.poll(0 if fno < nframes else 100):
+                _, *parts = worker.recv_multipart()
+                data = intf.unpack(parts)
+                assert data.fno not in received
+                received[data.fno] = workers.index(worker)
+                worker.send_multipart([b"", b"none", CREDITS.pack(1)])
+    finally:
+        for worker in workers:
+            worker.close(linger=0)
+    assert sorted(received) == list(range(nframes))
+    assert set(received.values()) == set(range(nworkers))  # round robin over every worker
+
+
+def test_req_workers(dist):
+    device, source = dist
+    req = zmq.Context.instance().socket(zmq.REQ)
+    req.connect(device.endpoint)
+    try:
+        req.send(b"none")
+        assert intf.recv(socket=req, buf=True).fno == FRAMEMISS  # answered right away
+        intf.send(socket=source, fno=3, ftime=0.0, meta=None, buf=b"jpeg")
+        time.sleep(0.2)
+        req.send(b"none")
+        assert intf.recv(socket=req, buf=True).fno == 3
+        req.send(b"other")
+        assert intf.recv(socket=req, buf=True).fno == TRACKMISS
+    finally:
+        req.close(linger=0)
+
+
+def test_requester_prefetch(dist):
+    device, source = dist
+    seed = uuid.uuid1().hex
+    requester = ps.RequesterDevice(device.endpoint, "none", 2, seed, prefetch=3)
+    drain = zmq.Context.instance().socket(zmq.PULL)
+    drain.connect(requester.outfd)
+    requester.start()
+    received = []
+    try:
+        time.sleep(0.2)  # both threads have their credits in
+        for fno in range(6):  # less than in flight, so none has to wait for a request
+            intf.send(socket=source, fno=fno, ftime=0.0, meta=None, buf=b"jpeg")
+        while drain.poll(1000):
+            received.append(intf.recv(socket=drain, buf=True).fno)
+    finally:
+        drain.close(linger=0)
+        requester.stop()
+    assert sorted(received) == list(range(6))
+    with pytest.raises(ValueError):
+        ps.RequesterDevice(device.endpoint, "none", 2, seed, prefetch=0)
+
+
+def test_broadcast():
+    with distributor("broadcast") as (device, source), dealers(device, 3, credit=4) as workers:
+        for fno in range(4):
+            intf.send(socket=source, fno=fno, ftime=0.0, meta=None, buf=b"jpeg")
+        assert [fnos(worker) for worker in workers] == [[0, 1, 2, 3]] * 3
+
+
+def test_shard():
+    with distributor("shard") as (device, source), dealers(device, 3, credit=4) as workers:
+        for fno in range(9):
+            intf.send(socket=source, fno=fno, ftime=0.0, meta=None, buf=b"jpeg")
+        assert [fnos(worker) for worker in workers] == [[0, 3, 6], [1, 4, 7], [2, 5, 8]]
+
+
+def test_leastloaded():
+    with distributor("leastloaded") as (device, source), dealers(device, 2, credit=4) as workers:
+        fast, slow = workers
+        received = {fast: 0, slow: 0}
+        for fno in range(8):
+            intf.send(socket=source, fno=fno, ftime=0.0, meta=None, buf=b"jpeg")
+            (worker,) = [worker for worker in workers if worker.poll(1000)]
+            worker.recv_multipart()
+            received[worker] += 1
+            if worker is fast:  # done right away, the slow worker never is
+                fast.send_multipart([b"", b"none", CREDITS.pack(1)])
+                time.sleep(0.05)
+        assert received == {fast: 7, slow: 1}
+
+    with pytest.raises(ValueError):
+        ps.DistributorDevice(["none"], "ipc:///tmp/unused", "x", policies={"none": "random"})
+    with pytest.raises(ValueError):
+        ps.DistributorDevice(["none"], "ipc:///tmp/unused", "x", policies={"other": "shard"})
+
+
+def test_full_worker_keeps_credits():
+    context = zmq.Context.instance()
+    endpoint = "inproc://testdist" + uuid.uuid1().hex
+    router = context.socket(zmq.ROUTER)
+    router.setsockopt(zmq.ROUTER_MANDATORY, 1)
+    router.setsockopt(zmq.SNDHWM, 1)
+    router.bind(endpoint)
+    worker = context.socket(zmq.DEALER)
+    worker.setsockopt(zmq.RCVHWM, 1)
+    worker.connect(endpoint)
+    try:
+        worker.send_multipart([b"", b"none", CREDITS.pack(8)])
+        identity, _, _, credits = router.recv_multipart()
+        track = Track()
+        track.request(identity, *CREDITS.unpack(credits))
+        for fno in range(8):
+            track.push(RecvData(fno=fno, ftime=0.0, meta=None, buf=b"jpeg"))
+            track.dispatch(router)
+        # the pipe is full: the worker keeps its place and credits, the frames their order
+        assert track.fqueue.size
+        assert track.waiting[identity] == track.fqueue.size
+        received = []
+        while worker.poll(200):
+            received.append(intf.unpack(worker.recv_multipart()[1:]).fno)
+            router.poll(10)  # as the device loop does, to hear that the pipe drained
+            track.dispatch(router)
+        assert received == list(range(8))
+        assert identity not in track.waiting
+    finally:
+        worker.close(linger=0)
+        router.close(linger=0)
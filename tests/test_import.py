@@ -0,0 +1,63 @@
+import subprocess
+import sys
+
+import pytest
+
+import pystreaming as ps
+
+HEAVY = ("turbojpeg", "zmq.asyncio", "cv2", "PIL", "pystreaming.video.enc")
+
+
+def loaded(code):
+    """Modules a fresh interpreter has imported after running code."""
+    out = subprocess.run(
+        [sys.executable, "-c", code + "\nimport sys\nprint(*sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(out.stdout.split())
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import pystreaming",
+        "from pystreaming import AudioReceiver, AudioStreamer",
+        "from pystreaming.listlib.circularlist import CircularList",
+    ],
+)
+def test_light(code):
+    assert not loaded(code) & set(HEAVY)
+
+
+def test_import_time():
+    # About 20 ms with warm caches. The bound is loose for slow CI machines; test_light
+    # catches a heavy module coming back, this catches a slow import of any kind.
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import time\nstart = time.perf_counter()\nimport pystreaming\n"
+            "print(time.perf_counter() - start)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert float(out.stdout) < 0.5
+
+
+def test_jpeg_on_first_use():
+    modules = loaded("import pystreaming as ps\nps.Streamer, ps.Receiver, ps.Worker")
+    assert "turbojpeg" not in modules
+    modules = loaded("from pystreaming.video.codecs import lookup\nlookup('jpeg').require()")
+    assert "turbojpeg" in modules
+
+
+def test_public_names():
+    for name in ps.__all__:
+        assert getattr(ps, name) is not None
+    assert set(ps.__all__) <= set(dir(ps))
+    with pytest.raises(AttributeError):
+        ps.Nothing  # noqa: B018
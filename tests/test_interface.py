@@ -0,0 +1,110 @@
+import uuid
+
+import numpy as np
+import pytest
+import zmq
+
+from pystreaming.stream import interface as intf
+
+
+@pytest.fixture
+def pair():
+    context = zmq.Context.instance()
+    a, b = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+    endpoint = "inproc://test_interface" + uuid.uuid1().hex
+    a.bind(endpoint)
+    b.connect(endpoint)
+    yield a, b
+    a.close(linger=0)
+    b.close(linger=0)
+
+
+def test_roundtrip(pair):
+    a, b = pair
+    arr = np.arange(480 * 640 * 3, dtype=np.uint8).reshape(480, 640, 3)
+    intf.send(socket=a, fno=7, ftime=1.5, meta=None, arr=arr, buf=b"jpeg")
+    data = intf.recv(socket=b, arr=True, buf=True)
+    assert data.fno == 7
+    assert data.ftime == 1.5
+    assert data.meta is None
+    assert data.buf == b"jpeg"
+    assert data.arr is not None
+    assert data.arr.dtype == np.uint8
+    assert np.array_equal(data.arr, arr)
+
+    audio = np.zeros((256, 2), dtype=np.float32)
+    intf.send(socket=a, fno=8, ftime=2.0, meta={"track": "mic"}, arr=audio)
+    data = intf.recv(socket=b, arr=True)
+    assert data.meta == {"track": "mic"}
+    assert data.arr is not None
+    assert data.arr.shape == (256, 2)
+    assert data.arr.dtype == np.float32
+    assert data.buf is None
+
+
+def test_unrequested_parts_are_dropped(pair):
+    a, b = pair
+    intf.send(socket=a, fno=0, ftime=0.0, meta=None, arr=np.zeros(4), buf=b"x")
+    data = intf.recv(socket=b, buf=True)
+    assert data.arr is None
+    assert data.buf == b"x"
+
+
+def test_meta_codecs(pair):
+    a, b = pair
+    for codec, meta in [
+        (None, b"raw"),
+        (None, ("any", 1, None)),
+        (intf.META_JSON, {"a": [1, 2]}),
+        (intf.META_PICKLE, {"b": 2}),
+    ]:
+        intf.send(socket=a, fno=1, ftime=0.0, meta=meta, buf=b"", meta_codec=codec)
+        assert intf.recv(socket=b, buf=True).meta == meta
+
+    with pytest.raises(ValueError):
+        intf.encode_meta({}, codec=99)
+
+
+def test_header_is_fixed_size():
+    parts = intf.pack(fno=1, ftime=0.0, meta=None, buf=b"abc")
+    assert len(parts) == 2
+    assert len(parts[0]) == intf.HEADER.size == 64
+
+
+def test_rejects_bad_messages():
+    with pytest.raises(ValueError):
+        intf.unpack([b"not a header"])
+    header, buf = intf.pack(fno=1, ftime=0.0, meta=None, buf=b"abc")
+    with pytest.raises(ValueError):
+        intf.unpack([header])  # missing part
+    with pytest.raises(ValueError):
+        intf.unpack([header, b"abcd"])  # wrong length
+    with pytest.raises(ValueError):
+        intf.pack(fno=1, ftime=0.0, meta=None, arr=np.zeros((1,) * (intf.MAX_NDIM + 1)))
+
+
+def test_zero_copy(pair):
+    a, b = pair
+    arr = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    intf.send(socket=a, fno=3, ftime=0.0, meta=None, arr=arr, buf=arr.tobytes())
+    data = intf.recv(socket=b, arr=True, buf=True, copy=False)
+    assert isinstance(data.buf, memoryview)
+    assert not data.owned
+    assert np.array_equal(data.arr, arr)
+    assert bytes(data.buf) == arr.tobytes()
+
+    owned = data.copy()
+    assert owned.owned
+    assert isinstance(owned.buf, bytes)
+    assert np.array_equal(owned.arr, arr)
+    assert not data.owned  # copy leaves the original alone
+
+    assert data.detach() is data
+    assert data.owned
+    assert np.array_equal(data.arr, arr)
+
+    # small payloads are cheaper to copy and are received as bytes regardless
+    intf.send(socket=a, fno=4, ftime=0.0, meta=None, buf=b"small")
+    data = intf.recv(socket=b, buf=True, copy=False)
+    assert data.buf == b"small"
+    assert data.owned
@@ -0,0 +1,77 @@
+import time
+import uuid
+
+import numpy as np
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+
+N = 50
+
+
+def test_ipc_pipeline_latency():
+    """Frames should cross PublisherDevice -> SubscriberDevice as soon as they arrive."""
+    seed = uuid.uuid1().hex
+    endpoint = "ipc:///tmp/testlatency" + seed
+    pub = ps.PublisherDevice(endpoint, seed)
+    sub = ps.SubscriberDevice(endpoint, seed)
+    context = zmq.Context.instance()
+    source = context.socket(zmq.PUSH)
+    source.connect(pub.infd)
+    drain = context.socket(zmq.PULL)
+    drain.connect(sub.outfd)
+    pub.start()
+    sub.start()
+    try:
+        # wait out the subscription handshake
+        while not drain.poll(10):
+            intf.send(socket=source, fno=-1, ftime=0.0, meta=None, buf=b"")
+        while drain.poll(100):
+            drain.recv_multipart()
+
+        latencies = []
+        for fno in range(N):
+            start = time.perf_counter()
+            intf.send(socket=source, fno=fno, ftime=time.time(), meta=None, buf=b"x" * 1000)
+            assert drain.poll(1000)
+            data = intf.recv(socket=drain, buf=True)
+            latencies.append(time.perf_counter() - start)
+            assert data.fno == fno
+            time.sleep(0.005)  # idle between frames, like a camera would
+    finally:
+        source.close(linger=0)
+        drain.close(linger=0)
+        sub.stop()
+        pub.stop()
+    # Two hops used to sleep out a 10 ms timestep each; now they only pay for ipc, which
+    # stays well under one timestep even on a loaded machine.
+    assert np.median(latencies) < 0.005, f"median latency {np.median(latencies) * 1e3:.2f} ms"
+
+
+def test_burst_stats():
+    """Every handled message is counted in exactly one batch no larger than the budget."""
+    seed = uuid.uuid1().hex
+    dev = ps.CollectDevice("ipc:///tmp/testburst" + seed, seed, burst=4)
+    context = zmq.Context.instance()
+    source = context.socket(zmq.PUSH)
+    source.connect(dev.infd)
+    drain = context.socket(zmq.PULL)
+    drain.connect(dev.outfd)
+    dev.start()
+    try:
+        for fno in range(N):
+            intf.send(socket=source, fno=fno, ftime=time.time(), meta=None, buf=b"x")
+        received = []
+        while drain.poll(200):
+            received.append(intf.recv(socket=drain, buf=True).fno)
+    finally:
+        source.close(linger=0)
+        drain.close(linger=0)
+        dev.stop()
+    assert dev.stats is not None
+    hist = dev.stats.histogram()
+    assert max(hist) <= 4
+    assert sum(n * count for n, count in hist.items()) == N
+    assert 0 < dev.stats.mean() <= 4
+    assert received == sorted(received)  # frames may be dropped downstream, never reordered
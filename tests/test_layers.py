@@ -0,0 +1,90 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.video.layers import halve, pyramid, validate
+
+rng = np.random.default_rng(0)
+FRAME = rng.integers(0, 255, (97, 130, 3), dtype=np.uint8)
+
+
+def test_halve():
+    out = halve(FRAME)
+    assert out.shape == (48, 65, 3)
+    blocks = FRAME[:96].reshape(48, 2, 65, 2, 3).astype(int)
+    assert np.array_equal(out, (blocks.sum(axis=(1, 3)) + 2) // 4)
+
+    depth = np.arange(16, dtype=np.uint16).reshape(4, 4)
+    assert np.array_equal(halve(depth), [[2, 4], [10, 12]])  # rounded half to even
+    assert halve(np.ones((1, 5), dtype=np.float32)).shape == (1, 5)
+
+
+def test_pyramid():
+    layers = validate([(1.0,), ps.Layer(0.5, 60), ps.Layer(0.125, 40)])
+    frames = pyramid(FRAME, layers)
+    assert frames[0] is FRAME
+    assert [f.shape[:2] for f in frames] == [(97, 130), (48, 65), (12, 16)]
+    for layers in ([], [ps.Layer(0.3)], [ps.Layer(0.5), ps.Layer(1.0)]):
+        with pytest.raises(ValueError):
+            validate(layers)
+    with pytest.raises(ValueError):
+        ps.Streamer("ipc:///tmp/unused", layers=[ps.Layer()], delta=ps.TileDelta())
+
+
+def test_topic():
+    parts = intf.pack(fno=1, ftime=0.0, meta=None, buf=b"x", layer=2)
+    assert parts[0].startswith(intf.topic(2))
+    assert not parts[0].startswith(intf.topic(0))
+    assert intf.unpack(parts).layer == 2
+
+
+def test_stream_layers():
+    endpoint = "ipc:///tmp/testlayers" + uuid.uuid1().hex
+    layers = [ps.Layer(1.0), ps.Layer(0.5), ps.Layer(0.25, 30)]
+    with (
+        ps.Streamer(endpoint, layers=layers) as streamer,
+        ps.Receiver(endpoint) as full,
+        ps.Receiver(endpoint, layer=2) as small,
+    ):
+        shapes = {}
+        deadline = time.time() + 10
+        while len(shapes) < 2 and time.time() < deadline:
+            streamer.send(FRAME)
+            for layer, receiver in ((0, full), (2, small)):
+                try:
+                    data = receiver.recv(timeout=25)
+                except TimeoutError:
+                    continue
+                assert data.layer == layer
+                shapes[layer] = data.arr.shape
+    assert shapes == {0: (97, 130, 3), 2: (24, 32, 3)}
+
+
+def test_distributor_routes():
+    seed = uuid.uuid1().hex
+    endpoint = "ipc:///tmp/testroutes" + seed
+    with pytest.raises(ValueError):
+        ps.DistributorDevice(["a"], endpoint, seed, routes={"b": 1})
+    dist = ps.DistributorDevice(["big", "small"], endpoint, seed, routes={"small": 1})
+    dist.start()
+    context = zmq.Context.instance()
+    push, req = context.socket(zmq.PUSH), context.socket(zmq.REQ)
+    push.connect(dist.infd)
+    req.connect(endpoint)
+    try:
+        for layer in (0, 1):
+            intf.send(socket=push, fno=5, ftime=0.0, meta=None, buf=b"layer%d" % layer, layer=layer)
+        time.sleep(0.2)
+        for track, layer in (("small", 1), ("big", 0)):
+            req.send(track.encode())
+            data = intf.recv(socket=req, buf=True)
+            assert (data.fno, data.layer, data.buf) == (5, layer, b"layer%d" % layer)
+    finally:
+        push.close(linger=0)
+        req.close(linger=0)
+        dist.stop()
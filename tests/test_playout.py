@@ -0,0 +1,103 @@
+import time
+import uuid
+
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+
+STREAMS = 4
+FRAMES = 10
+DELAY = 0.05
+
+
+@pytest.fixture
+def pairs():
+    context = zmq.Context.instance()
+    pairs = []
+    for _ in range(STREAMS):
+        a, b = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+        endpoint = "inproc://test_playout" + uuid.uuid1().hex
+        a.bind(endpoint)
+        b.connect(endpoint)
+        pairs.append((a, b))
+    yield pairs
+    for a, b in pairs:
+        a.close(linger=0)
+        b.close(linger=0)
+
+
+def send_interleaved(pairs, start):
+    """Every stream sends FRAMES frames, stream i stamped i ms after stream 0."""
+    for fno in range(FRAMES):
+        for i, (a, _) in enumerate(reversed(pairs)):
+            stream = len(pairs) - 1 - i
+            ftime = start + fno * 0.01 + stream * 0.001
+            intf.send(socket=a, fno=fno, ftime=ftime, meta=None, buf=b"x")
+
+
+def collect(playout, n, timeout=2.0):
+    out = []
+    end = time.time() + timeout
+    for item in playout:
+        out.append(item)
+        if len(out) == n or time.time() > end:
+            break
+    return out
+
+
+def test_timestamp_order_across_streams(pairs):
+    sources = {f"s{i}": ps.SocketSource(b, buf=True) for i, (_, b) in enumerate(pairs)}
+    playout = ps.PlayoutBuffer(DELAY, sources)
+    start = time.time()
+    send_interleaved(pairs, start)
+    played = collect(playout, STREAMS * FRAMES)
+    assert len(played) == STREAMS * FRAMES
+    ftimes = [data.ftime for _, data in played]
+    assert ftimes == sorted(ftimes)
+    assert {name for name, _ in played} == set(sources)
+    assert sum(playout.played.values()) == STREAMS * FRAMES
+
+    # frames stamped before the playout point are too late for their slot
+    a, _ = pairs[0]
+    intf.send(socket=a, fno=FRAMES, ftime=start - 1.0, meta=None, buf=b"x")
+    intf.send(socket=a, fno=FRAMES + 1, ftime=time.time(), meta=None, buf=b"x")
+    assert collect(playout, 1)[0][1].fno == FRAMES + 1
+    assert playout.late["s0"] == 1
+
+
+def test_buffer_wraps_generators(pairs):
+    def handler(socket):
+        def gen():
+            while True:
+                yield intf.recv(socket=socket, buf=True) if socket.poll(0) else None
+
+        return gen
+
+    handlers = {f"s{i}": handler(b) for i, (_, b) in enumerate(pairs)}
+    send_interleaved(pairs, time.time())
+    played = []
+    for item in ps.buffer(DELAY, handlers):
+        played.append(item)
+        if len(played) == STREAMS * FRAMES:
+            break
+    ftimes = [data.ftime for _, data in played]
+    assert ftimes == sorted(ftimes)
+
+
+def test_source_socket_resolved_per_pass(pairs):
+    (a, b), (c, d) = pairs[:2]
+    source = ps.SocketSource(b, buf=True)
+    source.poll_socket = None  # a stopped source
+    playout = ps.PlayoutBuffer(DELAY, {"s0": source})
+    with pytest.raises(RuntimeError):
+        next(iter(playout))
+
+    source.poll_socket = b
+    intf.send(socket=a, fno=0, ftime=time.time(), meta=None, buf=b"x")
+    assert collect(playout, 1)[0][1].fno == 0
+
+    source.poll_socket = d  # restarted on a new socket
+    intf.send(socket=c, fno=1, ftime=time.time(), meta=None, buf=b"x")
+    assert collect(playout, 1)[0][1].fno == 1
@@ -0,0 +1,101 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.video import MAX_SKIP, QUALITY_MIN, RATE_INTERVAL
+from pystreaming.video.rate import SUBSAMPLING, RateController
+
+FPS = 30
+
+
+def run(rate, seconds, start=0.0, drop=False, encode=0.001, nbytes=10_000):
+    """Feed a controller frames at FPS, returning the admitted count and the end time."""
+    admitted = 0
+    now = start
+    for _ in range(int(seconds * FPS)):
+        if rate.admit(now):
+            admitted += 1
+            if drop:
+                rate.drop()
+            else:
+                rate.record(encode, nbytes)
+        now += 1 / FPS
+    return admitted, now
+
+
+def test_degrades_then_recovers():
+    rate = RateController(quality=60)
+    assert (rate.quality, rate.subsampling, rate.skip) == (60, SUBSAMPLING[0], 0)
+
+    _, now = run(rate, RATE_INTERVAL * 20, drop=True)
+    assert rate.quality == QUALITY_MIN
+    assert rate.subsampling == SUBSAMPLING[-1]
+    assert rate.skip == MAX_SKIP
+    assert rate.dropped > 0
+    admitted, now = run(rate, 2, start=now, drop=True)
+    assert admitted == pytest.approx(2 * FPS / (MAX_SKIP + 1), abs=1)
+    assert rate.skipped > 0
+
+    run(rate, RATE_INTERVAL * 20, start=now)
+    assert (rate.quality, rate.subsampling, rate.skip) == (60, SUBSAMPLING[0], 0)
+
+
+def test_budgets():
+    rate = RateController(quality=60, latency=0.01)
+    run(rate, RATE_INTERVAL * 3, encode=0.02)
+    assert rate.quality < 60
+
+    # 10 kB per frame at 30 fps is 2.4 Mbps
+    rate = RateController(quality=60, bitrate=1e6)
+    run(rate, RATE_INTERVAL * 3)
+    assert rate.bitrate == pytest.approx(2.4e6, rel=0.01)
+    assert rate.quality < 60
+
+    rate = RateController(quality=60, bitrate=1e7)
+    run(rate, RATE_INTERVAL * 3)
+    assert rate.quality == 60
+
+    with pytest.raises(ValueError):
+        RateController(quality=10, floor=20)
+
+
+def test_outlet_drops():
+    rate = RateController(quality=60)
+    _, now = run(rate, RATE_INTERVAL * 2)
+    assert rate.quality == 60
+    rate.record_drop()  # as an encoder process would, for a layer the outlet refused
+    run(rate, RATE_INTERVAL, start=now)
+    assert rate.quality < 60
+    assert rate.dropped == 1
+
+
+def test_encoder_sheds_load():
+    pytest.importorskip("turbojpeg")
+    from turbojpeg import TurboJPEG
+
+    try:
+        TurboJPEG()
+    except RuntimeError:
+        pytest.skip("libturbojpeg is not installed")
+
+    enc = ps.EncoderDevice(1, uuid.uuid1().hex)
+    drain = zmq.Context.instance().socket(zmq.PULL)
+    drain.bind(enc.outfd)
+    enc.start()
+    frame = np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    try:
+        end = time.time() + RATE_INTERVAL * 4
+        while time.time() < end:
+            enc.send(frame)  # far faster than one process can encode, but never raises
+            while drain.poll(0):
+                drain.recv_multipart()
+    finally:
+        drain.close(linger=0)
+        enc.stop()
+    assert enc.rate.dropped > 0
+    assert enc.rate.quality < ps.RateController().quality
+    assert enc.rate.encode_time > 0
@@ -0,0 +1,97 @@
+import time
+import uuid
+
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.stream.reorder import ReorderBuffer
+from pystreaming.video import STOPSTREAM
+
+
+def frame(fno):
+    return intf.RecvData(meta=None, ftime=0.0, fno=fno)
+
+
+def fnos(frames):
+    return [data.fno for data in frames]
+
+
+def test_restores_order():
+    order = ReorderBuffer(latency=1.0)
+    assert fnos(order.push(frame(0), now=0.0)) == [0]
+    assert fnos(order.push(frame(2), now=0.0)) == []
+    assert fnos(order.push(frame(3), now=0.0)) == []
+    assert len(order) == 2
+    assert order.deadline() == 1.0
+    assert order.timeout(now=0.5) == 500
+    assert fnos(order.push(frame(1), now=0.1)) == [1, 2, 3]
+    assert order.deadline() is None
+    assert order.reordered == 2
+    assert order.gaps == order.late == 0
+    assert order.released == 4
+
+
+def test_deadline_releases_past_gaps():
+    order = ReorderBuffer(latency=0.1)
+    order.push(frame(0), now=0.0)
+    assert fnos(order.push(frame(3), now=0.0)) == []
+    assert fnos(order.push(frame(5), now=0.05)) == []
+    assert fnos(order.expire(now=0.09)) == []
+    assert fnos(order.expire(now=0.1)) == [3]
+    assert fnos(order.push(frame(4), now=0.11)) == [4, 5]
+    assert order.gaps == 2
+
+    assert fnos(order.push(frame(1), now=0.2)) == []  # its turn has passed
+    assert order.late == 1
+    assert fnos(order.push(frame(STOPSTREAM), now=0.2)) == [STOPSTREAM]
+
+
+def test_bounded_and_restart():
+    order = ReorderBuffer(latency=10.0, maxsize=2)
+    order.push(frame(0), now=0.0)
+    order.push(frame(2), now=0.0)
+    order.push(frame(3), now=0.0)
+    assert fnos(order.push(frame(4), now=0.0)) == [2, 3, 4]  # full, released early
+    assert order.gaps == 1
+
+    order.push(frame(10), now=0.0)
+    assert fnos(order.push(frame(0), now=0.0)) == [10, 0]  # sender restarted
+    assert fnos(order.sequence([frame(2), frame(1)])) == [1, 2]
+
+    with pytest.raises(ValueError):
+        ReorderBuffer(latency=-1)
+    with pytest.raises(ValueError):
+        ReorderBuffer(latency=1, maxsize=0)
+
+
+def test_publisher_reorders():
+    seed = uuid.uuid1().hex
+    endpoint = "ipc:///tmp/testreorder" + seed
+    pub = ps.PublisherDevice(endpoint, seed, reorder=0.05)
+    context = zmq.Context.instance()
+    source = context.socket(zmq.PUSH)
+    source.connect(pub.infd)
+    sink = context.socket(zmq.SUB)
+    sink.subscribe(b"")
+    sink.connect(endpoint)
+    pub.start()
+    try:
+        # wait out the subscription handshake
+        while not sink.poll(10):
+            intf.send(socket=source, fno=STOPSTREAM, ftime=0.0, meta=None, buf=b"")
+        while sink.poll(100):
+            sink.recv_multipart()
+
+        for fno in [0, 2, 1, 4, 3, 6]:
+            intf.send(socket=source, fno=fno, ftime=time.time(), meta=None, buf=b"x")
+            time.sleep(0.005)  # paced like a camera, bursts would overrun PUB_HWM
+        received = []
+        while sink.poll(200):
+            received.append(intf.recv(socket=sink, buf=True).fno)
+    finally:
+        source.close(linger=0)
+        sink.close(linger=0)
+        pub.stop()
+    assert received == [0, 1, 2, 3, 4, 6]  # 6 is released at the deadline, past the gap
@@ -0,0 +1,172 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.stream.ring import FramePool, FrameRing
+from pystreaming.video.codecs import DecodeProfile, lookup
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create("pstest" + uuid.uuid1().hex[:20], 3, 480 * 640 * 3)
+    yield ring
+    ring.unlink()
+
+
+def test_acquire_release(ring):
+    slots = [ring.acquire() for _ in range(3)]
+    assert sorted(slots) == [0, 1, 2]
+    assert ring.acquire() is None
+    assert ring.busy() == 3
+    ring.release(slots[1])
+    assert ring.acquire() == slots[1]
+    assert ring.fits(480 * 640 * 3)
+    assert not ring.fits(480 * 640 * 3 + 1)
+    with pytest.raises(IndexError):
+        ring.view(3, np.uint8, (1,))
+    with pytest.raises(ValueError):
+        ring.view(0, np.uint8, (481, 640, 3))
+
+
+def test_attach(ring):
+    frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    slot = ring.acquire()
+    ring.view(slot, frame.dtype, frame.shape)[...] = frame
+
+    reader = FrameRing(ring.name)
+    assert np.array_equal(reader.view(slot, frame.dtype, frame.shape), frame)
+    reader.release(slot)
+    reader.close()
+    assert ring.busy() == 0
+
+
+def test_slot_roundtrip(ring):
+    frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    slot = ring.acquire()
+    ring.view(slot, frame.dtype, frame.shape)[...] = frame
+    parts = intf.pack(fno=5, ftime=0.0, meta=None, arr=frame, slot=slot)
+    assert len(parts) == 1  # the frame itself is not sent
+
+    reader = FrameRing(ring.name)
+    data = intf.unpack(parts, ring=reader)
+    assert data.slot == slot
+    assert data.fno == 5
+    assert not data.owned
+    assert np.array_equal(data.arr, frame)
+    del data
+    reader.close()
+
+    assert intf.unpack(parts).arr is None  # no ring to view it in
+    assert intf.unpack_header(intf.pack(fno=5, ftime=0.0, meta=None, arr=frame)[0]).slot is None
+    with pytest.raises(ValueError):
+        intf.pack(fno=5, ftime=0.0, meta=None, slot=slot)
+
+
+def test_lease():
+    name = "pstest" + uuid.uuid1().hex[:20]
+    ring = FrameRing.create(name + "1", 3, 480 * 640 * 3)  # of the second writer
+    pool = FramePool(name, 3)
+    slot = ring.acquire()
+    arr = pool.view(3 + slot, np.uint8, (480, 640, 3))
+    rows = arr[10:20].reshape(-1)
+    del arr
+    assert ring.busy() == 1  # rows still views the slot
+    del rows
+    assert ring.busy() == 0
+
+    slot = ring.acquire()
+    data = intf.RecvData(meta=None, ftime=0.0, fno=0, arr=pool.view(3 + slot, "u1", (4,)))
+    assert not data.owned
+    data.detach()
+    assert ring.busy() == 0
+    pool.close()
+    ring.unlink()
+
+
+def test_decoder_shm():
+    pytest.importorskip("turbojpeg")
+    from turbojpeg import TurboJPEG
+
+    try:
+        jpeg = TurboJPEG()
+    except RuntimeError:
+        pytest.skip("libturbojpeg is not installed")
+
+    seed = uuid.uuid1().hex
+    dec = ps.DecoderDevice(1, seed, shm=True, slots=2, profile=DecodeProfile(0.5, "gray"))
+    source = zmq.Context.instance().socket(zmq.PUSH)
+    source.bind(dec.infd)
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    frame[:, :160] = 255
+    buf = jpeg.encode(frame)
+    dec.start()
+
+    def decoded(fno, buf, codec):
+        time.sleep(0.1)  # lets flow control catch up, as frames go one at a time
+        intf.send(socket=source, fno=fno, ftime=0.0, meta=None, buf=buf, codec=codec)
+        return dec.recv(timeout=5000)
+
+    try:
+        held = [decoded(fno, buf, 1) for fno in range(3)]
+        assert [data.slot is not None for data in held] == [True, True, False]  # pool full
+        assert dec.pool is not None and dec.pool.busy() == 2
+        for data in held:
+            assert data.arr.shape == (120, 160)
+            assert abs(int(data.arr[:, :75].mean()) - 255) < 5
+        rows = held[0].arr[:10]
+        del data, held
+        assert dec.pool.busy() == 1  # rows views the first frame
+        del rows
+        assert dec.pool.busy() == 0
+
+        depth = np.arange(120, dtype=np.uint16).reshape(10, 12)
+        zlib = lookup("zlib")
+        data = decoded(3, zlib.encode(depth), zlib.id)
+        assert data.slot is not None
+        assert np.array_equal(data.arr, depth)  # decoded, then copied into a slot
+        del data
+    finally:
+        source.close(linger=0)
+        dec.stop()
+
+
+def test_encoder_shm():
+    pytest.importorskip("turbojpeg")
+    from turbojpeg import TurboJPEG
+
+    try:
+        jpeg = TurboJPEG()
+    except RuntimeError:
+        pytest.skip("libturbojpeg is not installed")
+
+    seed = uuid.uuid1().hex
+    enc = ps.EncoderDevice(2, seed, shm=True, slots=4)
+    drain = zmq.Context.instance().socket(zmq.PULL)
+    drain.bind(enc.outfd)
+    enc.start()
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    frame[:, :160] = 255
+    try:
+        received = []
+        for _ in range(20):
+            enc.send(frame)
+            while drain.poll(100):
+                received.append(intf.recv(socket=drain, buf=True))
+            time.sleep(0.01)
+        while drain.poll(200):
+            received.append(intf.recv(socket=drain, buf=True))
+        assert enc.ring is not None
+        assert enc.ring.busy() == 0  # every slot was handed back
+    finally:
+        drain.close(linger=0)
+        enc.stop()
+    assert enc.ring is None
+    assert len(received) == 20
+    decoded = jpeg.decode(received[0].buf)
+    assert decoded.shape == frame.shape
+    assert abs(int(decoded[:, :150].mean()) - 255) < 5
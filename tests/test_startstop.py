@@ -1,6 +1,11 @@
 import time
+import uuid
+
+import zmq
 
 import pystreaming as ps
+from pystreaming.video.device import Device, control
+from tests.conftest import first
 
 
 def test_start_stop():
@@ -40,3 +45,39 @@ def test_patterns():
         time.sleep(1)
         with pattern:
             time.sleep(1)
+
+
+def test_warm():
+    endpoint = "ipc:///tmp/testwarm" + uuid.uuid1().hex
+    streamer = ps.Streamer(endpoint, codec="zlib", warm=True)
+    receiver = ps.Receiver(endpoint, warm=True)
+    try:
+        with streamer, receiver:
+            first(streamer, receiver)
+        processes = streamer.encoder.processes + receiver.decoder.processes
+        for _ in range(2):
+            with streamer, receiver:
+                first(streamer, receiver)
+            assert streamer.encoder.processes + receiver.decoder.processes == processes
+        assert all(process.is_alive() for process in processes)
+    finally:
+        receiver.close()
+        streamer.close()
+    assert receiver.decoder.processes == streamer.encoder.processes == []
+    assert not any(process.is_alive() for process in processes)
+
+
+def stubborn(*, shutdown):
+    """Device function that never looks at its control socket."""
+    ctl = control(zmq.Context(), shutdown)
+    time.sleep(60)
+    ctl.close()
+
+
+def test_parallel_halt():
+    device = Device(stubborn, {}, 4)
+    device.start()
+    start = time.perf_counter()
+    device._halt(0.5)  # all four must be terminated, each would take the whole timeout
+    assert time.perf_counter() - start < 2
+    assert device.processes == []
@@ -0,0 +1,92 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+import zmq
+
+import pystreaming as ps
+from pystreaming.stream import interface as intf
+from pystreaming.stream.trace import STAGE_IDS, LatencyStats, segments, stamp
+
+
+def test_trace_roundtrip():
+    trace = [(STAGE_IDS["send"], 10), (STAGE_IDS["encoder.in"], -5)]
+    data = intf.unpack(intf.pack(fno=1, ftime=2.0, meta={"a": 1}, buf=b"x", trace=trace))
+    assert data.trace == trace
+    assert data.meta == {"a": 1}
+    assert data.copy().trace == trace
+    assert intf.unpack(intf.pack(fno=1, ftime=2.0, meta=None)).trace is None
+    with pytest.raises(ValueError):
+        intf.pack(fno=1, ftime=2.0, meta=None, trace=[(0, 0)] * (intf.MAX_STAMPS + 1))
+
+
+def test_segments_and_percentiles():
+    data = intf.RecvData(meta=None, ftime=time.time() - 0.01, fno=0, trace=[])
+    stamp(data, "decoder.in")
+    stamp(data, "decoder.out")
+    stamp(data, "decoder.in")
+    untraced = intf.RecvData(meta=None, ftime=0.0, fno=0)
+    stamp(untraced, "decoder.in")
+    assert untraced.trace is None
+
+    names = list(segments(data.trace))
+    assert names == ["decoder.in", "decoder.out", "decoder.in#2", "total"]
+    assert segments(data.trace)["decoder.in"] == pytest.approx(0.01, abs=0.005)
+
+    stats = LatencyStats(window=10)
+    trace = [(STAGE_IDS["encoder.in"], 1000), (STAGE_IDS["encoder.out"], 3000)]
+    for _ in range(20):
+        stats.record(intf.RecvData(meta=None, ftime=0.0, fno=0, trace=trace))
+    stats.record(untraced)
+    result = stats.percentiles()
+    assert result["encoder.out"]["p50"] == pytest.approx(0.002)
+    assert result["total"]["p99"] == pytest.approx(0.003)
+    assert result["encoder.in"]["count"] == 10
+
+
+def test_streamer_receiver_latency():
+    seed = uuid.uuid1().hex
+    endpoint = "ipc:///tmp/testtrace" + seed
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    with ps.Streamer(endpoint, trace=True) as streamer, ps.Receiver(endpoint) as receiver:
+        received = 0
+        deadline = time.time() + 10
+        while received < 10 and time.time() < deadline:
+            streamer.send(frame)
+            try:
+                data = receiver.recv(timeout=50)
+            except TimeoutError:
+                continue
+            received += data.fno >= 0
+    assert received == 10
+    latency = receiver.latency()
+    assert list(latency) == [
+        "send",
+        "encoder.in",
+        "encoder.out",
+        "publisher.in",
+        "publisher.out",
+        "subscriber.in",
+        "subscriber.out",
+        "decoder.in",
+        "decoder.out",
+        "recv",
+        "total",
+    ]
+    assert latency["total"]["count"] >= 10
+    assert 0 < latency["total"]["p50"] < 1.0
+
+
+def test_untraced_stream():
+    context = zmq.Context.instance()
+    a, b = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+    endpoint = "inproc://test_trace" + uuid.uuid1().hex
+    a.bind(endpoint)
+    b.connect(endpoint)
+    try:
+        intf.send(socket=a, fno=0, ftime=time.time(), meta=None, buf=b"x")
+        assert intf.recv(socket=b, buf=True).trace is None
+    finally:
+        a.close(linger=0)
+        b.close(linger=0)